@@ -12,7 +12,9 @@ import os
 import sqlite3
 from contextlib import contextmanager
 
-from app import app
+from app import create_app
+
+app = create_app()
 
 
 @contextmanager
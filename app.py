@@ -2,23 +2,9 @@ from flask import Flask, render_template, send_from_directory, request, redirect
 import json
 import threading
 import time
-try:
-    from werkzeug.security import generate_password_hash, check_password_hash
-    WERKZEUG_AVAILABLE = True
-except ImportError:
-    import hashlib
-    WERKZEUG_AVAILABLE = False
-    
-    def generate_password_hash(password):
-        """Fallback password hashing using SHA-256 with salt"""
-        salt = 'admission_salt_2024'
-        return hashlib.sha256((password + salt).encode()).hexdigest()
-    
-    def check_password_hash(stored_hash, password):
-        """Fallback password verification"""
-        salt = 'admission_salt_2024'
-        computed_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-        return stored_hash == computed_hash
+# Admission credentials and user passwords share one hashing service; the old
+# SHA-256 fallback values still verify through check_password_hash
+from password_service import hash_password as generate_password_hash, check_password as check_password_hash
 
 import os
 import secrets
@@ -31,7 +17,8 @@ except ImportError:
         filename = re.sub(r'[^a-zA-Z0-9._-]', '', filename)
         return filename
 from auth_handler import (
-    init_db, register_user, authenticate_user,
+    init_db, register_user, authenticate_login,
+    get_class_name_map, invalidate_class_cache,
     get_all_users, delete_user, search_users, get_user_by_id,
     update_user, add_notification, get_unread_notifications_for_user, get_all_notifications,
     create_live_class, get_live_class, get_active_classes, deactivate_class,
@@ -41,19 +28,24 @@ from auth_handler import (
     create_topic, delete_topic, get_all_topics, get_topics_for_user, can_user_access_topic,
     update_user_with_password, add_personal_notification, get_forum_messages,
     format_datetime_for_display, mark_messages_as_read,
-    get_user_by_username, get_user_by_email
+    get_user_by_username, get_user_by_email,
+    get_personal_messages, get_user_conversations,
+    broadcast_personal_message, BROADCAST_AUDIENCES,
+    ensure_conversations_table, get_inbox_page, search_chat_users, INBOX_PAGE_SIZE,
+    store_personal_message, acknowledge_personal_messages, mark_chats_delivered,
+    get_chat_receipts, CHAT_HISTORY_PAGE_SIZE
 )
 from study_resources import (
     save_resource, get_all_resources, delete_resource, get_resources_for_class_id,
     get_categories_for_class, get_all_categories, update_resource, add_category,
     update_category, delete_category, search_resources, track_resource_download,
     add_resource_rating, get_resource_ratings, get_average_rating, get_resource_statistics,
+    get_resource_counters, track_resource_download_by_filename,
     allowed_file, get_file_size, get_file_type, user_has_access_to_resource,
-    ensure_resource_tables
+    ensure_resource_tables, invalidate_resource_catalogue, get_catalogue_generation
 )
-from notifications import extract_mentions, create_mention_notifications
-import csv
-from io import StringIO
+from notifications import extract_mentions, create_mention_notifications, ensure_notification_tables
+from countdown_manager import init_countdown_table
 from collections import Counter
 from functools import wraps
 import sqlite3
@@ -61,7 +53,6 @@ from datetime import datetime, timedelta, timezone
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from flask import g
 import base64
-import requests
 import uuid
 
 # Import time configuration
@@ -82,12 +73,33 @@ except Exception as _e:
 
 # Import batch routes blueprint
 batch_bp = None
+ensure_batch_meta_table = None
 try:
-    from batch_routes import batch_bp as _batch_bp
+    from batch_routes import batch_bp as _batch_bp, ensure_batch_meta_table
     batch_bp = _batch_bp
 except Exception as _e:
     print(f"Batch blueprint not loaded: {_e}")
 
+# Import resumable chunked upload blueprint
+from chunked_upload import chunked_upload_bp, claim_upload, stream_save, cleanup_stale_uploads, UPLOAD_KINDS, ensure_upload_tables
+
+# Import background job runner (bulk imports run outside the request)
+from job_runner import jobs_bp, register_job_handler, submit_job, set_job_event_emitter, start_job_workers, ensure_jobs_table
+from data_export import exports_bp, register_export, serve_export, cleanup_stale_exports
+from epoch_columns import ensure_epoch_columns, epoch_now
+from traffic_rollups import ensure_traffic_rollup_tables, record_hit, get_traffic_summary, get_daily_traffic, prune_traffic_rollups
+from data_archive import run_archival
+from scheduler import scheduler_bp, schedule_interval, schedule_cron, start_scheduler, ensure_scheduler_tables
+from schema_bootstrap import register_schema_step, bootstrap_schema
+from asset_pipeline import asset_url, send_asset, send_bundle
+from request_cache import get_request_memo_stats, reset_request_memo_stats
+from reference_cache import ensure_reference_cache_table
+from notification_read_state import ensure_notification_read_state_tables, mark_all_notifications_read
+from page_cache import cached_page, set_last_updated_source, invalidate_page_cache, get_page_cache_stats
+from live_class_timers import (
+    set_live_class_event_emitter, start_live_class_timers, reload_live_class_timers, LIVE_CLASS_ROOM
+)
+
 # Initialize Flask app
 app = Flask(__name__, static_folder='.', template_folder='.')
 
@@ -142,7 +154,21 @@ def _compute_site_last_updated():
         # robust fallback
         return get_current_ist_time()
 
-SITE_LAST_UPDATED_IST = _compute_site_last_updated()
+# The tree walk is slow, so it runs once per process: in the background from
+# create_app(), or on first use if something asks before that finishes
+_site_last_updated = None
+_site_last_updated_lock = threading.Lock()
+
+def get_site_last_updated():
+    """Cached result of _compute_site_last_updated()"""
+    global _site_last_updated
+    if _site_last_updated is None:
+        with _site_last_updated_lock:
+            if _site_last_updated is None:
+                _site_last_updated = _compute_site_last_updated()
+    return _site_last_updated
+
+set_last_updated_source(get_site_last_updated)
 
 # Register blueprint(s)
 try:
@@ -205,10 +231,6 @@ def cleanup_stale_sessions():
         cutoff_time = (datetime.now() - timedelta(hours=24)).strftime('%Y-%m-%d %H:%M:%S')
         c.execute('DELETE FROM active_sessions WHERE last_activity < ?', (cutoff_time,))
         
-        # Remove old IP logs (older than 30 days)
-        cutoff_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S')
-        c.execute('DELETE FROM ip_logs WHERE visited_at < ?', (cutoff_date,))
-        
         # Remove old user activity records (older than 7 days)
         cutoff_activity = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
         c.execute('DELETE FROM user_activity WHERE last_seen < ?', (cutoff_activity,))
@@ -220,26 +242,15 @@ def cleanup_stale_sessions():
         if deleted_sessions > 0:
             print(f"Cleaned up {deleted_sessions} stale sessions and old records")
         
+        # Move old IP logs and chat history to the monthly archives in small batches
+        prune_traffic_rollups()
+        run_archival()
+        
         return deleted_sessions
     except Exception as e:
         print(f"Error cleaning up stale sessions: {e}")
         return 0
 
-def start_session_cleanup_service():
-    """Start a background service to periodically clean up stale sessions"""
-    def cleanup_worker():
-        while True:
-            try:
-                cleanup_stale_sessions()
-                time.sleep(3600)  # Run every hour
-            except Exception as e:
-                print(f"Session cleanup service error: {e}")
-                time.sleep(3600)  # Wait an hour before retrying
-    
-    cleanup_thread = threading.Thread(target=cleanup_worker, daemon=True)
-    cleanup_thread.start()
-    print("Session cleanup service started")
-
 def generate_complex_password(length=12):
     """Generate a complex password with mixed characters"""
     import string
@@ -332,7 +343,7 @@ def close_connection(exception):
         db.close()
 
 def init_poll_and_doubt_tables():
-    db = get_db()
+    db = sqlite3.connect(DATABASE)
     c = db.cursor()
     
     # Live Class Messages
@@ -417,10 +428,7 @@ def init_poll_and_doubt_tables():
         resolved_at TIMESTAMP
     )''')
     db.commit()
-
-# Initialize database tables on app startup
-def setup_db():
-    init_poll_and_doubt_tables()
+    db.close()
 
 # Initialize IP tracking tables
 def init_tracking_tables():
@@ -450,6 +458,16 @@ def init_tracking_tables():
             last_activity TEXT DEFAULT CURRENT_TIMESTAMP,
             UNIQUE(user_id)
         )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS blocked_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            role TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'warning',
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )''')
         conn.commit()
         conn.close()
     except Exception as e:
@@ -880,20 +898,15 @@ def init_admissions_tables():
         ap_cols = [r[1] for r in c.fetchall()]
         if 'access_username' not in ap_cols:
             c.execute("ALTER TABLE admission_access_plain ADD COLUMN access_username TEXT")
+        # Login username shown next to the portal credentials after submission
+        if 'login_username' not in ap_cols:
+            c.execute("ALTER TABLE admission_access_plain ADD COLUMN login_username TEXT")
         
         conn.commit()
         conn.close()
     except Exception as e:
         print(f"Error initializing admissions tables: {e}")
 
-# Call setup_db when the app starts
-with app.app_context():
-    setup_db()
-    init_tracking_tables()
-    init_admission_access_table()
-    ensure_admissions_submit_ip_column()
-    init_admissions_tables()
-
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -918,6 +931,10 @@ try:
         app.register_blueprint(bulk_upload_bp)
     if batch_bp is not None:
         app.register_blueprint(batch_bp)
+    app.register_blueprint(chunked_upload_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(exports_bp)
+    app.register_blueprint(scheduler_bp)
 except Exception as _e:
     print(f"Failed to register blueprints: {_e}")
 
@@ -926,11 +943,6 @@ ALLOWED_EXTENSIONS = {'pdf', 'docx', 'png', 'jpg', 'jpeg'}
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-init_db()
-
-# Initialize study resources tables
-ensure_resource_tables()
-
 # --- Batches DB Setup ---
 def init_batches_db():
     try:
@@ -965,8 +977,6 @@ def init_batches_db():
         except Exception:
             pass
 
-init_batches_db()
-
 # --- Queries DB Setup ---
 def init_queries_db():
     try:
@@ -1044,11 +1054,47 @@ def init_queries_db():
         conn.commit()
     finally:
         conn.close()
-init_queries_db()
+
+# --- Schema bootstrap ---
+# All table creation and migration happens here, once per process, and is
+# skipped entirely when the database is already at SCHEMA_VERSION. Request
+# handlers and module imports assume these tables exist.
+# Order matters on a fresh database where two modules define the same table
+# (first CREATE wins): it is the order these used to run at import and startup.
+register_schema_step('study resources', ensure_resource_tables)
+register_schema_step('notifications', ensure_notification_tables)
+register_schema_step('uploads', ensure_upload_tables)
+register_schema_step('jobs', ensure_jobs_table)
+register_schema_step('scheduler', ensure_scheduler_tables)
+register_schema_step('live class extras', init_poll_and_doubt_tables)
+register_schema_step('tracking', init_tracking_tables)
+register_schema_step('admission access', init_admission_access_table)
+register_schema_step('admission submit ip', ensure_admissions_submit_ip_column)
+register_schema_step('admissions', init_admissions_tables)
+register_schema_step('core tables', init_db)
+register_schema_step('batches', init_batches_db)
+register_schema_step('queries', init_queries_db)
+register_schema_step('countdown', init_countdown_table)
+if ensure_batch_meta_table is not None:
+    register_schema_step('batch meta', ensure_batch_meta_table)
+# Integer epoch columns (and their sync triggers) on every time-ordered table
+register_schema_step('epoch columns', ensure_epoch_columns)
+# Inbox summary; its triggers read personal_chats.created_ts
+register_schema_step('conversations', ensure_conversations_table)
+# Moves user_notification_status rows into per-user read marks
+register_schema_step('notification read state', ensure_notification_read_state_tables)
+register_schema_step('traffic rollups', ensure_traffic_rollup_tables)
+register_schema_step('reference cache', ensure_reference_cache_table)
 
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', 
                    ping_timeout=60, ping_interval=25, logger=True, engineio_logger=True)
 
+# Push background job progress to the job_<id> room
+set_job_event_emitter(lambda event, data, room: socketio.emit(event, data, room=room))
+
+# Push scheduled -> active -> completed transitions to the live_class_updates room
+set_live_class_event_emitter(lambda event, data, room: socketio.emit(event, data, room=room))
+
 # Active session tracking
 active_sessions = {}
 room_participants = {}
@@ -1092,6 +1138,24 @@ def handle_ping():
         active_sessions[request.sid]['last_ping'] = datetime.now()
     emit('pong')
 
+@socketio.on('join_job')
+def handle_join_job(data):
+    """Subscribe an admin or teacher to job_progress events for one job"""
+    if session.get('role') not in ['admin', 'teacher']:
+        emit('error', {'message': 'Unauthorized'})
+        return
+    job_id = (data or {}).get('job_id')
+    if job_id:
+        join_room(f'job_{job_id}')
+
+@socketio.on('watch_live_classes')
+def handle_watch_live_classes(data=None):
+    """Subscribe a logged-in user to live_class_status_changed events"""
+    if not session.get('user_id'):
+        emit('error', {'message': 'Not logged in'})
+        return
+    join_room(LIVE_CLASS_ROOM)
+
 # --- Enhanced Room Management ---
 @socketio.on('join-room')
 def handle_join_room(data):
@@ -1211,11 +1275,14 @@ def inject_global_variables():
         role=role,
         user_paid_status=user_paid_status,
         format_datetime_for_display=format_datetime_for_display,
-        google_client_id=app.config.get('GOOGLE_CLIENT_ID')
+        google_client_id=app.config.get('GOOGLE_CLIENT_ID'),
+        resource_catalogue_generation=get_catalogue_generation(),
+        asset_url=asset_url
     )
 
 # Route for the main page
 @app.route('/')
+@cached_page('home', ttl=60, depends=('countdown',))
 def home():
     # Check if countdown page is active
     from countdown_manager import is_countdown_active, is_website_live
@@ -1227,12 +1294,6 @@ def home():
         if settings:
             return render_template('countdown_dynamic.html', settings=settings)
     
-    # Normal home page logic
-    with sqlite3.connect(DATABASE) as conn:
-        c = conn.cursor()
-        c.execute('SELECT name, email, message, submitted_at FROM queries ORDER BY id DESC LIMIT 10')
-        queries = c.fetchall()
-    
     # Get user info for notification bell
     username = session.get('username')
     user_id = session.get('user_id')
@@ -1243,7 +1304,6 @@ def home():
         user_notifications = get_unread_notifications_for_user(user_id)
     
     return render_template('index.html', 
-                         queries=queries, 
                          username=username, 
                          user_notifications=user_notifications)
 
@@ -1251,7 +1311,7 @@ def home():
 @app.route('/api/site-last-updated')
 def api_site_last_updated():
     try:
-        ist_dt = SITE_LAST_UPDATED_IST
+        ist_dt = get_site_last_updated()
         return jsonify({
             'success': True,
             'last_updated_iso': ist_dt.isoformat(),
@@ -1263,6 +1323,7 @@ def api_site_last_updated():
 
 # Scholars page route
 @app.route('/scholars')
+@cached_page('scholars')
 def scholars_page():
     username = session.get('username')
     return render_template('scholars.html', username=username)
@@ -1283,21 +1344,20 @@ def api_live_classes_status():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'Not logged in'}), 401
     try:
-        from auth_handler import get_active_live_classes, get_upcoming_live_classes, get_completed_live_classes
-        active_classes = get_active_live_classes() or []
-        upcoming_classes = get_upcoming_live_classes() or []
-        completed_classes = get_completed_live_classes() or []
+        from auth_handler import get_live_classes_for_display
+        classes_data = get_live_classes_for_display()
         return jsonify({
             'success': True,
-            'active': active_classes,
-            'upcoming': upcoming_classes,
-            'completed': completed_classes
+            'active': classes_data['active'],
+            'upcoming': classes_data['upcoming'],
+            'completed': classes_data['completed']
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Route for study resources
 @app.route('/study-resources')
+@cached_page('study_resources', depends=('classes',), generation=get_catalogue_generation)
 def study_resources():
     try:
         role = session.get('role')
@@ -1479,11 +1539,12 @@ def batch_overview(class_id):
     except Exception:
         class_name = f"Class {class_id}"
 
-    # Live class sections (reuse lists; optionally filter by target_class)
-    from auth_handler import get_upcoming_live_classes, get_active_live_classes, get_completed_live_classes
-    upcoming_classes = [lc for lc in get_upcoming_live_classes() if lc[9] in ('all', class_name)]
-    active_classes = [lc for lc in get_active_live_classes() if lc[9] in ('all', class_name)]
-    completed_classes = [lc for lc in get_completed_live_classes() if lc[9] in ('all', class_name)]
+    # Live class sections for this class (and those targeted at all classes)
+    from auth_handler import get_live_classes_for_display
+    live_classes = get_live_classes_for_display(class_name)
+    upcoming_classes = live_classes['upcoming']
+    active_classes = live_classes['active']
+    completed_classes = live_classes['completed']
 
     # Study resources for this class
     # Show both free and paid; CTA visibility will depend on user_paid_status
@@ -1616,22 +1677,17 @@ def api_post_forum_message():
         parent_id = request.form.get('parent_id')
         topic_id = request.form.get('topic_id')
         file = request.files.get('media')
-        media_url = None
-        if file and file.filename:
-            filename = secure_filename(file.filename)
-            media_folder = os.path.join(UPLOAD_FOLDER, 'forum_media')
-            os.makedirs(media_folder, exist_ok=True)
-            filepath = os.path.join(media_folder, filename)
-            file.save(filepath)
-            media_url = f'uploads/forum_media/{filename}'
+        media_upload_id = request.form.get('media_upload_id')
     else:
         data = request.json
         message = data.get('message') if data else None
         parent_id = data.get('parent_id') if data else None
         topic_id = data.get('topic_id') if data else None
-        media_url = None
+        file = None
+        media_upload_id = None
 
-    if not message and not media_url:
+    has_media = bool(media_upload_id) or bool(file and file.filename)
+    if not message and not has_media:
         return jsonify({'error': 'Message or media required'}), 400
 
     # Check access control for the topic
@@ -1643,6 +1699,24 @@ def api_post_forum_message():
             if not can_user_access_topic(user_class_name, user_paid_status, topic_id):
                 return jsonify({'error': 'Access denied to this topic'}), 403
 
+    # Claim the media only once the post is allowed; a claimed upload cannot be reused
+    media_url = None
+    if media_upload_id:
+        claimed = claim_upload(media_upload_id, user_id, 'forum_media')
+        if not claimed:
+            return jsonify({'error': 'Uploaded media not found or not finished'}), 400
+        media_url = f"uploads/forum_media/{claimed['stored_filename']}"
+    elif file and file.filename:
+        filename = secure_filename(file.filename)
+        media_folder = os.path.join(UPLOAD_FOLDER, 'forum_media')
+        os.makedirs(media_folder, exist_ok=True)
+        filepath = os.path.join(media_folder, filename)
+        try:
+            stream_save(file, filepath, UPLOAD_KINDS['forum_media']['max_bytes'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 413
+        media_url = f'uploads/forum_media/{filename}'
+
     # Detect and create poll if message contains a /poll block
     def _parse_poll_block(text):
         if not text:
@@ -1838,7 +1912,7 @@ def auth():
         print(f"Form data: {dict(request.form)}")
         
         class_id = request.form.get('class_id')
-        all_classes_dict = {str(c[0]): c[1] for c in get_all_classes()}
+        all_classes_dict = {str(cid): name for cid, name in get_class_name_map().items()}
         selected_role = all_classes_dict.get(class_id)
         username = request.form.get('username')
         password = request.form.get('password')
@@ -1857,12 +1931,12 @@ def auth():
                 error = 'Invalid admin code. Login denied.'
                 all_classes = get_all_classes()
                 return render_template('auth.html', error=error, all_classes=all_classes)
-        user_data = authenticate_user(username, password)
-        if user_data:
-            user_id, user_role = user_data
+        # One identifier lookup + one password check; class names come from the cache
+        login = authenticate_login(username, password)
+        if login and login['class_name'] is not None:
+            user_id, user_role = login['id'], login['class_name']
             # Check if user is banned
-            user = get_user_by_id(user_id)
-            if user and len(user) > 4 and user[4] == 1:
+            if login['banned'] == 1:
                 error = 'Your account has been banned. Please contact Mohit Sir or admin to be unbanned.'
                 all_classes = get_all_classes()
                 return render_template('auth.html', error=error, all_classes=all_classes)
@@ -1912,6 +1986,7 @@ def auth_google_callback():
         if 'credential' in request.form:
             # Verify Google ID token via Google endpoint
             id_token = request.form['credential']
+            import requests
             resp = requests.get(
                 'https://oauth2.googleapis.com/tokeninfo',
                 params={'id_token': id_token},
@@ -2307,23 +2382,33 @@ def create_live_class_page():
             scheduled_time = schedule_date_raw.replace('T', ' ') + ':00' if 'T' in schedule_date_raw else schedule_date_raw
         
         meeting_url = None
+        video_upload_id = None
         
         if video_source == 'upload':
-            # Handle uploaded video file
+            # Prefer a finished chunked upload; fall back to a plain multipart file
+            upload_id = request.form.get('upload_id')
             video_file = request.files.get('video_file')
-            if not video_file or video_file.filename == '':
-                flash('Video file is required when uploading.', 'error')
-                return render_template('create_class.html', class_details=None)
-            if not video_file.filename.lower().endswith(('.mp4', '.webm')):
-                flash('Only MP4 and WebM video files are allowed.', 'error')
-                return render_template('create_class.html', class_details=None)
-            filename = secure_filename(video_file.filename)
-            video_folder = os.path.join('uploads', 'videos')
-            os.makedirs(video_folder, exist_ok=True)
-            unique_name = f"{secrets.token_hex(8)}_{filename}"
-            video_path = os.path.join(video_folder, unique_name)
-            video_file.save(video_path)
-            meeting_url = f"/uploads/videos/{unique_name}"
+            if upload_id:
+                # Claimed below, right before the class is created
+                video_upload_id = upload_id
+            else:
+                if not video_file or video_file.filename == '':
+                    flash('Video file is required when uploading.', 'error')
+                    return render_template('create_class.html', class_details=None)
+                if not video_file.filename.lower().endswith(('.mp4', '.webm')):
+                    flash('Only MP4 and WebM video files are allowed.', 'error')
+                    return render_template('create_class.html', class_details=None)
+                filename = secure_filename(video_file.filename)
+                video_folder = os.path.join('uploads', 'videos')
+                os.makedirs(video_folder, exist_ok=True)
+                unique_name = f"{secrets.token_hex(8)}_{filename}"
+                video_path = os.path.join(video_folder, unique_name)
+                try:
+                    stream_save(video_file, video_path, UPLOAD_KINDS['video']['max_bytes'])
+                except ValueError as e:
+                    flash(str(e), 'error')
+                    return render_template('create_class.html', class_details=None)
+                meeting_url = f"/uploads/videos/{unique_name}"
         elif video_source == 'youtube':
             # Handle YouTube video download
             youtube_url = request.form.get('youtube_url', '').strip()
@@ -2369,6 +2454,13 @@ def create_live_class_page():
             # Redirect to Live Class Management dashboard after creation
             return redirect(url_for('live_class_management') + '?tab=dashboard')
         
+        if video_upload_id:
+            claimed = claim_upload(video_upload_id, session.get('user_id'), 'video')
+            if not claimed:
+                flash('Uploaded video not found or not finished. Please upload it again.', 'error')
+                return render_template('create_class.html', class_details=None)
+            meeting_url = f"/uploads/videos/{claimed['stored_filename']}"
+
         if not meeting_url:
             flash('No video source provided.', 'error')
             return render_template('create_class.html', class_details=None)
@@ -2406,15 +2498,30 @@ def upload_resource():
         category = request.form.get('category')
         paid_status = request.form.get('paid_status', 'unpaid')
         schedule_date = request.form.get('schedule_date')
+        upload_id = request.form.get('upload_id')
+        has_file = bool(upload_id) or bool(file and file.filename)
 
-        if not file or file.filename == '' or not class_id or not category:
+        if not has_file or not class_id or not category:
             flash('File, class, and category selection are required.', 'error')
-        elif not allowed_file(file.filename):
+        elif not upload_id and not allowed_file(file.filename):
             flash('File type not allowed.', 'error')
         else:
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            file.save(filepath)
+            # Claim only once the form is valid; a claimed upload cannot be reused
+            if upload_id:
+                claimed = claim_upload(upload_id, session.get('user_id'), 'resource')
+                if not claimed:
+                    flash('Uploaded file not found or not finished. Please upload it again.', 'error')
+                    return redirect(url_for('upload_resource'))
+                filename = claimed['stored_filename']
+                filepath = claimed['path']
+            else:
+                filename = secure_filename(file.filename)
+                filepath = os.path.join(UPLOAD_FOLDER, filename)
+                try:
+                    stream_save(file, filepath, UPLOAD_KINDS['resource']['max_bytes'])
+                except ValueError as e:
+                    flash(str(e), 'error')
+                    return redirect(url_for('upload_resource'))
             save_resource(filename, class_id, filepath, title, description, category)
 
             # Send notification based on category and paid status
@@ -2460,6 +2567,16 @@ def get_class_name_by_id(class_id):
 def uploaded_file(filename):
     return send_from_directory(UPLOAD_FOLDER, filename)
 
+# Built CSS/JS (python asset_pipeline.py): hashed names, precompressed, cached for a year
+@app.route('/static/dist/<path:filename>')
+def dist_asset(filename):
+    return send_asset(filename)
+
+# Asset bundles before a build, concatenated from their sources
+@app.route('/static/bundle/<path:name>')
+def asset_bundle(name):
+    return send_bundle(name)
+
 # Serve static files (CSS, JS, images, etc.)
 @app.route('/<path:filename>')
 def static_files(filename):
@@ -2611,7 +2728,7 @@ def mark_notification_seen_route():
         
     # Determine notification type based on the notification data
     # For now, we'll use 'general' as default, but this should be improved
-    mark_notification_as_read(user_id, notification_id, 'general')
+    mark_notification_as_seen(user_id, notification_id)
     return {'status': 'success'}
 @app.route('/delete-notification/<int:notification_id>', methods=['POST'])
 def delete_notification_route(notification_id):
@@ -2636,6 +2753,7 @@ def admin_add_class():
         except sqlite3.IntegrityError:
             pass  # Class already exists
         conn.close()
+        invalidate_class_cache()
     return redirect(url_for('admin_panel', _anchor='classes'))
 
 @app.route('/admin/classes/edit/<int:class_id>', methods=['POST'])
@@ -2650,6 +2768,7 @@ def admin_edit_class(class_id):
         c.execute('UPDATE classes SET name=? WHERE id=?', (name, class_id))
         conn.commit()
         conn.close()
+        invalidate_class_cache()
     return redirect(url_for('admin_panel', _anchor='classes'))
 
 @app.route('/admin/classes/delete/<int:class_id>', methods=['POST'])
@@ -2662,6 +2781,7 @@ def admin_delete_class(class_id):
     c.execute('DELETE FROM classes WHERE id=?', (class_id,))
     conn.commit()
     conn.close()
+    invalidate_class_cache()
     return redirect(url_for('admin_panel', _anchor='classes'))
 
 @app.route('/admin/delete-resource/<filename>', methods=['POST'])
@@ -2683,43 +2803,45 @@ def admin_delete_notification(notification_id):
     delete_notification(notification_id)
     return redirect(url_for('admin_panel', _anchor='notifications'))
 
+register_export('users', [{
+    'title': 'Users',
+    'header': ['ID', 'Username', 'Role', 'Paid', 'Mobile Number', 'Email Address'],
+    'query': '''
+        SELECT u.id, u.username, c.name, u.paid, u.mobile_no, u.email_address FROM users u
+        LEFT JOIN classes c ON u.class_id = c.id
+    ''',
+}])
+register_export('forum', [{
+    'title': 'Forum',
+    'header': ['ID', 'User ID', 'Username', 'Message', 'Parent ID', 'Upvotes', 'Downvotes', 'Timestamp'],
+    'query': '''
+        SELECT id, user_id, username, message, parent_id, upvotes, downvotes, timestamp
+        FROM forum_messages WHERE parent_id IS NULL ORDER BY timestamp DESC
+    ''',
+}])
+register_export('resources', [{
+    'title': 'Resources',
+    'header': ['Filename', 'Class ID', 'Filepath', 'Title', 'Description', 'Category'],
+    'query': 'SELECT filename, class_id, filepath, title, description, category FROM resources',
+}])
+
 @app.route('/admin/download/users')
 def admin_download_users():
     if session.get('role') not in ['admin', 'teacher']:
         return redirect(url_for('auth'))
-    users = get_all_users()
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['ID', 'Username', 'Role', 'Paid', 'Mobile Number', 'Email Address'])
-    for u in users:
-        cw.writerow(u)
-    output = si.getvalue()
-    return app.response_class(output, mimetype='text/csv', headers={'Content-Disposition': 'attachment;filename=users.csv'})
+    return serve_export('users')
 
 @app.route('/admin/download/forum')
 def admin_download_forum():
     if session.get('role') not in ['admin', 'teacher']:
         return redirect(url_for('auth'))
-    messages = get_forum_messages()
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['ID', 'User ID', 'Username', 'Message', 'Parent ID', 'Upvotes', 'Downvotes', 'Timestamp'])
-    for m in messages:
-        cw.writerow(m)
-    output = si.getvalue()
-    return app.response_class(output, mimetype='text/csv', headers={'Content-Disposition': 'attachment;filename=forum.csv'})
+    return serve_export('forum')
+
 @app.route('/admin/download/resources')
 def admin_download_resources():
     if session.get('role') not in ['admin', 'teacher']:
         return redirect(url_for('auth'))
-    resources = get_all_resources()
-    si = StringIO()
-    cw = csv.writer(si)
-    cw.writerow(['Filename', 'Class ID', 'Filepath', 'Title', 'Description', 'Category'])
-    for r in resources:
-        cw.writerow(r)
-    output = si.getvalue()
-    return app.response_class(output, mimetype='text/csv', headers={'Content-Disposition': 'attachment;filename=resources.csv'})
+    return serve_export('resources')
 
 @app.route('/admin/promote/<int:user_id>', methods=['POST'])
 def admin_promote_user(user_id):
@@ -2870,15 +2992,6 @@ def admin_create_user_page():
         for row in c.fetchall():
             admission_access_map[row[0]] = (row[1], row[2])
 
-    # Create admission_access_plain table for storing plain passwords for admin viewing
-    c.execute('''CREATE TABLE IF NOT EXISTS admission_access_plain (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        admission_id INTEGER NOT NULL UNIQUE,
-        access_username TEXT UNIQUE,
-        access_password_plain TEXT NOT NULL,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP
-    )''')
-    
     # Ensure every pending admission has credentials; auto-generate if missing
     for adm in admissions:
         adm_id = adm[0]
@@ -2926,18 +3039,6 @@ def admin_create_user_page():
     conn.execute('PRAGMA busy_timeout=30000')
     c = conn.cursor()
     
-    # Create blocked_users table if it doesn't exist
-    c.execute('''CREATE TABLE IF NOT EXISTS blocked_users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        username TEXT NOT NULL,
-        role TEXT NOT NULL,
-        reason TEXT NOT NULL,
-        blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        status TEXT DEFAULT 'warning',
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )''')
-    
     # Get all blocked users
     c.execute('''SELECT user_id, username, role, reason, blocked_at, id, status
                  FROM blocked_users 
@@ -2989,6 +3090,43 @@ def admin_create_user_submit():
         flash('Username already exists. Please choose another.', 'error')
         return redirect(url_for('admin_create_user_page'))
 
+# --- Bulk student registration (background job) ---
+def run_user_import_job(ctx, file_path, dry_run=False):
+    """Register/update students from a sheet via the registration engine"""
+    from student_registration import register_students
+    def progress(stage, done, total):
+        ctx.report(stage, done, total)
+        ctx.check_cancelled()
+    try:
+        return register_students(file_path, dry_run=dry_run, progress=progress)
+    finally:
+        try:
+            os.remove(file_path)
+            os.rmdir(os.path.dirname(file_path))
+        except OSError:
+            pass
+
+register_job_handler('user_import', run_user_import_job)
+
+@app.route('/admin/users/import', methods=['POST'])
+@admin_required
+def import_users():
+    """Queue a bulk student registration; pass dry_run=1 to get the diff without writing"""
+    f = request.files.get('users_file')
+    if not f or not f.filename:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+    if not f.filename.lower().endswith(('.csv', '.xlsx', '.xls')):
+        return jsonify({'success': False, 'error': 'Please upload a CSV or Excel file'}), 400
+    import tempfile
+    temp_dir = tempfile.mkdtemp()
+    file_path = os.path.join(temp_dir, secure_filename(f.filename))
+    f.save(file_path)
+    dry_run = request.form.get('dry_run') in ('1', 'true', 'on')
+    job_id = submit_job('user_import', {'file_path': file_path, 'dry_run': dry_run}, session.get('username'))
+    if not job_id:
+        return jsonify({'success': False, 'error': 'Could not start import'}), 500
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': f'/jobs/{job_id}'}), 202
+
 @app.route('/admin/ban-user/<int:user_id>', methods=['POST'])
 def admin_ban_user(user_id):
     if session.get('role') not in ['admin', 'teacher']:
@@ -3066,18 +3204,6 @@ def admin_block_user():
         conn.execute('PRAGMA busy_timeout=30000')
         c = conn.cursor()
         
-        # Create blocked_users table if it doesn't exist
-        c.execute('''CREATE TABLE IF NOT EXISTS blocked_users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            username TEXT NOT NULL,
-            role TEXT NOT NULL,
-            reason TEXT NOT NULL,
-            blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'warning',
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )''')
-        
         # Check if user is already blocked
         c.execute('SELECT id FROM blocked_users WHERE user_id = ?', (user_id,))
         if c.fetchone():
@@ -3129,18 +3255,6 @@ def admin_block_user_by_username():
         conn.execute('PRAGMA busy_timeout=30000')
         c = conn.cursor()
         
-        # Create blocked_users table if it doesn't exist
-        c.execute('''CREATE TABLE IF NOT EXISTS blocked_users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            username TEXT NOT NULL,
-            role TEXT NOT NULL,
-            reason TEXT NOT NULL,
-            blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'warning',
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )''')
-        
         # Check if user is already blocked
         c.execute('SELECT id FROM blocked_users WHERE user_id = ?', (user[0],))
         if c.fetchone():
@@ -3247,18 +3361,6 @@ def update_blocked_user_statuses():
         conn.execute('PRAGMA busy_timeout=30000')
         c = conn.cursor()
         
-        # Create blocked_users table if it doesn't exist
-        c.execute('''CREATE TABLE IF NOT EXISTS blocked_users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            username TEXT NOT NULL,
-            role TEXT NOT NULL,
-            reason TEXT NOT NULL,
-            blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            status TEXT DEFAULT 'warning',
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )''')
-        
         # Get users in warning period
         c.execute('''SELECT user_id, username, blocked_at FROM blocked_users 
                      WHERE status = 'warning' AND blocked_at IS NOT NULL''')
@@ -3292,24 +3394,6 @@ def update_blocked_user_statuses():
     except Exception as e:
         print(f"Error updating blocked user statuses: {e}")
 
-# Schedule the status update function to run periodically
-import threading
-import time
-
-def run_blocked_user_status_checker():
-    """Run the blocked user status checker in a separate thread"""
-    while True:
-        try:
-            update_blocked_user_statuses()
-            time.sleep(300)  # Check every 5 minutes
-        except Exception as e:
-            print(f"Error in blocked user status checker: {e}")
-            time.sleep(300)
-
-# Start the status checker thread
-blocked_user_checker_thread = threading.Thread(target=run_blocked_user_status_checker, daemon=True)
-blocked_user_checker_thread.start()
-
 @app.route('/admin/create-topic', methods=['GET'])
 @admin_required
 def admin_create_topic_page():
@@ -3405,6 +3489,85 @@ def view_admissions():
                          current_tab=tab,
                          approved_admissions=approved_admissions,
                          disapproved_admissions=disapproved_admissions)
+# --- Bulk admissions import (background job) ---
+ADMISSION_IMPORT_FIELDS = [
+    'student_name', 'dob', 'student_phone', 'student_email', 'class', 'school_name',
+    'maths_marks', 'maths_rating', 'last_percentage', 'parent_name', 'parent_phone'
+]
+
+def run_admission_import_job(ctx, file_path, imported_by='admin'):
+    """Import pending admissions from a CSV/Excel sheet in one transaction"""
+    import pandas as pd
+    try:
+        if file_path.lower().endswith('.csv'):
+            df = pd.read_csv(file_path, dtype=str)
+        else:
+            df = pd.read_excel(file_path, dtype=str)
+    finally:
+        try:
+            os.remove(file_path)
+            os.rmdir(os.path.dirname(file_path))
+        except OSError:
+            pass
+
+    # Accept "Student Name" as well as "student_name" headers
+    df.columns = [str(col).strip().lower().replace(' ', '_') for col in df.columns]
+    if 'student_name' not in df.columns:
+        raise ValueError('Missing required column: student_name')
+    for field in ADMISSION_IMPORT_FIELDS:
+        if field not in df.columns:
+            df[field] = ''
+    df = df[ADMISSION_IMPORT_FIELDS].fillna('').astype(str).apply(lambda col: col.str.strip())
+    blank = df['student_name'] == ''
+    ctx.report('validate', len(df), len(df))
+    ctx.check_cancelled()
+
+    submitted_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = [
+        tuple(v or None for v in record) + ('pending', submitted_at)
+        for record in df[~blank].itertuples(index=False, name=None)
+    ]
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    try:
+        conn.executemany('''INSERT INTO admissions (
+            student_name, dob, student_phone, student_email, class, school_name,
+            maths_marks, maths_rating, last_percentage, parent_name, parent_phone, status, submitted_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    ctx.report('insert', len(rows), len(rows))
+    print(f"✅ Imported {len(rows)} admissions (by {imported_by})")
+    return {
+        'total_rows': len(df),
+        'imported': len(rows),
+        'skipped': [f"Row {idx + 2}: student_name is required" for idx in df.index[blank]]
+    }
+
+register_job_handler('admission_import', run_admission_import_job)
+
+@app.route('/admin/admissions/import', methods=['POST'])
+@admin_required
+def import_admissions():
+    """Queue a CSV/Excel admissions import; poll the returned status_url for progress"""
+    f = request.files.get('admissions_file')
+    if not f or not f.filename:
+        return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+    if not f.filename.lower().endswith(('.csv', '.xlsx', '.xls')):
+        return jsonify({'success': False, 'error': 'Please upload a CSV or Excel file'}), 400
+    import tempfile
+    temp_dir = tempfile.mkdtemp()
+    file_path = os.path.join(temp_dir, secure_filename(f.filename))
+    f.save(file_path)
+    job_id = submit_job('admission_import', {'file_path': file_path, 'imported_by': session.get('username')},
+                        session.get('username'))
+    if not job_id:
+        return jsonify({'success': False, 'error': 'Could not start import'}), 500
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': f'/jobs/{job_id}'}), 202
+
 @app.route('/admin/admissions/approve/<int:admission_id>', methods=['POST'])
 @admin_required
 def approve_admission(admission_id):
@@ -4117,14 +4280,6 @@ def admission():
                          VALUES (?, ?, ?)''', (new_admission_id, admission_username, hashed_pw))
             
             # Also store plain password for admin viewing
-            c.execute('''CREATE TABLE IF NOT EXISTS admission_access_plain (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                admission_id INTEGER NOT NULL UNIQUE,
-                access_username TEXT UNIQUE,
-                access_password_plain TEXT NOT NULL,
-                login_username TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )''')
             c.execute('''INSERT OR REPLACE INTO admission_access_plain (admission_id, access_username, access_password_plain, login_username)
                          VALUES (?, ?, ?, ?)''', (new_admission_id, admission_username, access_password, login_username))
             
@@ -4398,12 +4553,8 @@ def delete_live_class_route(class_id):
     if session.get('role') not in ['admin', 'teacher']:
         return redirect(url_for('auth'))
     
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
-    c.execute('DELETE FROM live_class_messages WHERE live_class_id = ?', (class_id,))
-    c.execute('DELETE FROM live_classes WHERE id = ?', (class_id,))
-    conn.commit()
-    conn.close()
+    from auth_handler import delete_live_class
+    delete_live_class(class_id)
     
     return redirect(url_for('status_management'))
 
@@ -4524,10 +4675,9 @@ def api_delete_live_class():
         if not class_id:
             return jsonify({'success': False, 'message': 'Class ID is required'}), 400
         
-        from auth_handler import delete_live_class_route
+        from auth_handler import delete_live_class
         
-        # Use the existing delete function
-        delete_live_class_route(class_id)
+        delete_live_class(class_id)
         
         return jsonify({'success': True, 'message': 'Class deleted successfully'})
     except Exception as e:
@@ -4636,19 +4786,6 @@ def create_category():
         conn = sqlite3.connect(DATABASE)
         c = conn.cursor()
         
-        # Create categories table if it doesn't exist
-        c.execute('''CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL,
-            description TEXT,
-            category_type TEXT DEFAULT 'general',
-            target_class TEXT DEFAULT 'all',
-            paid_status TEXT DEFAULT 'unpaid',
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            created_by INTEGER,
-            is_active BOOLEAN DEFAULT 1
-        )''')
-        
         # Insert new category
         c.execute('''INSERT INTO categories (name, description, category_type, target_class, paid_status, created_by) 
                      VALUES (?, ?, ?, ?, ?, ?)''', 
@@ -4656,6 +4793,7 @@ def create_category():
         
         conn.commit()
         conn.close()
+        invalidate_resource_catalogue()
 
         flash(f'Category "{category_name}" created successfully!', 'success')
         return redirect(url_for('upload_resource'))
@@ -4672,19 +4810,6 @@ def get_all_categories():
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
-    # Create categories table if it doesn't exist
-    c.execute('''CREATE TABLE IF NOT EXISTS categories (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE NOT NULL,
-        description TEXT,
-        category_type TEXT DEFAULT 'general',
-        target_class TEXT DEFAULT 'all',
-        paid_status TEXT DEFAULT 'unpaid',
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        created_by INTEGER,
-        is_active BOOLEAN DEFAULT 1
-    )''')
-    
     c.execute('SELECT id, name, description, category_type, target_class, paid_status, created_at FROM categories WHERE is_active = 1 ORDER BY name')
     categories = c.fetchall()
     conn.close()
@@ -4713,6 +4838,7 @@ def delete_category(category_id):
         c.execute('UPDATE categories SET is_active = 0 WHERE id = ?', (category_id,))
         conn.commit()
         conn.close()
+        invalidate_resource_catalogue()
 
         flash(f'Category "{category_name}" deleted successfully!', 'success')
         return redirect(url_for('upload_resource'))
@@ -4751,6 +4877,7 @@ def edit_category(category_id):
         
         conn.commit()
         conn.close()
+        invalidate_resource_catalogue()
 
         flash(f'Category "{category_name}" updated successfully!', 'success')
         return redirect(url_for('upload_resource'))
@@ -4928,6 +5055,7 @@ def edit_resource():
 
         conn.commit()
         conn.close()
+        invalidate_resource_catalogue()
 
         # Send notification about the update
         notification_message = f"Resource '{title}' has been updated"
@@ -5376,7 +5504,7 @@ def edit_profile():
                         UPDATE users 
                         SET username = ?, password = ?, mobile_no = ?, email_address = ?
                         WHERE id = ?
-                    ''', (new_username, new_password, new_mobile_no, new_email_address, user_id))
+                    ''', (new_username, generate_password_hash(new_password), new_mobile_no, new_email_address, user_id))
                 else:
                     # Update without changing password
                     c.execute('''
@@ -5565,77 +5693,53 @@ def api_delete_query(query_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _queries_export_sql(params):
+    """Filtered queries export; params are the query management page's filters"""
+    query = """
+        SELECT id, name, email, phone, subject, message, priority, status, 
+               category, source, submitted_at, response, responded_at, responded_by
+        FROM queries 
+        WHERE 1=1
+    """
+    args = []
+    
+    if params.get('status'):
+        query += " AND status = ?"
+        args.append(params['status'])
+    
+    if params.get('priority'):
+        query += " AND priority = ?"
+        args.append(params['priority'])
+    
+    if params.get('category'):
+        query += " AND category = ?"
+        args.append(params['category'])
+    
+    if params.get('search'):
+        query += " AND (name LIKE ? OR email LIKE ? OR message LIKE ? OR subject LIKE ?)"
+        search_param = f"%{params['search']}%"
+        args.extend([search_param, search_param, search_param, search_param])
+    
+    query += " ORDER BY submitted_at DESC"
+    return query, args
+
+register_export('queries', [{
+    'title': 'Queries',
+    'header': [
+        'ID', 'Name', 'Email', 'Phone', 'Subject', 'Message', 'Priority', 
+        'Status', 'Category', 'Source', 'Submitted At', 'Response', 
+        'Responded At', 'Responded By'
+    ],
+    'query': _queries_export_sql,
+}], filename='queries_export_{timestamp}')
+
 @app.route('/api/queries/export')
 @admin_api_required
 def api_export_queries():
     """API endpoint to export queries as CSV"""
     try:
-        # Get filter parameters
-        status = request.args.get('status', '')
-        priority = request.args.get('priority', '')
-        category = request.args.get('category', '')
-        search = request.args.get('search', '')
-        
-        # Build query
-        query = """
-            SELECT id, name, email, phone, message, subject, priority, status, 
-                   category, source, submitted_at, response, responded_at, responded_by
-            FROM queries 
-            WHERE 1=1
-        """
-        params = []
-        
-        if status:
-            query += " AND status = ?"
-            params.append(status)
-        
-        if priority:
-            query += " AND priority = ?"
-            params.append(priority)
-        
-        if category:
-            query += " AND category = ?"
-            params.append(category)
-        
-        if search:
-            query += " AND (name LIKE ? OR email LIKE ? OR message LIKE ? OR subject LIKE ?)"
-            search_param = f"%{search}%"
-            params.extend([search_param, search_param, search_param, search_param])
-        
-        query += " ORDER BY submitted_at DESC"
-        
-        # Execute query
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        queries = cursor.fetchall()
-        conn.close()
-        
-        # Create CSV
-        from io import StringIO
-        import csv
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow([
-            'ID', 'Name', 'Email', 'Phone', 'Subject', 'Message', 'Priority', 
-            'Status', 'Category', 'Source', 'Submitted At', 'Response', 
-            'Responded At', 'Responded By'
-        ])
-        
-        # Write data
-        for query in queries:
-            writer.writerow(query)
-        
-        output.seek(0)
-        
-        from flask import Response
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={'Content-Disposition': f'attachment; filename=queries_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'}
-        )
+        params = {key: request.args.get(key, '') for key in ('status', 'priority', 'category', 'search')}
+        return serve_export('queries', params)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -5737,6 +5841,13 @@ def pdf_content(filename):
     if not user_has_access_to_resource(filename, role):
         return jsonify({'error': 'Access denied'}), 403
     
+    # Count the view as a download (queued, applied in batches); PDF viewers
+    # issue follow-up range requests, so only the first one is counted
+    range_header = request.headers.get('Range', '')
+    if session.get('user_id') and (not range_header or range_header.startswith('bytes=0-')):
+        track_resource_download_by_filename(filename, session.get('user_id'), request.remote_addr,
+                                            request.headers.get('User-Agent'))
+    
     # Serve PDF with security headers
     response = send_file(file_path, mimetype='application/pdf')
     response.headers['Content-Disposition'] = 'inline'
@@ -5751,32 +5862,43 @@ def pdf_content(filename):
     response.headers['X-Permitted-Cross-Domain-Policies'] = 'none'
     return response
 
+# Resource rating and counters (aggregates are precomputed on the resources row)
+@app.route('/api/resources/<int:resource_id>/rating', methods=['GET', 'POST'])
+def api_resource_rating(resource_id):
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        if not add_resource_rating(resource_id, user_id, data.get('rating'), (data.get('review') or '').strip() or None):
+            return jsonify({'success': False, 'error': 'Rating must be between 1 and 5'}), 400
+        return jsonify({'success': True, 'queued': True}), 202
+    return jsonify({'success': True, 'counters': get_resource_counters(resource_id)})
+
 # Route to get categories for a specific class
+def _category_payload(class_id):
+    """Serialize the cached category list for a class"""
+    return [
+        {
+            'id': row[0],
+            'name': row[1],
+            'description': row[2],
+            'category_type': row[3],
+            'paid_status': row[5]
+        } for row in get_categories_for_class(class_id)
+    ]
+
+def _catalogue_response(payload, class_id):
+    """JSON response tagged with the catalogue generation so clients can revalidate cheaply"""
+    response = jsonify(payload)
+    response.set_etag(f"cat-{get_catalogue_generation()}-{class_id}", weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 @app.route('/api/categories/<int:class_id>')
 def api_get_categories_for_class(class_id):
     try:
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        
-        # Get active categories for the specific class or all
-        c.execute('''SELECT id, name, description, category_type, paid_status 
-                     FROM categories 
-                     WHERE is_active = 1 AND (target_class = ? OR target_class = 'all')
-                     ORDER BY name''', (str(class_id),))
-        
-        categories = []
-        for row in c.fetchall():
-            categories.append({
-                'id': row[0],
-                'name': row[1],
-                'description': row[2],
-                'category_type': row[3],
-                'paid_status': row[4]
-            })
-        
-        conn.close()
-        return jsonify({'success': True, 'categories': categories})
-        
+        return _catalogue_response({'success': True, 'categories': _category_payload(class_id)}, class_id)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -5828,18 +5950,6 @@ def before_request_handler():
             conn = sqlite3.connect(DATABASE)
             c = conn.cursor()
             
-            # Create blocked_users table if it doesn't exist
-            c.execute('''CREATE TABLE IF NOT EXISTS blocked_users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                username TEXT NOT NULL,
-                role TEXT NOT NULL,
-                reason TEXT NOT NULL,
-                blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT 'warning',
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )''')
-            
             # Check if user is blocked
             c.execute('SELECT status, reason FROM blocked_users WHERE user_id = ?', (user_id,))
             blocked_info = c.fetchone()
@@ -5872,39 +5982,16 @@ def before_request_handler():
         ua = request.headers.get('User-Agent', '')[:300]
         now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
+        # Feed the dashboard rollups (queued, applied in batches off the request path)
+        record_hit(ip, user_id, path)
+
         # Use a separate connection for IP tracking to avoid conflicts
         conn = None
         try:
-            conn = sqlite3.connect(DATABASE, timeout=30.0)  # 30 second timeout
-            conn.execute('PRAGMA journal_mode=WAL')  # Use WAL mode for better concurrency
-            conn.execute('PRAGMA busy_timeout=30000')  # 30 second busy timeout
+            # WAL mode is persistent (set by init_db) and timeout doubles as the busy timeout
+            conn = sqlite3.connect(DATABASE, timeout=30.0)
             c = conn.cursor()
             
-            # Ensure tables exist (in case of reload)
-            c.execute('''CREATE TABLE IF NOT EXISTS ip_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ip TEXT,
-                user_id INTEGER,
-                path TEXT,
-                user_agent TEXT,
-                visited_at TEXT
-            )''')
-            c.execute('''CREATE TABLE IF NOT EXISTS user_activity (
-                user_id INTEGER PRIMARY KEY,
-                ip TEXT,
-                last_seen TEXT
-            )''')
-            c.execute('''CREATE TABLE IF NOT EXISTS active_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                session_id TEXT NOT NULL,
-                ip_address TEXT NOT NULL,
-                user_agent TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                last_activity TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id)
-            )''')
-            
             # Insert IP log
             c.execute('INSERT INTO ip_logs (ip, user_id, path, user_agent, visited_at) VALUES (?, ?, ?, ?, ?)',
                       (ip, user_id, path, ua, now_str))
@@ -5930,11 +6017,8 @@ def before_request_handler():
                     if conn:
                         conn.close()
                     conn = sqlite3.connect(DATABASE, timeout=30.0)
-                    conn.execute('PRAGMA journal_mode=WAL')
-                    conn.execute('PRAGMA busy_timeout=30000')
                     c = conn.cursor()
                     
-                    # Just insert the IP log without table creation (tables should exist by now)
                     c.execute('INSERT INTO ip_logs (ip, user_id, path, user_agent, visited_at) VALUES (?, ?, ?, ?, ?)',
                               (ip, user_id, path, ua, now_str))
                     
@@ -5967,30 +6051,52 @@ def api_admin_metrics_traffic():
     if session.get('role') not in ['admin', 'teacher']:
         return jsonify({'success': False, 'error': 'Unauthorized'}), 401
     try:
+        # Unique IP counts, hits and top paths come from the pre-aggregated rollups
+        data = get_traffic_summary(window_seconds=600)
         conn = sqlite3.connect(DATABASE)
         c = conn.cursor()
-        # Total unique IPs (all time)
-        c.execute('SELECT COUNT(DISTINCT ip) FROM ip_logs')
-        total_unique_ips = c.fetchone()[0] or 0
-        # Unique IPs today (local time)
-        c.execute("SELECT COUNT(DISTINCT ip) FROM ip_logs WHERE date(visited_at) = date('now','localtime')")
-        unique_ips_today = c.fetchone()[0] or 0
-        # Active IPs in last 10 minutes
-        c.execute("SELECT COUNT(DISTINCT ip) FROM ip_logs WHERE visited_at >= datetime('now','-10 minutes','localtime')")
-        active_ips_now = c.fetchone()[0] or 0
-        # Active logged-in users in last 10 minutes
-        c.execute("SELECT COUNT(*) FROM user_activity WHERE last_seen >= datetime('now','-10 minutes','localtime') AND user_id IS NOT NULL")
-        active_logged_in_users = c.fetchone()[0] or 0
+        # Active logged-in users in last 10 minutes (user_activity has one row per user)
+        c.execute('SELECT COUNT(*) FROM user_activity WHERE last_seen_ts >= ? AND user_id IS NOT NULL', (epoch_now() - 600,))
+        data['active_logged_in_users'] = c.fetchone()[0] or 0
         conn.close()
-        return jsonify({
-            'success': True,
-            'data': {
-                'total_unique_ips': total_unique_ips,
-                'unique_ips_today': unique_ips_today,
-                'active_ips_now': active_ips_now,
-                'active_logged_in_users': active_logged_in_users
-            }
-        })
+        return jsonify({'success': True, 'data': data})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/metrics/request-memo')
+def api_admin_metrics_request_memo():
+    if session.get('role') not in ['admin', 'teacher']:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    try:
+        # Repeated read-helper calls answered from the per-request memo, per endpoint
+        stats = get_request_memo_stats()
+        if request.args.get('reset') == '1':
+            reset_request_memo_stats()
+        return jsonify({'success': True, 'data': stats})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/metrics/page-cache', methods=['GET', 'POST'])
+def api_admin_metrics_page_cache():
+    if session.get('role') not in ['admin', 'teacher']:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    try:
+        # POST drops every cached page in this worker (others expire within their TTL)
+        if request.method == 'POST':
+            invalidate_page_cache()
+        return jsonify({'success': True, 'data': get_page_cache_stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/metrics/traffic/daily')
+def api_admin_metrics_daily():
+    if session.get('role') not in ['admin', 'teacher']:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    try:
+        days = int(request.args.get('days', 30))
+        if days < 1 or days > 366:
+            days = 30
+        return jsonify({'success': True, 'data': get_daily_traffic(days)})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -6008,7 +6114,7 @@ def api_admin_metrics_logs():
             SELECT l.ip, l.user_id, IFNULL(u.username,''), l.path, l.user_agent, l.visited_at
             FROM ip_logs l
             LEFT JOIN users u ON u.id = l.user_id
-            ORDER BY datetime(l.visited_at) DESC
+            ORDER BY l.visited_ts DESC
             LIMIT ?
         ''', (limit,))
         rows = c.fetchall()
@@ -6034,9 +6140,9 @@ def api_admin_metrics_active():
             SELECT ua.user_id, IFNULL(u.username,''), ua.ip, ua.last_seen
             FROM user_activity ua
             LEFT JOIN users u ON u.id = ua.user_id
-            WHERE ua.last_seen >= datetime('now','-10 minutes','localtime') AND ua.user_id IS NOT NULL
-            ORDER BY datetime(ua.last_seen) DESC
-        ''')
+            WHERE ua.last_seen_ts >= ? AND ua.user_id IS NOT NULL
+            ORDER BY ua.last_seen_ts DESC
+        ''', (epoch_now() - 600,))
         rows = c.fetchall()
         conn.close()
         data = [
@@ -6147,41 +6253,25 @@ def api_check_admission_credentials():
     except Exception as e:
         return jsonify({'valid': False, 'error': str(e)}), 500
 
-def cleanup_stale_sessions():
-    """Clean up stale sessions periodically"""
-    import threading
-    import time
-    
-    def cleanup():
-        while True:
-            try:
-                current_time = datetime.now()
-                stale_sessions = []
-                
-                for session_id, session_data in active_sessions.items():
-                    last_ping = session_data.get('last_ping', session_data.get('connected_at'))
-                    if current_time - last_ping > timedelta(minutes=5):  # 5 minutes timeout
-                        stale_sessions.append(session_id)
-                
-                for session_id in stale_sessions:
-                    print(f"Cleaning up stale session: {session_id}")
-                    # Clean up from rooms
-                    if session_id in active_sessions:
-                        user_rooms = active_sessions[session_id].get('rooms', [])
-                        for room in user_rooms:
-                            if room in room_participants and session_id in room_participants[room]:
-                                room_participants[room].remove(session_id)
-                        del active_sessions[session_id]
-                
-                time.sleep(60)  # Run cleanup every minute
-                
-            except Exception as e:
-                print(f"Error in session cleanup: {e}")
-                time.sleep(60)
-    
-    cleanup_thread = threading.Thread(target=cleanup, daemon=True)
-    cleanup_thread.start()
-    print("🧹 Session cleanup service started")
+def cleanup_stale_socket_sessions():
+    """Drop this process's Socket.IO sessions that have not pinged for 5 minutes"""
+    current_time = datetime.now()
+    stale_sessions = []
+    
+    for session_id, session_data in list(active_sessions.items()):
+        last_ping = session_data.get('last_ping', session_data.get('connected_at'))
+        if current_time - last_ping > timedelta(minutes=5):  # 5 minutes timeout
+            stale_sessions.append(session_id)
+    
+    for session_id in stale_sessions:
+        print(f"Cleaning up stale session: {session_id}")
+        # Clean up from rooms
+        if session_id in active_sessions:
+            user_rooms = active_sessions[session_id].get('rooms', [])
+            for room in user_rooms:
+                if room in room_participants and session_id in room_participants[room]:
+                    room_participants[room].remove(session_id)
+            del active_sessions[session_id]
 
 @app.route('/api/categories/by-name/<path:class_name>')
 def api_get_categories_by_class_name(class_name):
@@ -6192,23 +6282,8 @@ def api_get_categories_by_class_name(class_name):
         if not class_id:
             return jsonify({'success': False, 'error': f'Unknown class name: {class_name}'}), 400
 
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute('''SELECT id, name, description, category_type, paid_status 
-                     FROM categories 
-                     WHERE is_active = 1 AND (target_class = ? OR target_class = 'all')
-                     ORDER BY name''', (str(class_id),))
-        categories = [
-            {
-                'id': row[0],
-                'name': row[1],
-                'description': row[2],
-                'category_type': row[3],
-                'paid_status': row[4]
-            } for row in c.fetchall()
-        ]
-        conn.close()
-        return jsonify({'success': True, 'categories': categories, 'class_id': class_id})
+        categories = _category_payload(class_id)
+        return _catalogue_response({'success': True, 'categories': categories, 'class_id': class_id}, class_id)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
@@ -6691,16 +6766,17 @@ def personal_chat_page():
         return redirect('/auth')
     
     user_id = session['user_id']
-    conversations = get_user_conversations(user_id)
-    users = get_all_users()
+    inbox = get_inbox_page(user_id)
     
+    # The new-chat picker searches users on demand (/api/chat/users)
     return render_template('personal_chat.html', 
-                         conversations=conversations, 
-                         users=users, 
+                         conversations=inbox['conversations'], 
+                         next_before=inbox['next_before'],
                          current_user_id=user_id)
 
 @app.route('/api/send-message', methods=['POST'])
 def send_message():
+    """Fallback for clients without a socket; see the send_chat_message event"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
@@ -6709,12 +6785,13 @@ def send_message():
     receiver_id = data.get('receiver_id')
     message = data.get('message')
     
-    if not receiver_id or not message:
+    if not receiver_id or not message or not str(receiver_id).isdigit():
         return jsonify({'error': 'Missing receiver_id or message'}), 400
     
-    success = send_personal_message(sender_id, receiver_id, message)
-    if success:
-        return jsonify({'success': True, 'message': 'Message sent'})
+    stored = store_personal_message(sender_id, int(receiver_id), message, data.get('client_id'))
+    if stored:
+        chat_message = push_chat_message(stored)
+        return jsonify({'success': True, 'message': 'Message sent', 'chat_message': chat_message})
     else:
         return jsonify({'error': 'Failed to send message'}), 500
 
@@ -6722,6 +6799,8 @@ def send_message():
 def send_personal_messages():
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
+    if session.get('role') not in ['admin', 'teacher']:
+        return jsonify({'error': 'Unauthorized'}), 403
     
     data = request.get_json()
     user_type = data.get('user_type')
@@ -6730,56 +6809,74 @@ def send_personal_messages():
     
     if not user_type or not message:
         return jsonify({'error': 'Missing user_type or message'}), 400
+    if user_type not in BROADCAST_AUDIENCES:
+        return jsonify({'error': 'Invalid user type'}), 400
     
     try:
-        # Get users based on type
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        
-        if user_type == 'all':
-            c.execute('SELECT id FROM users WHERE id != ?', (sender_id,))
-        elif user_type == 'paid':
-            c.execute('SELECT id FROM users WHERE paid = "paid" AND id != ?', (sender_id,))
-        elif user_type == 'unpaid':
-            c.execute('SELECT id FROM users WHERE paid = "not paid" AND id != ?', (sender_id,))
-        else:
-            return jsonify({'error': 'Invalid user type'}), 400
-        
-        user_ids = [row[0] for row in c.fetchall()]
-        conn.close()
-        
-        if not user_ids:
+        # One INSERT ... SELECT for the whole audience
+        sent = broadcast_personal_message(sender_id, message, user_type)
+        if sent is None:
+            return jsonify({'error': 'Failed to send personal messages'}), 500
+        if not sent:
             return jsonify({'error': f'No users found for type: {user_type}'}), 404
         
-        # Send personal messages to all users
-        success_count = 0
-        for user_id in user_ids:
-            if send_personal_message(sender_id, user_id, message):
-                success_count += 1
+        if data.get('notify', True):
+            socketio.start_background_task(notify_broadcast_recipients, sender_id, message, sent,
+                                           datetime.now().isoformat())
         
         return jsonify({
             'success': True, 
-            'message': f'Personal messages sent to {success_count} users',
-            'total_users': len(user_ids),
-            'success_count': success_count
+            'message': f'Personal messages sent to {len(sent)} users',
+            'total_users': len(sent),
+            'success_count': len(sent)
         })
         
     except Exception as e:
         print(f"Error sending personal messages: {e}")
         return jsonify({'error': 'Failed to send personal messages'}), 500
 
+BROADCAST_NOTIFY_BATCH = 200  # chat events emitted before yielding to other greenlets/threads
+
+def notify_broadcast_recipients(sender_id, message, sent, timestamp):
+    """Push a broadcast message to the recipients that have a chat socket open, in batches"""
+    online = {info.get('chat_user_id') for info in list(active_sessions.values())}
+    targets = [(message_id, receiver_id) for message_id, receiver_id in sent if receiver_id in online]
+    for start in range(0, len(targets), BROADCAST_NOTIFY_BATCH):
+        for message_id, receiver_id in targets[start:start + BROADCAST_NOTIFY_BATCH]:
+            socketio.emit('new_chat_message', {
+                'id': message_id,
+                'sender_id': sender_id,
+                'receiver_id': receiver_id,
+                'message': message,
+                'created_at': timestamp,
+                'timestamp': timestamp
+            }, room=f'user_{receiver_id}')
+        socketio.sleep(0)
+    if targets:
+        print(f"✅ Broadcast pushed to {len(targets)} online recipients")
+
 @app.route('/api/get-messages/<int:other_user_id>')
 def get_messages(other_user_id):
+    """Fallback for clients without a socket; see the chat_history event"""
     if 'user_id' not in session:
         return jsonify({'error': 'Not authenticated'}), 401
     
     user_id = session['user_id']
-    messages = get_personal_messages(user_id, other_user_id)
-    
-    # Mark messages as read
-    mark_messages_as_read(user_id, other_user_id)
-    
-    return jsonify({'messages': messages})
+    before_id = request.args.get('before_id', type=int)
+    limit = min(max(request.args.get('limit', CHAT_HISTORY_PAGE_SIZE, type=int), 1), 200)
+    messages = get_personal_messages(user_id, other_user_id, limit=limit + 1, before_id=before_id)
+    
+    # Opening a conversation reads it; older pages were read before
+    if before_id is None:
+        marks = acknowledge_personal_messages(user_id, other_user_id, read=True)
+        if marks and marks['changed']:
+            emit_chat_receipt(user_id, other_user_id, marks)
+    
+    return jsonify({
+        'messages': messages[:limit],
+        'has_more': len(messages) > limit,
+        'receipts': get_chat_receipts(user_id, other_user_id)
+    })
 
 @app.route('/api/search-users')
 def search_users():
@@ -6833,6 +6930,30 @@ def get_conversations():
     conversations = get_user_conversations(user_id)
     return jsonify({'conversations': conversations})
 
+@app.route('/api/conversations')
+def get_conversations_page():
+    """One page of the inbox; pass the previous page's next_before to get the next one"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    limit = min(max(request.args.get('limit', INBOX_PAGE_SIZE, type=int), 1), 100)
+    try:
+        inbox = get_inbox_page(session['user_id'], limit=limit, before=request.args.get('before'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(inbox)
+
+@app.route('/api/chat/users')
+def search_chat_users_api():
+    """Users to start a personal chat with, by username or email prefix"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    query = request.args.get('q', '').strip()
+    if len(query) < 2:
+        return jsonify({'users': []})
+    return jsonify({'users': search_chat_users(query, exclude_user_id=session['user_id'])})
+
 @app.route('/api/mark-notification-seen/<int:notification_id>', methods=['POST'])
 def mark_notification_seen_api(notification_id):
     if 'user_id' not in session:
@@ -6847,43 +6968,155 @@ def mark_notification_seen_api(notification_id):
         success = mark_messages_as_read(user_id, notification_id)
     else:
         # Mark regular notification as seen
-        success = mark_notification_as_read(user_id, notification_id, 'general')
+        success = mark_notification_as_seen(user_id, notification_id)
     
     if success:
         return jsonify({'success': True, 'message': 'Item marked as seen'})
     else:
         return jsonify({'error': 'Failed to mark item as seen'}), 500
 
+@app.route('/api/notifications/mark-all-read', methods=['POST'])
+def mark_all_notifications_read_api():
+    """Mark every class and personal notification read (one write, however many there are)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    upto_id = data.get('upto_id')
+    if upto_id is not None and not str(upto_id).isdigit():
+        return jsonify({'error': 'Invalid upto_id'}), 400
+    
+    if mark_all_notifications_read(session['user_id'], int(upto_id) if upto_id is not None else None):
+        return jsonify({'success': True})
+    return jsonify({'error': 'Failed to mark notifications as read'}), 500
+
 # Socket.IO events for real-time chat
+# Every chat socket of a logged-in user joins user_<id>. Messages are saved
+# before they are pushed and carry their database ID; clients acknowledge
+# delivery and reading per conversation ('chat_ack') and senders get the
+# result as 'chat_receipt'. The /api/send-message and /api/get-messages
+# routes do the same over HTTP for clients without a socket.
+CHAT_ACK_MAX_CONVERSATIONS = 50     # conversations acknowledged per chat_ack event
+
+CHAT_MESSAGE_KEYS = ('id', 'sender_id', 'receiver_id', 'message', 'created_at', 'is_read', 'sender_name')
+
+def push_chat_message(stored):
+    """
+    Send a saved personal message to the receiver's and the sender's open chat sockets
+
+    A resend that matched an earlier client_id was pushed the first time, so
+    it is only returned (for the sender's ack), not emitted again.
+    """
+    chat_message = {
+        'id': stored['id'],
+        'sender_id': stored['sender_id'],
+        'receiver_id': stored['receiver_id'],
+        'message': stored['message'],
+        'created_at': stored['created_at'],
+        'created_ts': stored['created_ts'],
+        'client_id': stored['client_msg_id'],
+        'timestamp': stored['created_at']
+    }
+    if not stored['created']:
+        return chat_message
+    socketio.emit('new_chat_message', chat_message, room=f"user_{stored['receiver_id']}")
+    # The sender's other tabs; a sending socket gets the message in its ack
+    socketio.emit('new_chat_message', chat_message, room=f"user_{stored['sender_id']}",
+                  skip_sid=getattr(request, 'sid', None))
+    return chat_message
+
+def emit_chat_receipt(reader_id, sender_id, marks):
+    """Tell a sender (and the reader's other tabs) how far the reader has got"""
+    receipt = {
+        'reader_id': reader_id,
+        'sender_id': sender_id,
+        'delivered_upto': marks['delivered_upto'],
+        'read_upto': marks['read_upto']
+    }
+    socketio.emit('chat_receipt', receipt, room=f'user_{sender_id}')
+    socketio.emit('chat_receipt', receipt, room=f'user_{reader_id}')
+
 @socketio.on('join_chat')
-def handle_join_chat(data):
-    user_id = data.get('user_id')
-    if user_id:
-        join_room(f'user_{user_id}')
-        emit('joined_chat', {'user_id': user_id})
+def handle_join_chat(data=None):
+    user_id = session.get('user_id')
+    if not user_id:
+        emit('error', {'message': 'Not authenticated'})
+        return
+    join_room(f'user_{user_id}')
+    # Lets broadcasts skip recipients without an open chat socket
+    if request.sid in active_sessions:
+        active_sessions[request.sid]['chat_user_id'] = user_id
+    emit('joined_chat', {'user_id': user_id})
+    
+    # Whatever arrived while the user was offline is delivered now
+    for peer_id, delivered_upto, read_upto in mark_chats_delivered(user_id):
+        emit_chat_receipt(user_id, peer_id, {'delivered_upto': delivered_upto, 'read_upto': read_upto})
 
 @socketio.on('send_chat_message')
 def handle_send_chat_message(data):
-    sender_id = data.get('sender_id')
+    """Save and deliver a personal message; the return value is the sender's ack"""
+    sender_id = session.get('user_id')
+    if not sender_id:
+        return {'success': False, 'error': 'Not authenticated'}
+    
+    data = data or {}
     receiver_id = data.get('receiver_id')
-    message = data.get('message')
+    message = (data.get('message') or '').strip()
+    if not message or not str(receiver_id).isdigit():
+        return {'success': False, 'error': 'Missing receiver_id or message'}
     
-    if sender_id and receiver_id and message:
-        success = send_personal_message(sender_id, receiver_id, message)
-        if success:
-            # Emit to both sender and receiver
-            emit('new_chat_message', {
-                'sender_id': sender_id,
-                'receiver_id': receiver_id,
-                'message': message,
-                'timestamp': datetime.now().isoformat()
-            }, room=f'user_{sender_id}')
-            emit('new_chat_message', {
-                'sender_id': sender_id,
-                'receiver_id': receiver_id,
-                'message': message,
-                'timestamp': datetime.now().isoformat()
-            }, room=f'user_{receiver_id}')
+    stored = store_personal_message(sender_id, int(receiver_id), message, data.get('client_id'))
+    if stored is None:
+        return {'success': False, 'error': 'Failed to send message'}
+    return {'success': True, 'message': push_chat_message(stored)}
+
+@socketio.on('chat_ack')
+def handle_chat_ack(data):
+    """
+    Delivery/read acknowledgements, one entry per conversation:
+    {'acks': [{'peer_id': 7, 'upto_id': 1234, 'read': true}, ...]}
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return {'success': False, 'error': 'Not authenticated'}
+    
+    acks = (data or {}).get('acks') or []
+    for ack in acks[:CHAT_ACK_MAX_CONVERSATIONS]:
+        try:
+            peer_id = int(ack['peer_id'])
+            upto_id = int(ack['upto_id'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        marks = acknowledge_personal_messages(user_id, peer_id, upto_id, read=bool(ack.get('read')))
+        if marks and marks['changed']:
+            emit_chat_receipt(user_id, peer_id, marks)
+    return {'success': True}
+
+@socketio.on('chat_history')
+def handle_chat_history(data):
+    """
+    One page of a conversation, newest first: {'peer_id': 7, 'before_id': 1234}
+    Omit before_id for the latest page; pass the oldest ID shown for the next one.
+    """
+    user_id = session.get('user_id')
+    if not user_id:
+        return {'success': False, 'error': 'Not authenticated'}
+    
+    data = data or {}
+    try:
+        peer_id = int(data['peer_id'])
+        before_id = int(data['before_id']) if data.get('before_id') is not None else None
+        limit = min(max(int(data.get('limit') or CHAT_HISTORY_PAGE_SIZE), 1), 200)
+    except (KeyError, TypeError, ValueError):
+        return {'success': False, 'error': 'Invalid history request'}
+    
+    rows = get_personal_messages(user_id, peer_id, limit=limit + 1, before_id=before_id)
+    return {
+        'success': True,
+        'messages': [dict(zip(CHAT_MESSAGE_KEYS, row)) for row in rows[:limit]],
+        'has_more': len(rows) > limit,
+        'receipts': get_chat_receipts(user_id, peer_id)
+    }
 
 @socketio.on('request_host_stream')
 def handle_request_host_stream(data):
@@ -7223,16 +7456,9 @@ def handle_class_ended(data):
     try:
         class_id = data.get('class_id')
         
-        # Update class status in database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE live_classes 
-            SET status = 'completed', ended_at = ? 
-            WHERE id = ?
-        ''', (datetime.now().isoformat(), class_id))
-        conn.commit()
-        conn.close()
+        # Update class status in database (also notifies live_class_updates listeners)
+        from auth_handler import end_live_class
+        end_live_class(class_id)
         
         # Broadcast to all clients in the room
         emit('class_ended', {
@@ -7337,6 +7563,46 @@ def user_has_access_to_resource(filename: str, role: str) -> bool:
     except Exception:
         return False
 
+# --- Background jobs ---
+# Every process runs the scheduler; leader jobs run in one process per slot.
+def run_session_cleanup():
+    cleanup_stale_sessions()
+    cleanup_stale_uploads()
+    cleanup_stale_exports()
+
+def run_daily_reset():
+    from daily_reset import daily_reset
+    daily_reset()
+
+schedule_interval('blocked_user_statuses', update_blocked_user_statuses, 300, jitter=30)
+# Timers fire the transitions; the reload picks up classes created by other workers
+schedule_interval('live_class_timer_reload', reload_live_class_timers, 300, leader=False)
+schedule_interval('session_cleanup', run_session_cleanup, 3600, jitter=120, lease=1800)
+schedule_interval('socket_session_cleanup', cleanup_stale_socket_sessions, 60, leader=False)
+schedule_cron('daily_reset', run_daily_reset, '0 0 * * *', jitter=60)
+
+# --- Application factory ---
+# Importing this module only defines the app and its routes: no database work,
+# no threads, no heavy libraries (bulk upload, Drive sync, YouTube and Excel
+# export load on first use). Each server process calls create_app() once to
+# bootstrap the schema and start its background services, e.g.
+# gunicorn 'app:create_app()'.
+_app_started = False
+_app_started_lock = threading.Lock()
+
+def create_app():
+    """Bootstrap the schema and start this process's background services (idempotent)"""
+    global _app_started
+    with _app_started_lock:
+        if not _app_started:
+            _app_started = True
+            bootstrap_schema()
+            start_job_workers()
+            start_live_class_timers()
+            start_scheduler()
+            threading.Thread(target=get_site_last_updated, daemon=True, name='site-last-updated').start()
+    return app
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
     # Configure logging to file for all server output
@@ -7369,12 +7635,9 @@ if __name__ == '__main__':
         # Fallback quietly if logging setup fails
         pass
     
-    # Initialize database and services within application context
+    # Schema bootstrap and background services
     try:
-        with app.app_context():
-            setup_db()
-            cleanup_stale_sessions()
-            start_session_cleanup_service()
+        create_app()
         print("✅ Database and services initialized successfully")
     except Exception as e:
         print(f"⚠️  Warning: Service initialization error: {e}")
@@ -7390,7 +7653,7 @@ if __name__ == '__main__':
         print(f"External access: http://0.0.0.0:{port}")
         print("Mobile access: Use your computer's IP address")
         print("Note: WebRTC features require HTTPS in production")
-        print("Session cleanup service: Active (runs every hour)")
+        print("Background scheduler: Active (jobs and history at /admin/scheduler)")
         print("Auto-restart: Enabled (server will restart on errors)")
         print("To stop: Press Ctrl+C")
         print("=" * 60)
@@ -0,0 +1,387 @@
+"""
+Static Asset Pipeline for Sunrise Education Centre
+Builds minified, content-hashed and precompressed CSS/JS into static/dist.
+
+Pages link their stylesheets and scripts through the ``asset_url()`` template
+helper. After a build it returns ``/static/dist/<name>.<hash>.<ext>`` from
+the manifest, and ``send_asset`` serves that file, or its ``.br``/``.gz``
+variant if the browser accepts one, with a one-year immutable Cache-Control:
+any change to the source changes the hash and so the URL. Without a build
+(local development) ``asset_url()`` falls back to the plain source path,
+which the catch-all static route still serves (bundles are concatenated on
+the fly by ``send_bundle``).
+
+Every .css/.js file in ASSET_DIRS is built on its own, and each entry in
+ASSET_BUNDLES concatenates several sources that most pages load together.
+Brotli variants need the optional ``brotli`` package; without it only .gz
+files are written.
+
+Usage:
+    python asset_pipeline.py          # build static/dist and its manifest
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+from flask import Response, abort, request, send_from_directory
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+DIST_DIR = os.path.join('static', 'dist')
+DIST_URL = '/static/dist/'
+BUNDLE_URL = '/static/bundle/'        # unbuilt bundles, concatenated per request
+MANIFEST_FILE = 'manifest.json'
+
+# Directories whose .css/.js files are built (not recursive)
+ASSET_DIRS = ['.', 'attached_assets', 'bulk_upload']
+
+# Bundle name -> sources concatenated in this order
+ASSET_BUNDLES: Dict[str, List[str]] = {
+    'site.css': ['style.css', 'floating-navbar.css', 'uiverse-components.css'],
+}
+
+HASH_LENGTH = 10
+MIN_COMPRESS_SIZE = 512                 # smaller files are not worth an extra request variant
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_manifest: Optional[Dict[str, str]] = None
+_manifest_lock = threading.Lock()
+
+
+# --- Minification ---
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+_CSS_STRING = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+
+
+def minify_css(source: str) -> str:
+    """
+    Strip comments and redundant whitespace from a stylesheet
+
+    Strings are left untouched; spaces are only dropped around ``{ } ; ,
+    >`` and after ``:``, so selectors such as ``a :hover`` and ``calc()``
+    expressions keep their meaning.
+    """
+    strings: List[str] = []
+
+    def keep(match):
+        strings.append(match.group(0))
+        return f'\x00{len(strings) - 1}\x00'
+
+    css = _CSS_STRING.sub(keep, source)
+    css = _CSS_COMMENT.sub('', css)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}')
+    css = re.sub(r'\x00(\d+)\x00', lambda m: strings[int(m.group(1))], css)
+    return css.strip()
+
+
+# Characters/keywords after which a '/' starts a regular expression rather than a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORD = re.compile(r'(?:^|[^\w$])(?:return|typeof|case|do|else|in|of|void|yield|await)$')
+
+
+def _skip_literal(source: str, i: int) -> int:
+    """Index just past the string/template literal starting at i"""
+    quote, end = source[i], i + 1
+    while end < len(source) and source[end] != quote:
+        end += 2 if source[end] == '\\' else 1
+    return end + 1
+
+
+def _skip_regex(source: str, i: int) -> int:
+    """Index just past the regular expression literal (with flags) starting at i"""
+    end, in_class = i + 1, False
+    while end < len(source) and source[end] != '\n':
+        c = source[end]
+        if c == '\\':
+            end += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            end += 1
+            break
+        end += 1
+    while end < len(source) and (source[end].isalnum()):
+        end += 1
+    return end
+
+
+def minify_js(source: str) -> str:
+    """
+    Strip comments, indentation and blank lines from a script
+
+    Line breaks are kept, so automatic semicolon insertion behaves exactly
+    as in the source. String, template and regular expression literals
+    (including multi-line templates) are copied verbatim.
+    """
+    out: List[str] = []
+    i, n = 0, len(source)
+    last = ''           # last significant character written
+
+    def newline():
+        while out and out[-1] in (' ', '\t', '\r'):
+            out.pop()
+        if out and out[-1] != '\n':
+            out.append('\n')
+
+    while i < n:
+        ch = source[i]
+        nxt = source[i + 1] if i + 1 < n else ''
+
+        if ch in '"\'`':
+            end = _skip_literal(source, i)
+            out.append(source[i:end])
+            i, last = end, ch
+        elif ch == '/' and nxt == '/':
+            while i < n and source[i] != '\n':
+                i += 1
+        elif ch == '/' and nxt == '*':
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            # Keep a line break the comment spanned so statements stay apart
+            if '\n' in source[i:end]:
+                newline()
+            else:
+                out.append(' ')
+            i = end
+        elif ch == '/' and (last == '' or last in _REGEX_PRECEDERS
+                            or _REGEX_KEYWORD.search(''.join(out[-12:]).rstrip())):
+            end = _skip_regex(source, i)
+            out.append(source[i:end])
+            i, last = end, '/'
+        elif ch == '\n':
+            newline()
+            i += 1
+            while i < n and source[i] in ' \t\r\n':
+                i += 1
+        elif ch in ' \t\r' and (not out or out[-1] in (' ', '\t', '\n')):
+            i += 1      # indentation and runs of spaces
+        else:
+            out.append(ch)
+            if not ch.isspace():
+                last = ch
+            i += 1
+
+    newline()
+    return ''.join(out).strip()
+
+
+def minify(name: str, source: str) -> str:
+    """Minify CSS or JS by file extension; anything else is returned as is"""
+    if name.endswith('.css'):
+        return minify_css(source)
+    if name.endswith('.js'):
+        return minify_js(source)
+    return source
+
+
+# --- Build ---
+
+def find_sources() -> List[str]:
+    """Every .css/.js file in ASSET_DIRS, as forward-slash paths from the repo root"""
+    sources = []
+    for directory in ASSET_DIRS:
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(('.css', '.js')) and not name.endswith(('.min.css', '.min.js')):
+                path = os.path.normpath(os.path.join(directory, name))
+                if os.path.isfile(path):
+                    sources.append(path.replace(os.sep, '/'))
+    return sources
+
+
+def hashed_name(name: str, content: bytes) -> str:
+    """'dir/app.css' -> 'dir/app.<content hash>.css'"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _write(path: str, content: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def _write_variants(path: str, content: bytes) -> List[str]:
+    """Write .gz (and .br) next to path when they are smaller; returns the suffixes written"""
+    written = []
+    if len(content) < MIN_COMPRESS_SIZE:
+        return written
+    compressed = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(compressed) < len(content):
+        _write(path + '.gz', compressed)
+        written.append('.gz')
+    if BROTLI_AVAILABLE:
+        compressed = brotli.compress(content, quality=11)
+        if len(compressed) < len(content):
+            _write(path + '.br', compressed)
+            written.append('.br')
+    return written
+
+
+def _read_manifest_file() -> Dict[str, str]:
+    try:
+        with open(os.path.join(DIST_DIR, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remove_stale(keep: set) -> int:
+    removed = 0
+    for root, _, files in os.walk(DIST_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, DIST_DIR).replace(os.sep, '/')
+            base = re.sub(r'\.(gz|br)$', '', relative)
+            if relative != MANIFEST_FILE and base not in keep:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def build_assets() -> Dict[str, str]:
+    """
+    Build every asset and bundle into DIST_DIR and write the manifest
+
+    Files from the previous build are kept, so pages rendered by workers
+    still running the old manifest keep loading during a deploy; anything
+    older is removed.
+
+    Returns:
+        Dict[str, str]: Manifest mapping source/bundle name to hashed file name
+    """
+    previous = _read_manifest_file()
+    manifest: Dict[str, str] = {}
+    original_size = built_size = 0
+
+    outputs = {name: [name] for name in find_sources()}
+    outputs.update(ASSET_BUNDLES)
+
+    for name, parts in outputs.items():
+        try:
+            sources = []
+            for part in parts:
+                with open(part, encoding='utf-8') as f:
+                    sources.append(f.read())
+            raw = '\n'.join(sources)
+            content = minify(name, raw).encode('utf-8')
+            target = hashed_name(name, content)
+            path = os.path.join(DIST_DIR, target)
+            _write(path, content)
+            variants = _write_variants(path, content)
+            manifest[name] = target
+            original_size += len(raw.encode('utf-8'))
+            built_size += len(content)
+            print(f"   {name:<36} -> {target} ({len(content)} bytes{', ' + ' '.join(variants) if variants else ''})")
+        except Exception as e:
+            print(f"❌ Error building asset {name}: {e}")
+
+    _write(os.path.join(DIST_DIR, MANIFEST_FILE), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    removed = _remove_stale(set(manifest.values()) | set(previous.values()))
+    reload_manifest()
+
+    if not BROTLI_AVAILABLE:
+        print("❌ brotli not installed, only .gz variants written")
+    print(f"✅ Built {len(manifest)} assets into {DIST_DIR}: {original_size} -> {built_size} bytes minified"
+          f"{f', {removed} stale files removed' if removed else ''}")
+    return manifest
+
+
+# --- Serving ---
+
+def get_manifest() -> Dict[str, str]:
+    """Manifest of the last build, read once per process (empty without a build)"""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = _read_manifest_file()
+    return _manifest
+
+
+def reload_manifest() -> None:
+    """Forget the cached manifest so the next asset_url() reads it again"""
+    global _manifest
+    with _manifest_lock:
+        _manifest = None
+
+
+def asset_url(name: str) -> str:
+    """
+    URL for a stylesheet, script or bundle, for use in templates
+
+    Args:
+        name: Source path from the repo root ('style.css', 'attached_assets/theme.js')
+              or a bundle name ('site.css')
+
+    Returns:
+        str: Hashed static/dist URL after a build, otherwise the plain source path
+    """
+    name = name.lstrip('/')
+    target = get_manifest().get(name)
+    if target:
+        return DIST_URL + target
+    if name in ASSET_BUNDLES:
+        return BUNDLE_URL + name
+    return '/' + name
+
+
+def send_asset(filename: str):
+    """
+    Serve a built asset, precompressed when the client accepts it
+
+    Only files named in the manifest are served, all with immutable caching.
+    """
+    if filename not in set(get_manifest().values()):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings.quality(candidate) > 0 and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            encoding = candidate
+            filename += suffix
+            break
+
+    response = send_from_directory(DIST_DIR, filename, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def send_bundle(name: str):
+    """Serve an unbuilt bundle by concatenating its sources (development only, not cached)"""
+    parts = ASSET_BUNDLES.get(name)
+    if not parts:
+        abort(404)
+    sources = []
+    for part in parts:
+        with open(part, encoding='utf-8') as f:
+            sources.append(f.read())
+    response = Response('\n'.join(sources), mimetype=mimetypes.guess_type(name)[0] or 'text/plain')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+if __name__ == '__main__':
+    build_assets()
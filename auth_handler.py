@@ -1,8 +1,18 @@
 import sqlite3
+import threading
+import time
 from datetime import datetime, timezone
 
 # Import time configuration for IST
 from time_config import get_current_ist_time, format_ist_time, get_ist_timestamp
+from password_service import hash_password, verify_password
+from data_archive import archive_where
+import live_class_timers
+from request_cache import request_memoized, clear_request_memo
+from reference_cache import reference_cached, invalidate_reference
+from notification_read_state import (
+    VISIBLE_TO_USER_SQL, UNREAD_SQL, mark_notification_read, forget_notification_reads
+)
 
 # Standard database path constant
 DATABASE = 'users.db'
@@ -292,13 +302,22 @@ def init_db():
         if c.fetchone() is None:
             # Admin user does not exist, create it.
             c.execute("INSERT INTO users (username, password, class_id, paid) VALUES (?, ?, ?, ?)",
-                      ('yash', 'yash', admin_class_id, 'paid'))
+                      ('yash', hash_password('yash'), admin_class_id, 'paid'))
             conn.commit()
     except (sqlite3.OperationalError, TypeError):
         # This might fail if tables are not ready, which is fine.
         # It will succeed on the next run.
         pass
 
+    # Login looks users up by email or mobile as well as username
+    try:
+        c.execute('CREATE INDEX IF NOT EXISTS idx_users_email_address ON users(email_address)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_users_mobile_no ON users(mobile_no)')
+        conn.commit()
+    except sqlite3.OperationalError:
+        pass
+    ensure_user_identifiers(conn)
+
     conn.close()
     # Note: init_resources_db and init_live_class_db are now integrated into init_db
 
@@ -324,6 +343,7 @@ def init_classes_db():
     conn.close()
 
 def ensure_live_class_variant_columns():
+    """Add the class variation columns to live_classes (init_db does the same at startup)"""
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     c.execute("PRAGMA table_info(live_classes)")
@@ -347,6 +367,14 @@ def ensure_live_class_variant_columns():
 # Helper Functions for Classes
 # ==============================================================================
 
+# Classes change rarely but are read on every login and most admin pages, so the
+# list lives in the reference cache. Writers call invalidate_class_cache(), which
+# other workers pick up through the shared generation counter.
+def invalidate_class_cache():
+    invalidate_reference('classes')
+
+@request_memoized
+@reference_cached('classes')
 def get_all_classes():
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
@@ -355,6 +383,10 @@ def get_all_classes():
     conn.close()
     return classes
 
+def get_class_name_map():
+    """Cached {class_id: class_name} map"""
+    return dict(get_all_classes())
+
 def get_class_id_by_name(class_name):
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
@@ -401,12 +433,13 @@ def get_class_id_by_name(class_name):
 # ==============================================================================
 
 def register_user(username, password, class_id, mobile_no=None, email_address=None, paid_status='not paid'):
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     try:
         # New registrations now use class_id directly with configurable paid status
         c.execute('INSERT INTO users (username, password, class_id, paid, mobile_no, email_address) VALUES (?, ?, ?, ?, ?, ?)', 
-                  (username, password, class_id, paid_status, mobile_no, email_address))
+                  (username, hash_password(password), class_id, paid_status, mobile_no, email_address))
         conn.commit()
         return True
     except sqlite3.IntegrityError:
@@ -414,20 +447,113 @@ def register_user(username, password, class_id, mobile_no=None, email_address=No
     finally:
         conn.close()
 
-def authenticate_user(username, password):
+# Login identifiers (username, email, mobile) live in one indexed table kept in
+# sync by triggers, so a login is a single primary-key lookup whichever
+# identifier the user typed. Emails are stored lower-cased and mobile numbers
+# with spaces, dashes and '+' removed.
+_MOBILE_SQL = "replace(replace(replace(trim({col}), ' ', ''), '-', ''), '+', '')"
+
+def normalize_login_identifiers(identifier):
+    """Return the (username, email, mobile) forms of what the user typed"""
+    raw = (identifier or '').strip()
+    mobile = raw.replace(' ', '').replace('-', '').replace('+', '')
+    return raw, raw.lower(), mobile
+
+def ensure_user_identifiers(conn):
+    """Create the user_identifiers table and sync triggers, backfilling once"""
+    c = conn.cursor()
+    try:
+        # The triggers reference these columns; the rest of the app assumes them too
+        c.execute('PRAGMA table_info(users)')
+        columns = {row[1] for row in c.fetchall()}
+        for column, ddl in (('mobile_no', 'TEXT'), ('email_address', 'TEXT'), ('banned', 'INTEGER DEFAULT 0')):
+            if column not in columns:
+                c.execute(f'ALTER TABLE users ADD COLUMN {column} {ddl}')
+        c.execute('''CREATE TABLE IF NOT EXISTS user_identifiers (
+            identifier TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (identifier, kind, user_id)
+        ) WITHOUT ROWID''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_user_identifiers_user ON user_identifiers(user_id)')
+        fill = (
+            "INSERT OR IGNORE INTO user_identifiers (identifier, kind, user_id) "
+            "SELECT {p}username, 'username', {p}id {where} "
+            "UNION ALL SELECT lower(trim({p}email_address)), 'email', {p}id {where_and} trim(coalesce({p}email_address, '')) <> '' "
+            "UNION ALL SELECT " + _MOBILE_SQL.format(col='{p}mobile_no') + ", 'mobile', {p}id {where_and} trim(coalesce({p}mobile_no, '')) <> ''"
+        )
+        c.execute('''CREATE TRIGGER IF NOT EXISTS trg_user_identifiers_insert AFTER INSERT ON users
+                     BEGIN ''' + fill.format(p='NEW.', where='', where_and='WHERE') + '''; END''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS trg_user_identifiers_update
+                     AFTER UPDATE OF username, email_address, mobile_no ON users
+                     BEGIN
+                         DELETE FROM user_identifiers WHERE user_id = OLD.id;
+                     ''' + fill.format(p='NEW.', where='', where_and='WHERE') + '''; END''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS trg_user_identifiers_delete AFTER DELETE ON users
+                     BEGIN DELETE FROM user_identifiers WHERE user_id = OLD.id; END''')
+        c.execute('SELECT 1 FROM user_identifiers LIMIT 1')
+        if c.fetchone() is None:
+            c.execute(fill.format(p='', where='FROM users', where_and='FROM users WHERE'))
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        print(f"❌ Error ensuring user identifiers: {e}")
+        conn.rollback()
+
+def authenticate_login(identifier, password):
+    """
+    Verify a login by username, email or mobile number
+
+    One indexed lookup finds the candidate account(s); the password is checked
+    in Python so hashed values work, and legacy or outdated hashes are upgraded
+    on success.
+
+    Returns:
+        dict: {'id', 'username', 'class_id', 'class_name', 'paid', 'banned'} or None
+    """
+    username, email, mobile = normalize_login_identifiers(identifier)
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
-    
-    # Try to authenticate with username, email, or phone number
-    c.execute('''
-        SELECT u.id, c.name FROM users u
-        JOIN classes c ON u.class_id = c.id
-        WHERE (u.username=? OR u.email_address=? OR u.mobile_no=?) AND u.password=?
-    ''', (username, username, username, password))
-    result = c.fetchone()
-    conn.close()
-    if result:
-        return result  # (user_id, class_name)
+    try:
+        c.execute('''
+            SELECT u.id, u.username, u.class_id, u.paid, u.banned, u.password
+            FROM user_identifiers i JOIN users u ON u.id = i.user_id
+            WHERE (i.identifier = ? AND i.kind = 'username')
+               OR (i.identifier = ? AND i.kind = 'email')
+               OR (i.identifier = ? AND i.kind = 'mobile')
+            ORDER BY i.kind = 'username' DESC
+        ''', (username, email, mobile))
+        seen = set()
+        for user_id, name, class_id, paid, banned, stored in c.fetchall():
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            matches, needs_rehash = verify_password(stored, password)
+            if not matches:
+                continue
+            if needs_rehash:
+                try:
+                    c.execute('UPDATE users SET password = ? WHERE id = ? AND password = ?',
+                              (hash_password(password), user_id, stored))
+                    conn.commit()
+                except sqlite3.Error as e:
+                    print(f"❌ Error upgrading password hash for user {user_id}: {e}")
+            return {
+                'id': user_id,
+                'username': name,
+                'class_id': class_id,
+                'class_name': get_class_name_map().get(class_id),
+                'paid': paid,
+                'banned': banned,
+            }
+        return None
+    finally:
+        conn.close()
+
+def authenticate_user(username, password):
+    """Verify a login; returns (user_id, class_name) or None"""
+    user = authenticate_login(username, password)
+    if user and user['class_name'] is not None:
+        return user['id'], user['class_name']  # (user_id, class_name)
     return None
 
 def get_user_by_mobile(mobile_no):
@@ -472,6 +598,7 @@ def get_all_users():
     conn.close()
     return users
 
+@request_memoized
 def get_user_by_id(user_id):
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
@@ -484,6 +611,7 @@ def get_user_by_id(user_id):
     conn.close()
     return user
 
+@request_memoized
 def get_user_by_username(username):
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
@@ -509,6 +637,7 @@ def get_user_by_email(email_address):
     return user
 
 def update_user(user_id, username, class_id, paid, banned=None, mobile_no=None, email_address=None):
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     if banned is not None:
@@ -521,8 +650,10 @@ def update_user(user_id, username, class_id, paid, banned=None, mobile_no=None,
     conn.close()
 
 def update_user_with_password(user_id, username, password, class_id, paid, banned=None, mobile_no=None, email_address=None):
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
+    password = hash_password(password)
     if banned is not None:
         c.execute('UPDATE users SET username=?, password=?, class_id=?, paid=?, banned=?, mobile_no=?, email_address=? WHERE id=?', 
                   (username, password, class_id, paid, banned, mobile_no, email_address, user_id))
@@ -579,24 +710,12 @@ def get_resources_for_class_id(class_id):
     conn.close()
     return resources
 
+@request_memoized
 def get_categories_for_class(class_id):
     """Get all categories that are available for a specific class"""
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
-    # Create categories table if it doesn't exist
-    c.execute('''CREATE TABLE IF NOT EXISTS categories (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT UNIQUE NOT NULL,
-        description TEXT,
-        category_type TEXT DEFAULT 'general',
-        target_class TEXT DEFAULT 'all',
-        paid_status TEXT DEFAULT 'unpaid',
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        created_by INTEGER,
-        is_active BOOLEAN DEFAULT 1
-    )''')
-    
     # Get categories that are either for all classes or specifically for this class
     c.execute('''
         SELECT id, name, description, category_type, target_class, paid_status 
@@ -617,6 +736,7 @@ def get_categories_for_class(class_id):
 # ==============================================================================
 
 def add_notification(message, class_id, target_paid_status='all', status='active', scheduled_time=None, notification_type='general'):
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     c.execute(
@@ -626,6 +746,7 @@ def add_notification(message, class_id, target_paid_status='all', status='active
     conn.commit()
     conn.close()
 
+@request_memoized
 def get_unread_notifications_for_user(user_id):
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
@@ -636,29 +757,17 @@ def get_unread_notifications_for_user(user_id):
         return []
     class_id, user_paid_status = result
     
-    # Fetch class/paid notifications (only active and scheduled)
-    c.execute('''
-        SELECT n.id, n.message, n.created_at, n.status, n.notification_type, n.scheduled_time, 'notification' as item_type
+    # Class/paid and personal notifications (only active and scheduled) above the
+    # user's read mark, minus the ones read out of order
+    c.execute(f'''
+        SELECT n.id, n.message, n.created_at, n.status, n.notification_type, n.scheduled_time,
+               CASE WHEN n.class_id IS NULL THEN 'personal_notification' ELSE 'notification' END as item_type
         FROM notifications n
-        LEFT JOIN user_notification_status uns ON n.id = uns.notification_id AND uns.user_id = ?
-        WHERE n.class_id = ? AND uns.notification_id IS NULL
-        AND (n.target_paid_status = 'all' OR n.target_paid_status = ?)
-        AND n.status IN ('active', 'scheduled')
+        WHERE {VISIBLE_TO_USER_SQL} AND {UNREAD_SQL}
         ORDER BY n.created_at DESC
-    ''', (user_id, class_id, user_paid_status))
+    ''', (class_id, user_paid_status, user_id, user_id))
     notifications = c.fetchall()
     
-    # Fetch personal notifications (notifications specifically for this user)
-    c.execute('''
-        SELECT n.id, n.message, n.created_at, n.status, n.notification_type, n.scheduled_time, 'personal_notification' as item_type
-        FROM notifications n
-        LEFT JOIN user_notification_status uns ON n.id = uns.notification_id AND uns.user_id = ?
-        WHERE n.class_id IS NULL AND n.target_paid_status = 'personal' AND uns.notification_id IS NULL
-        AND n.status IN ('active', 'scheduled')
-        ORDER BY n.created_at DESC
-    ''', (user_id,))
-    personal_notifications = c.fetchall()
-    
     # Fetch personal chat messages (unread)
     c.execute('''
         SELECT 
@@ -674,30 +783,21 @@ def get_unread_notifications_for_user(user_id):
         JOIN users u ON pc.sender_id = u.id
         WHERE pc.receiver_id = ? 
         AND pc.is_read = 0
-        ORDER BY pc.created_at DESC
+        ORDER BY pc.created_ts DESC
     ''', (user_id,))
     personal_messages = c.fetchall()
     
     # Combine all items and sort by creation time
-    all_items = notifications + personal_notifications + personal_messages
+    all_items = notifications + personal_messages
     all_items.sort(key=lambda x: x[2], reverse=True)
     
     conn.close()
     return all_items
 
 def mark_notification_as_seen(user_id, notification_id):
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
-    try:
-        c.execute('INSERT INTO user_notification_status (user_id, notification_id, seen_at) VALUES (?, ?, ?)',
-                  (user_id, notification_id, get_ist_timestamp()))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        # This will fail if the primary key (user_id, notification_id) already exists, which is fine.
-        # It means the notification was already marked as seen.
-        pass
-    finally:
-        conn.close()
+    clear_request_memo()
+    # Read state is a per-user mark plus exceptions, see notification_read_state
+    return mark_notification_read(user_id, int(notification_id))
 
 def get_notifications_for_class(class_id):
     conn = sqlite3.connect(DATABASE)
@@ -729,6 +829,7 @@ def get_all_notifications():
     return notifications
 
 def add_personal_notification(message, user_id, notification_type='personal'):
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     # Insert notification with class_id as NULL and target_paid_status as 'personal'
@@ -759,6 +860,7 @@ def delete_resource(filename):
     conn.close()
 
 def delete_user(user_id):
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     c.execute('DELETE FROM users WHERE id=?', (user_id,))
@@ -780,8 +882,6 @@ def create_live_class(
     subject=None,
     teacher_name=None
 ):
-    # Ensure variant columns exist even if init_db was not called
-    ensure_live_class_variant_columns()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     created_at = format_ist_time(get_current_ist_time())
@@ -807,6 +907,8 @@ def create_live_class(
     conn.commit()
     new_class_id = c.lastrowid
     conn.close()
+    invalidate_live_class_cache()
+    live_class_timers.class_changed(new_class_id)
     return new_class_id
 
 def get_live_class(class_code, pin):
@@ -839,17 +941,21 @@ def deactivate_class(class_id):
     c.execute('UPDATE live_classes SET is_active=0 WHERE id=?', (class_id,))
     conn.commit()
     conn.close()
+    invalidate_live_class_cache()
 
 def delete_notification(notification_id):
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     c.execute('DELETE FROM user_notification_status WHERE notification_id=?', (notification_id,))
+    forget_notification_reads(c, notification_id)
     c.execute('DELETE FROM notifications WHERE id=?', (notification_id,))
     conn.commit()
     conn.close()
 
 def update_notification_status(notification_id, status):
     """Update the status of a notification"""
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     c.execute('UPDATE notifications SET status = ? WHERE id = ?', (status, notification_id))
@@ -893,8 +999,10 @@ def create_topic(name, description, class_id=None, paid='unpaid'):
     conn.commit()
     topic_id = c.lastrowid
     conn.close()
+    invalidate_reference('topics')
     return topic_id
 
+@reference_cached('topics')
 def get_topics_by_class(class_id):
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
@@ -903,6 +1011,8 @@ def get_topics_by_class(class_id):
     conn.close()
     return topics
 
+@request_memoized
+@reference_cached('topics', 'classes')
 def get_topics_for_user(user_role, user_paid_status=None):
     """Get topics based on user's role/class and paid status"""
     conn = sqlite3.connect(DATABASE)
@@ -938,6 +1048,7 @@ def get_topics_for_user(user_role, user_paid_status=None):
     conn.close()
     return topics
 
+@reference_cached('topics')
 def get_all_topics():
     """Get all forum topics for admin use"""
     conn = sqlite3.connect(DATABASE)
@@ -953,7 +1064,9 @@ def delete_topic(topic_id):
     c.execute('DELETE FROM forum_topics WHERE id = ?', (topic_id,))
     conn.commit()
     conn.close()
+    invalidate_reference('topics')
 
+@request_memoized
 def can_user_access_topic(user_role, user_paid_status, topic_id):
     """Check if user can access a specific topic based on their role, paid status, and class"""
     conn = sqlite3.connect(DATABASE)
@@ -1107,10 +1220,16 @@ def delete_live_class_message(message_id):
 # Enhanced Live Class Management Functions
 # ==============================================================================
 
+def _get_live_class_status(c, class_id):
+    c.execute('SELECT status FROM live_classes WHERE id = ?', (class_id,))
+    row = c.fetchone()
+    return row[0] if row else None
+
 def update_live_class_status(class_id, status):
     """Update the status of a live class"""
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
+    previous = _get_live_class_status(c, class_id)
     
     if status == 'active':
         # Set activated_at when transitioning to active (store as formatted IST time for consistent comparisons)
@@ -1122,53 +1241,86 @@ def update_live_class_status(class_id, status):
     
     conn.commit()
     conn.close()
-
-def get_live_classes_by_status(status):
-    """Get live classes by status (scheduled, active, completed, cancelled)"""
-    # Ensure variant columns exist
-    ensure_live_class_variant_columns()
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
-    c.execute('''
-        SELECT 
-            id, class_code, pin, meeting_url, topic, description, created_at, status, scheduled_time,
-            target_class, class_stream, class_type, paid_status, subject, teacher_name
-        FROM live_classes 
-        WHERE status = ?
-        ORDER BY created_at DESC
-    ''', (status,))
-    classes = c.fetchall()
+    invalidate_live_class_cache()
+    live_class_timers.class_changed(class_id, previous)
+
+# Live class listings are read by every dashboard, batch page and status poll but
+# only change when a class is created, started, ended, cancelled or deleted. The
+# whole catalogue is cached grouped by status and target class; those writers and
+# live_class_timers (when a transition comes due) drop it, and the TTL bounds
+# staleness for changes made by other processes.
+LIVE_CLASS_CACHE_TTL = 30
+LIVE_CLASS_COLUMNS = '''id, class_code, pin, meeting_url, topic, description, created_at, status, scheduled_time,
+            target_class, class_stream, class_type, paid_status, subject, teacher_name'''
+_live_class_cache_lock = threading.Lock()
+_live_class_cache = {'catalogue': None, 'loaded_at': 0.0, 'generation': 0}
+
+def invalidate_live_class_cache(class_id=None):
+    """Drop the cached live class catalogue (class_id is accepted for use as a timer listener)"""
+    with _live_class_cache_lock:
+        _live_class_cache['catalogue'] = None
+        _live_class_cache['generation'] += 1
+
+live_class_timers.add_transition_listener(invalidate_live_class_cache)
+
+def _get_live_class_catalogue():
+    """Cached {status: {'rows': [...], 'by_target': {target_class: [...]}}}, rows newest first"""
+    with _live_class_cache_lock:
+        catalogue = _live_class_cache['catalogue']
+        if catalogue is not None and time.time() - _live_class_cache['loaded_at'] < LIVE_CLASS_CACHE_TTL:
+            return catalogue
+        generation = _live_class_cache['generation']
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    c.execute(f'SELECT {LIVE_CLASS_COLUMNS} FROM live_classes ORDER BY created_at DESC')
+    rows = c.fetchall()
     conn.close()
-    return classes
+    catalogue = {}
+    for row in rows:
+        group = catalogue.setdefault(row[7], {'rows': [], 'by_target': {}})
+        group['rows'].append(row)
+        group['by_target'].setdefault(row[9], []).append(row)
+    with _live_class_cache_lock:
+        # A write that landed while we were reading must not be overwritten by older rows
+        if _live_class_cache['generation'] == generation:
+            _live_class_cache['catalogue'] = catalogue
+            _live_class_cache['loaded_at'] = time.time()
+    return catalogue
+
+def get_live_classes_by_status(status, target_class=None):
+    """
+    Get live classes by status (scheduled, active, completed, cancelled)
+
+    With target_class, only classes for that class name or for 'all' are returned.
+    """
+    group = _get_live_class_catalogue().get(status)
+    if not group:
+        return []
+    if target_class is None:
+        return list(group['rows'])
+    by_target = group['by_target']
+    classes = by_target.get('all', []) + (by_target.get(target_class, []) if target_class != 'all' else [])
+    return sorted(classes, key=lambda row: row[6] or '', reverse=True)
 
-def get_scheduled_live_classes():
+def get_scheduled_live_classes(target_class=None):
     """Get all scheduled live classes"""
-    return get_live_classes_by_status('scheduled')
+    return get_live_classes_by_status('scheduled', target_class)
 
-def get_active_live_classes():
+def get_active_live_classes(target_class=None):
     """Get all currently active live classes"""
-    return get_live_classes_by_status('active')
+    return get_live_classes_by_status('active', target_class)
 
-def get_completed_live_classes():
+def get_completed_live_classes(target_class=None):
     """Get all completed live classes"""
-    return get_live_classes_by_status('completed')
+    return get_live_classes_by_status('completed', target_class)
 
-def get_upcoming_live_classes():
+def get_upcoming_live_classes(target_class=None):
     """Get upcoming scheduled live classes (scheduled for future or without specific time)"""
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
-    current_time = get_current_ist_time()
-    c.execute('''
-        SELECT 
-            id, class_code, pin, meeting_url, topic, description, created_at, status, scheduled_time,
-            target_class, class_stream, class_type, paid_status, subject, teacher_name
-        FROM live_classes 
-        WHERE status = 'scheduled' AND (scheduled_time > ? OR scheduled_time IS NULL)
-        ORDER BY scheduled_time ASC
-    ''', (format_ist_time(current_time),))
-    classes = c.fetchall()
-    conn.close()
-    return classes
+    now = format_ist_time(get_current_ist_time())
+    classes = [row for row in get_live_classes_by_status('scheduled', target_class)
+               if row[8] is None or row[8] > now]
+    # Same order as ORDER BY scheduled_time ASC: unscheduled first, then soonest
+    return sorted(classes, key=lambda row: (row[8] is not None, row[8] or ''))
 
 def schedule_live_class(class_code, pin, meeting_url, topic, description, scheduled_time):
     """Schedule a live class for a specific time"""
@@ -1178,6 +1330,7 @@ def start_live_class(class_id):
     """Mark a live class as active"""
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
+    previous = _get_live_class_status(c, class_id)
     
     # Update status to active and set activation time (store as formatted IST time)
     from time_config import format_ist_time, get_current_ist_time
@@ -1190,6 +1343,8 @@ def start_live_class(class_id):
     
     conn.commit()
     conn.close()
+    invalidate_live_class_cache()
+    live_class_timers.class_changed(class_id, previous)
 
 def complete_live_class(class_id):
     """Mark a live class as completed"""
@@ -1212,40 +1367,9 @@ def get_live_class_with_status(class_id):
     return details
 
 def auto_update_class_statuses():
-    """Automatically update class statuses based on current time"""
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
-    current_time = get_current_ist_time()
-    current_time_str = format_ist_time(current_time)
-    
-    # Update scheduled classes to active if their time has come
-    c.execute('''
-        UPDATE live_classes 
-        SET status = 'active' 
-        WHERE status = 'scheduled' 
-        AND scheduled_time <= ?
-    ''', (current_time_str,))
-    
-    # Update active classes to completed if they've been running for more than 2 hours
-    # (assuming class duration is 2 hours max)
-    from datetime import timedelta
-    two_hours_ago = current_time - timedelta(hours=2)
-    two_hours_ago_str = format_ist_time(two_hours_ago)
-    
-    # Only auto-complete classes that have been active for more than 2 hours
-    # Use activated_at field if available, otherwise fall back to created_at
-    two_hours_ago = current_time - timedelta(hours=2)
-    two_hours_ago_str = format_ist_time(two_hours_ago)
-    
-    c.execute('''
-        UPDATE live_classes 
-        SET status = 'completed' 
-        WHERE status = 'active' 
-        AND (activated_at <= ? OR (activated_at IS NULL AND created_at <= ?))
-    ''', (two_hours_ago_str, two_hours_ago_str))
-    
-    conn.commit()
-    conn.close()
+    """Apply any due scheduled/active transitions now (normally done by live_class_timers)"""
+    live_class_timers.reload_live_class_timers()
+    live_class_timers.run_due_transitions()
 
 def end_live_class(class_id, recording_url=None):
     """End a live class (mark as completed) - called when end button is clicked"""
@@ -1263,6 +1387,7 @@ def end_live_class(class_id, recording_url=None):
         c.execute('UPDATE live_classes SET is_active = 0, completed_at = ? WHERE id = ?', (completed_time, class_id))
     conn.commit()
     conn.close()
+    invalidate_live_class_cache()
 
 def set_live_class_recording(class_id, recording_url):
     conn = sqlite3.connect(DATABASE)
@@ -1270,15 +1395,24 @@ def set_live_class_recording(class_id, recording_url):
     c.execute('UPDATE live_classes SET recording_url = ? WHERE id = ?', (recording_url, class_id))
     conn.commit()
     conn.close()
+    invalidate_live_class_cache()
 
-def get_live_classes_for_display():
-    """Get all live classes organized by status for display"""
-    auto_update_class_statuses()  # Auto-update statuses first
-    
+def delete_live_class(class_id):
+    """Delete a live class along with its chat messages"""
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    c.execute('DELETE FROM live_class_messages WHERE class_id = ?', (class_id,))
+    c.execute('DELETE FROM live_classes WHERE id = ?', (class_id,))
+    conn.commit()
+    conn.close()
+    invalidate_live_class_cache()
+
+def get_live_classes_for_display(target_class=None):
+    """Get live classes organized by status for display, optionally only those for one class"""
     return {
-        'upcoming': get_upcoming_live_classes(),
-        'active': get_active_live_classes(),
-        'completed': get_completed_live_classes()
+        'upcoming': get_upcoming_live_classes(target_class),
+        'active': get_active_live_classes(target_class),
+        'completed': get_completed_live_classes(target_class)
     }
 
 def is_class_time_to_start(class_id):
@@ -1404,20 +1538,21 @@ def cleanup_old_classes():
     c.execute('''
         SELECT id FROM live_classes 
         WHERE status = 'completed' 
-        AND created_at < datetime('now', '-30 days')
-    ''')
+        AND created_ts < ?
+    ''', (int(time.time()) - 30 * 86400,))
     old_classes = c.fetchall()
     
     if old_classes:
         class_ids = [str(c[0]) for c in old_classes]
         placeholders = ','.join(['?' for _ in class_ids])
         
-        # Delete related data
+        # Chat history goes to the monthly archive files, the rest is deleted
+        archive_where('live_class_messages', f'class_id IN ({placeholders})', class_ids)
         c.execute(f'DELETE FROM live_class_attendance WHERE class_id IN ({placeholders})', class_ids)
-        c.execute(f'DELETE FROM live_class_messages WHERE class_id IN ({placeholders})', class_ids)
         c.execute(f'DELETE FROM live_classes WHERE id IN ({placeholders})', class_ids)
         
         conn.commit()
+        invalidate_live_class_cache()
         print(f"✅ Cleaned up {len(old_classes)} old classes")
     else:
         print("ℹ️  No old classes to clean up")
@@ -1440,6 +1575,7 @@ def validate_live_class_data():
     
     conn.commit()
     conn.close()
+    invalidate_live_class_cache()
     print("✅ Live class data validated and fixed")
 
 def format_datetime_for_display(datetime_str):
@@ -1449,7 +1585,11 @@ def format_datetime_for_display(datetime_str):
     
     try:
         # Handle different datetime formats
-        if 'T' in datetime_str:
+        if isinstance(datetime_str, (int, float)):
+            # Epoch seconds from the *_ts columns
+            from datetime import datetime
+            dt_str = datetime.fromtimestamp(datetime_str).strftime('%Y-%m-%d %H:%M:%S')
+        elif 'T' in datetime_str:
             # ISO format: 2025-01-15T14:30:00
             dt_str = datetime_str.replace('T', ' ')
             if '.' in dt_str:
@@ -1495,40 +1635,239 @@ def format_datetime_for_display(datetime_str):
 # Personal Chat Functions
 # ==============================================================================
 
-def send_personal_message(sender_id, receiver_id, message):
-    """Send a personal message between two users"""
+# One row per (user, peer) pair the user has exchanged messages with, kept in
+# step with personal_chats by triggers: every insert moves the pair to the top
+# of both inboxes and bumps the receiver's unread count, every is_read 0 -> 1
+# brings it down again. The inbox is then an index range scan instead of a
+# GROUP BY over the user's whole message history.
+# delivered_upto / read_upto are the highest message ID from the peer that the
+# user's client has received / seen, so a receipt covers a whole conversation.
+INBOX_PAGE_SIZE = 30
+CHAT_HISTORY_PAGE_SIZE = 50
+
+_CONVERSATION_UPSERT = '''
+    INSERT INTO conversations (user_id, peer_id, last_message_id, last_message_at, last_message_ts, unread_count)
+    VALUES ({user}, {peer}, NEW.id, NEW.created_at,
+            COALESCE(NEW.created_ts, CAST(strftime('%s', 'now') AS INTEGER)), {unread})
+    ON CONFLICT(user_id, peer_id) DO UPDATE SET
+        last_message_id = excluded.last_message_id,
+        last_message_at = excluded.last_message_at,
+        last_message_ts = excluded.last_message_ts,
+        unread_count = unread_count + excluded.unread_count
+'''
+
+def ensure_conversations_table():
+    """Create the conversations summary table and its sync triggers, backfilling once"""
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    try:
+        c.execute('''CREATE TABLE IF NOT EXISTS conversations (
+            user_id INTEGER NOT NULL,
+            peer_id INTEGER NOT NULL,
+            last_message_id INTEGER,
+            last_message_at TEXT,
+            last_message_ts INTEGER NOT NULL DEFAULT 0,
+            unread_count INTEGER NOT NULL DEFAULT 0,
+            delivered_upto INTEGER NOT NULL DEFAULT 0,
+            read_upto INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, peer_id)
+        ) WITHOUT ROWID''')
+        c.execute('PRAGMA table_info(conversations)')
+        columns = {row[1] for row in c.fetchall()}
+        receipts_added = False
+        for column in ('delivered_upto', 'read_upto'):
+            if column not in columns:
+                c.execute(f'ALTER TABLE conversations ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+                receipts_added = True
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_conversations_inbox
+                     ON conversations(user_id, last_message_ts DESC, peer_id DESC)''')
+        # Chat history pages and read acks range-scan one direction of a pair
+        c.execute('CREATE INDEX IF NOT EXISTS idx_personal_chats_pair ON personal_chats(sender_id, receiver_id, id)')
+        # Client-generated IDs make a resent message (after a reconnect) a no-op
+        c.execute('PRAGMA table_info(personal_chats)')
+        if 'client_msg_id' not in {row[1] for row in c.fetchall()}:
+            c.execute('ALTER TABLE personal_chats ADD COLUMN client_msg_id TEXT')
+        c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_personal_chats_client_msg
+                     ON personal_chats(sender_id, client_msg_id) WHERE client_msg_id IS NOT NULL''')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS trg_conversations_insert AFTER INSERT ON personal_chats
+                     BEGIN ''' +
+                  _CONVERSATION_UPSERT.format(user='NEW.sender_id', peer='NEW.receiver_id', unread='0') + '; ' +
+                  _CONVERSATION_UPSERT.format(user='NEW.receiver_id', peer='NEW.sender_id',
+                                              unread='CASE WHEN COALESCE(NEW.is_read, 0) = 0 THEN 1 ELSE 0 END') +
+                  '; END')
+        c.execute('''CREATE TRIGGER IF NOT EXISTS trg_conversations_read AFTER UPDATE OF is_read ON personal_chats
+                     WHEN COALESCE(OLD.is_read, 0) = 0 AND NEW.is_read = 1
+                     BEGIN
+                         UPDATE conversations SET unread_count = MAX(unread_count - 1, 0)
+                         WHERE user_id = NEW.receiver_id AND peer_id = NEW.sender_id;
+                     END''')
+        c.execute('SELECT 1 FROM conversations LIMIT 1')
+        if c.fetchone() is None:
+            # MAX(id) makes the bare columns come from each pair's latest message
+            c.execute('''
+                INSERT INTO conversations (user_id, peer_id, last_message_id, last_message_at, last_message_ts, unread_count)
+                SELECT user_id, peer_id, MAX(id), created_at, COALESCE(created_ts, 0), SUM(unread)
+                FROM (
+                    SELECT sender_id AS user_id, receiver_id AS peer_id, id, created_at, created_ts, 0 AS unread
+                    FROM personal_chats
+                    UNION ALL
+                    SELECT receiver_id, sender_id, id, created_at, created_ts,
+                           CASE WHEN COALESCE(is_read, 0) = 0 THEN 1 ELSE 0 END
+                    FROM personal_chats
+                )
+                GROUP BY user_id, peer_id
+            ''')
+            if c.rowcount:
+                print(f"✅ Backfilled {c.rowcount} conversation summaries")
+                receipts_added = True
+        if receipts_added:
+            # Messages already read count as read and delivered
+            c.execute('''
+                UPDATE conversations SET read_upto = COALESCE((
+                    SELECT MAX(pc.id) FROM personal_chats pc
+                    WHERE pc.sender_id = conversations.peer_id AND pc.receiver_id = conversations.user_id
+                      AND pc.is_read = 1
+                ), 0)
+            ''')
+            c.execute('UPDATE conversations SET delivered_upto = read_upto')
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        print(f"❌ Error ensuring conversations table: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+def store_personal_message(sender_id, receiver_id, message, client_msg_id=None):
+    """
+    Save a personal message and return it as stored
+
+    Args:
+        sender_id: Sending user's ID
+        receiver_id: Receiving user's ID
+        message: Message text
+        client_msg_id: Optional ID chosen by the sending client; sending the
+                       same one again returns the message saved the first time
+
+    Returns:
+        dict: {'id', 'sender_id', 'receiver_id', 'message', 'created_at',
+               'created_ts', 'client_msg_id', 'created'} or None on failure;
+              'created' is False when client_msg_id matched an earlier message
+    """
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
     try:
         c.execute('''
-            INSERT INTO personal_chats (sender_id, receiver_id, message, created_at)
-            VALUES (?, ?, ?, ?)
-        ''', (sender_id, receiver_id, message, get_current_ist_time()))
+            INSERT INTO personal_chats (sender_id, receiver_id, message, created_at, created_ts, client_msg_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+        ''', (sender_id, receiver_id, message, format_ist_time(get_current_ist_time()), int(time.time()),
+              client_msg_id))
         conn.commit()
-        return True
+        created = c.rowcount == 1
+        if created:
+            c.execute('''SELECT id, sender_id, receiver_id, message, created_at, created_ts, client_msg_id
+                         FROM personal_chats WHERE id = ?''', (c.lastrowid,))
+        else:
+            c.execute('''SELECT id, sender_id, receiver_id, message, created_at, created_ts, client_msg_id
+                         FROM personal_chats WHERE sender_id = ? AND client_msg_id = ?''',
+                      (sender_id, client_msg_id))
+        row = c.fetchone()
+        if row is None:
+            return None
+        keys = ('id', 'sender_id', 'receiver_id', 'message', 'created_at', 'created_ts', 'client_msg_id')
+        return dict(zip(keys, row), created=created)
     except Exception as e:
         print(f"Error sending personal message: {e}")
-        return False
+        return None
+    finally:
+        conn.close()
+
+def send_personal_message(sender_id, receiver_id, message):
+    """Send a personal message between two users"""
+    return store_personal_message(sender_id, receiver_id, message) is not None
+
+# Recipient filters for broadcast personal messages
+BROADCAST_AUDIENCES = {
+    'all': '',
+    'paid': "AND paid = 'paid'",
+    'unpaid': "AND paid = 'not paid'",
+}
+
+def broadcast_personal_message(sender_id, message, audience='all'):
+    """
+    Send the same personal message to every user in an audience
+
+    One INSERT ... SELECT in a single transaction, however many recipients.
+
+    Args:
+        sender_id: Sending user's ID (never a recipient)
+        message: Message text
+        audience: Key of BROADCAST_AUDIENCES
+
+    Returns:
+        List of (message_id, receiver_id) in ID order, or None on failure
+    """
+    if audience not in BROADCAST_AUDIENCES:
+        raise ValueError(f"Unknown audience: {audience}")
+    clear_request_memo()
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    try:
+        # Take the write lock first so the new rows are exactly those after last_id
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('SELECT COALESCE(MAX(id), 0) FROM personal_chats')
+        last_id = c.fetchone()[0]
+        c.execute(f'''
+            INSERT INTO personal_chats (sender_id, receiver_id, message, created_at, created_ts)
+            SELECT ?, id, ?, ?, ? FROM users
+            WHERE id != ? {BROADCAST_AUDIENCES[audience]}
+            ORDER BY id
+        ''', (sender_id, message, format_ist_time(get_current_ist_time()), int(time.time()), sender_id))
+        c.execute('SELECT id, receiver_id FROM personal_chats WHERE id > ? AND sender_id = ? ORDER BY id',
+                  (last_id, sender_id))
+        sent = c.fetchall()
+        conn.commit()
+        return sent
+    except Exception as e:
+        conn.rollback()
+        print(f"Error broadcasting personal message: {e}")
+        return None
     finally:
         conn.close()
 
-def get_personal_messages(user1_id, user2_id, limit=50):
-    """Get personal messages between two users"""
+def get_personal_messages(user1_id, user2_id, limit=CHAT_HISTORY_PAGE_SIZE, before_id=None):
+    """
+    Get personal messages between two users, newest first
+
+    Args:
+        before_id: Only messages older than this ID (the oldest one already shown)
+
+    Returns:
+        List of (id, sender_id, receiver_id, message, created_at, is_read, sender_name)
+    """
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
     try:
-        c.execute('''
+        # Each direction is a range scan on idx_personal_chats_pair, cut off at the page size
+        direction = '''
+            SELECT * FROM (
+                SELECT id, sender_id, receiver_id, message, created_at, is_read FROM personal_chats
+                WHERE sender_id = ? AND receiver_id = ? AND id < ?
+                ORDER BY id DESC LIMIT ?
+            )
+        '''
+        before = before_id if before_id is not None else 2 ** 63 - 1
+        c.execute(f'''
             SELECT pc.id, pc.sender_id, pc.receiver_id, pc.message, pc.created_at, pc.is_read,
                    u.username as sender_name
-            FROM personal_chats pc
+            FROM ({direction} UNION ALL {direction}) pc
             JOIN users u ON pc.sender_id = u.id
-            WHERE (pc.sender_id = ? AND pc.receiver_id = ?) 
-               OR (pc.sender_id = ? AND pc.receiver_id = ?)
-            ORDER BY pc.created_at DESC
+            ORDER BY pc.id DESC
             LIMIT ?
-        ''', (user1_id, user2_id, user2_id, user1_id, limit))
+        ''', (user1_id, user2_id, before, limit, user2_id, user1_id, before, limit, limit))
         messages = c.fetchall()
         return messages
     except Exception as e:
@@ -1537,32 +1876,25 @@ def get_personal_messages(user1_id, user2_id, limit=50):
     finally:
         conn.close()
 
-def get_user_conversations(user_id):
-    """Get all conversations for a user"""
+def get_user_conversations(user_id, limit=None):
+    """
+    Get a user's conversations, most recent first
+
+    Returns:
+        List of (other_user_id, other_username, last_message_time, unread_count)
+    """
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
     try:
         c.execute('''
-            SELECT DISTINCT 
-                CASE 
-                    WHEN pc.sender_id = ? THEN pc.receiver_id
-                    ELSE pc.sender_id
-                END as other_user_id,
-                u.username as other_username,
-                MAX(pc.created_at) as last_message_time,
-                COUNT(CASE WHEN pc.receiver_id = ? AND pc.is_read = 0 THEN 1 END) as unread_count
-            FROM personal_chats pc
-            JOIN users u ON (
-                CASE 
-                    WHEN pc.sender_id = ? THEN pc.receiver_id
-                    ELSE pc.sender_id
-                END = u.id
-            )
-            WHERE pc.sender_id = ? OR pc.receiver_id = ?
-            GROUP BY other_user_id
-            ORDER BY last_message_time DESC
-        ''', (user_id, user_id, user_id, user_id, user_id))
+            SELECT cv.peer_id, u.username, cv.last_message_at, cv.unread_count
+            FROM conversations cv
+            JOIN users u ON u.id = cv.peer_id
+            WHERE cv.user_id = ?
+            ORDER BY cv.last_message_ts DESC, cv.peer_id DESC
+            LIMIT ?
+        ''', (user_id, -1 if limit is None else limit))
         conversations = c.fetchall()
         return conversations
     except Exception as e:
@@ -1571,25 +1903,209 @@ def get_user_conversations(user_id):
     finally:
         conn.close()
 
-def mark_messages_as_read(user_id, sender_id):
-    """Mark messages as read from a specific sender"""
+def get_inbox_page(user_id, limit=INBOX_PAGE_SIZE, before=None):
+    """
+    Get one page of a user's inbox, most recent conversation first
+
+    Args:
+        user_id: Inbox owner
+        limit: Conversations per page
+        before: Cursor from the previous page's 'next_before', or None for the first page
+
+    Returns:
+        dict: {'conversations': [{'peer_id', 'username', 'last_message_id', 'last_message_at',
+               'last_message_ts', 'last_message', 'last_sender_id', 'unread_count'}],
+               'next_before': cursor string, or None on the last page}
+    """
+    last_ts, last_peer = None, None
+    if before:
+        try:
+            last_ts, last_peer = (int(part) for part in str(before).split(':', 1))
+        except ValueError:
+            raise ValueError(f"Invalid inbox cursor: {before}")
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    
+    try:
+        # Keyset pagination: each page starts right after the previous page's last row
+        c.execute('''
+            SELECT cv.peer_id, u.username, cv.last_message_id, cv.last_message_at, cv.last_message_ts,
+                   pc.message, pc.sender_id, cv.unread_count
+            FROM conversations cv
+            JOIN users u ON u.id = cv.peer_id
+            LEFT JOIN personal_chats pc ON pc.id = cv.last_message_id
+            WHERE cv.user_id = ? AND (? IS NULL OR (cv.last_message_ts, cv.peer_id) < (?, ?))
+            ORDER BY cv.last_message_ts DESC, cv.peer_id DESC
+            LIMIT ?
+        ''', (user_id, last_ts, last_ts, last_peer, limit + 1))
+        rows = c.fetchall()
+    except Exception as e:
+        print(f"Error getting inbox page: {e}")
+        return {'conversations': [], 'next_before': None}
+    finally:
+        conn.close()
+    
+    keys = ('peer_id', 'username', 'last_message_id', 'last_message_at', 'last_message_ts',
+            'last_message', 'last_sender_id', 'unread_count')
+    conversations = [dict(zip(keys, row)) for row in rows[:limit]]
+    next_before = None
+    if len(rows) > limit:
+        last = conversations[-1]
+        next_before = f"{last['last_message_ts']}:{last['peer_id']}"
+    return {'conversations': conversations, 'next_before': next_before}
+
+CHAT_USER_SEARCH_LIMIT = 20
+
+def _prefix_bounds(prefix):
+    """[low, high) range of strings starting with prefix, for an index range scan"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def search_chat_users(query, exclude_user_id=None, limit=CHAT_USER_SEARCH_LIMIT):
+    """
+    Find users to start a chat with by username or email prefix
+
+    Range scans on the user_identifiers index, so the cost depends on the
+    number of matches, not the number of users. Usernames are matched as
+    typed, lower-cased and capitalised; emails are stored lower-cased.
+
+    Returns:
+        List of {'id', 'username', 'class_name'} ordered by username
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+    ranges = [('username', prefix) for prefix in dict.fromkeys((query, query.lower(), query.capitalize()))]
+    ranges.append(('email', query.lower()))
+    scans = ' UNION '.join(
+        'SELECT user_id FROM user_identifiers WHERE identifier >= ? AND identifier < ? AND kind = ?'
+        for _ in ranges
+    )
+    params = []
+    for kind, prefix in ranges:
+        params.extend(_prefix_bounds(prefix) + (kind,))
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
+    try:
+        c.execute(f'''
+            SELECT u.id, u.username, cl.name
+            FROM ({scans}) m
+            JOIN users u ON u.id = m.user_id
+            LEFT JOIN classes cl ON cl.id = u.class_id
+            WHERE u.id != ? AND COALESCE(u.banned, 0) = 0
+            ORDER BY u.username
+            LIMIT ?
+        ''', params + [exclude_user_id if exclude_user_id is not None else -1, limit])
+        return [{'id': uid, 'username': username, 'class_name': class_name}
+                for uid, username, class_name in c.fetchall()]
+    except Exception as e:
+        print(f"Error searching chat users: {e}")
+        return []
+    finally:
+        conn.close()
+
+def acknowledge_personal_messages(user_id, peer_id, upto_id=None, read=False):
+    """
+    Record that a user's client received (and maybe showed) a peer's messages
+
+    One call covers every message from the peer up to upto_id, so clients
+    send one acknowledgement per conversation rather than one per message.
+
+    Args:
+        user_id: Receiving user's ID
+        peer_id: Sender of the acknowledged messages
+        upto_id: Highest message ID acknowledged; None for everything so far
+        read: True if the messages were shown, False if only delivered
+
+    Returns:
+        dict: {'delivered_upto', 'read_upto', 'changed'} or None on failure
+    """
+    clear_request_memo()
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('''SELECT last_message_id, delivered_upto, read_upto, unread_count FROM conversations
+                     WHERE user_id = ? AND peer_id = ?''', (user_id, peer_id))
+        row = c.fetchone()
+        if row is None:
+            conn.rollback()
+            return {'delivered_upto': 0, 'read_upto': 0, 'changed': False}
+        last_message_id, delivered_upto, read_upto, unread_count = row
+        upto = min(upto_id, last_message_id or 0) if upto_id is not None else (last_message_id or 0)
+        
+        new_delivered = max(delivered_upto, upto)
+        new_read = max(read_upto, upto) if read else read_upto
+        if read and unread_count:
+            # Triggers bring the conversation's unread_count down with these rows
+            c.execute('''
+                UPDATE personal_chats SET is_read = 1
+                WHERE sender_id = ? AND receiver_id = ? AND id <= ? AND is_read = 0
+            ''', (peer_id, user_id, upto))
+        changed = (new_delivered, new_read) != (delivered_upto, read_upto)
+        if changed:
+            c.execute('''UPDATE conversations SET delivered_upto = ?, read_upto = ?
+                         WHERE user_id = ? AND peer_id = ?''', (new_delivered, new_read, user_id, peer_id))
+        conn.commit()
+        return {'delivered_upto': new_delivered, 'read_upto': new_read, 'changed': changed}
+    except Exception as e:
+        conn.rollback()
+        print(f"Error acknowledging personal messages: {e}")
+        return None
+    finally:
+        conn.close()
+
+def mark_chats_delivered(user_id):
+    """
+    Acknowledge delivery of everything waiting for a user who just came online
+
+    Returns:
+        List of (peer_id, delivered_upto, read_upto) for the conversations that changed
+    """
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    
     try:
         c.execute('''
-            UPDATE personal_chats 
-            SET is_read = 1 
-            WHERE receiver_id = ? AND sender_id = ? AND is_read = 0
-        ''', (user_id, sender_id))
+            UPDATE conversations SET delivered_upto = last_message_id
+            WHERE user_id = ? AND unread_count > 0 AND delivered_upto < last_message_id
+            RETURNING peer_id, delivered_upto, read_upto
+        ''', (user_id,))
+        changed = c.fetchall()
         conn.commit()
-        return True
+        return changed
     except Exception as e:
-        print(f"Error marking messages as read: {e}")
-        return False
+        print(f"Error marking chats delivered: {e}")
+        return []
+    finally:
+        conn.close()
+
+def get_chat_receipts(user_id, peer_id):
+    """
+    How far a peer has received and read a user's messages
+
+    Returns:
+        dict: {'delivered_upto', 'read_upto'} (message IDs, 0 if none)
+    """
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    
+    try:
+        c.execute('''SELECT delivered_upto, read_upto FROM conversations
+                     WHERE user_id = ? AND peer_id = ?''', (peer_id, user_id))
+        row = c.fetchone()
+        return {'delivered_upto': row[0], 'read_upto': row[1]} if row else {'delivered_upto': 0, 'read_upto': 0}
+    except Exception as e:
+        print(f"Error getting chat receipts: {e}")
+        return {'delivered_upto': 0, 'read_upto': 0}
     finally:
         conn.close()
 
+def mark_messages_as_read(user_id, sender_id):
+    """Mark messages as read from a specific sender"""
+    return acknowledge_personal_messages(user_id, sender_id, read=True) is not None
+
 def send_welcome_message(user_id):
     """Send a welcome message to a new user"""
     admin_user_id = get_admin_user_id()
@@ -1598,6 +2114,7 @@ def send_welcome_message(user_id):
         return send_personal_message(admin_user_id, user_id, welcome_message)
     return False
 
+@request_memoized
 def get_admin_user_id():
     """Get the admin user ID"""
     conn = sqlite3.connect(DATABASE)
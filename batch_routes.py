@@ -1,5 +1,8 @@
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
 import sqlite3
+from auth_handler import invalidate_class_cache
+from reference_cache import reference_cached, invalidate_reference
+from page_cache import cached_page
 
 batch_bp = Blueprint('batch', __name__)
 
@@ -23,8 +26,8 @@ def ensure_batch_meta_table():
 	conn.close()
 
 
+@reference_cached('classes', 'batch_meta')
 def get_all_classes_with_meta():
-	ensure_batch_meta_table()
 	conn = sqlite3.connect(DATABASE)
 	c = conn.cursor()
 	c.execute('SELECT id, name FROM classes ORDER BY id')
@@ -43,8 +46,8 @@ def get_all_classes_with_meta():
 	return enriched
 
 
+@reference_cached('classes', 'batch_meta')
 def get_class_with_meta(class_id: int):
-	ensure_batch_meta_table()
 	conn = sqlite3.connect(DATABASE)
 	c = conn.cursor()
 	c.execute('SELECT id, name FROM classes WHERE id=?', (class_id,))
@@ -62,22 +65,12 @@ def get_class_with_meta(class_id: int):
 
 # Public batch overview
 @batch_bp.route('/batch')
+@cached_page('batch', depends=('classes', 'batch_meta'))
 def batch_overview_page():
     classes = get_all_classes_with_meta()
     # Fetch available batches from DB to render into cards
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS batches (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            batch_name TEXT NOT NULL,
-            class_name TEXT NOT NULL,
-            paid_status TEXT NOT NULL CHECK(paid_status IN ('paid','free')),
-            start_on TEXT,
-            end_on TEXT,
-            status TEXT NOT NULL DEFAULT 'active'
-        )
-    """)
     c.execute('SELECT id, batch_name, class_name, paid_status, start_on, end_on, status, image FROM batches ORDER BY class_name, paid_status DESC, start_on')
     batch_rows = c.fetchall()
     conn.close()
@@ -163,6 +156,7 @@ def create_batch_class():
 	try:
 		c.execute('INSERT INTO classes (name) VALUES (?)', (name,))
 		conn.commit()
+		invalidate_class_cache()
 		flash('Class created.', 'success')
 	except sqlite3.IntegrityError:
 		flash('Class already exists.', 'error')
@@ -186,7 +180,6 @@ def update_batch_class(class_id: int):
 	try:
 		if name:
 			c.execute('UPDATE classes SET name=? WHERE id=?', (name, class_id))
-		ensure_batch_meta_table()
 		# Upsert meta
 		c.execute('SELECT class_id FROM batch_meta WHERE class_id=?', (class_id,))
 		exists = c.fetchone()
@@ -197,6 +190,7 @@ def update_batch_class(class_id: int):
 			c.execute('''INSERT INTO batch_meta (class_id, image, start_date, end_date, description) VALUES (?,?,?,?,?)''',
 							(class_id, image, start_date, end_date, description))
 		conn.commit()
+		invalidate_reference('classes', 'batch_meta')
 		flash('Batch updated.', 'success')
 	except Exception as e:
 		conn.rollback()
@@ -216,6 +210,7 @@ def delete_batch_class(class_id: int):
 		c.execute('DELETE FROM batch_meta WHERE class_id=?', (class_id,))
 		c.execute('DELETE FROM classes WHERE id=?', (class_id,))
 		conn.commit()
+		invalidate_reference('classes', 'batch_meta')
 		flash('Class deleted.', 'info')
 	except Exception as e:
 		conn.rollback()
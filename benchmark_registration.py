@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark the bulk student registration engine on a generated sheet.
+
+Builds a throwaway database and registration sheet in a temp directory
+(nothing touches users.db), runs a dry run and a real run, then re-runs the
+same sheet to time the all-unchanged path (which only verifies passwords).
+
+Usage:
+    python benchmark_registration.py --rows 10000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+import password_service
+import student_registration
+
+CLASS_SPELLINGS = ['Class IX', 'class 10th', 'XI Applied', 'Class 12th Applied', '11 core', 'class xii core']
+
+
+def build_fixture(root, rows, existing_every=4, bad_class_every=500):
+    """Create a database with some existing students and a sheet covering them plus new ones"""
+    db_path = os.path.join(root, 'bench.db')
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('CREATE TABLE classes (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL)')
+    c.execute('''CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        paid TEXT NOT NULL DEFAULT 'not paid',
+        class_id INTEGER REFERENCES classes(id)
+    )''')
+    c.executemany('INSERT INTO classes (name) VALUES (?)', [(n,) for n in [
+        'class 9', 'class 10', 'class 11 applied', 'class 11 core', 'class 12 applied', 'class 12 core', 'admin'
+    ]])
+    c.executemany('INSERT INTO users (username, password, paid, class_id) VALUES (?, ?, ?, ?)',
+                  [(f'student_{i}', f'pw{i}', 'not paid', 1) for i in range(0, rows, existing_every)])
+    conn.commit()
+    conn.close()
+
+    sheet_path = os.path.join(root, 'students.xlsx')
+    pd.DataFrame({
+        'Username': [f'student_{i}' for i in range(rows)],
+        'Class': ['Class 13' if i % bad_class_every == 1 else CLASS_SPELLINGS[i % len(CLASS_SPELLINGS)]
+                  for i in range(rows)],
+        'Password': [f'pw{i}' for i in range(rows)],
+        'Status': ['Paid' if i % 3 else 'no' for i in range(rows)],
+    }).to_excel(sheet_path, index=False)
+    return db_path, sheet_path
+
+
+def report(label, results, elapsed):
+    print(f"✅ {label}: {results['total_rows']} rows in {elapsed:.2f}s "
+          f"({results['total_rows'] / elapsed:.0f} rows/s) — {results['inserted']} new, "
+          f"{results['updated']} updated, {results['unchanged']} unchanged, {results['failed']} failed")
+    print("   " + ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in results['timings'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark bulk student registration')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--hash-method', default=password_service.PASSWORD_HASH_METHOD,
+                        help='Password hash method/cost, e.g. pbkdf2:sha256:1000 for a quick run')
+    parser.add_argument('--workers', type=int, default=password_service.HASH_WORKERS)
+    args = parser.parse_args()
+    print(f"🔐 Hashing with {args.hash_method} on {args.workers} processes")
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"🛠️  Building {args.rows}-row fixture in {root}")
+        db_path, sheet_path = build_fixture(root, args.rows)
+
+        for label, dry_run in (('dry run', True), ('first run', False), ('re-run', False)):
+            started = time.perf_counter()
+            results = student_registration.register_students(
+                sheet_path, dry_run=dry_run, db_path=db_path, hash_method=args.hash_method, workers=args.workers
+            )
+            report(label, results, time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Benchmark app start-up and per-request overhead around the schema bootstrap.
+
+Works on a copy of users.db in a temp directory (nothing touches the real
+database). Starts the app in a fresh interpreter twice, timing ``import app``
+and ``create_app()`` separately: once with the schema version rolled back so
+every bootstrap step runs (first deploy or upgrade), once with it current
+(every later start). It then lists the slowest modules pulled in by
+``import app`` (from ``python -X importtime``), times requests through the
+test client and, for comparison, the CREATE TABLE checks the request hook used
+to run on every request.
+
+Usage:
+    python benchmark_startup.py --requests 500 --imports 15
+"""
+
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SCRIPT = '''
+import sys, time
+sys.path.insert(0, {repo!r})
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+started = time.perf_counter()
+app.create_app()
+created = time.perf_counter() - started
+import schema_bootstrap
+print('RESULT', imported, created, schema_bootstrap.get_schema_version())
+'''
+
+# What before_request_handler ran on every request before the bootstrap
+LEGACY_REQUEST_DDL = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA busy_timeout=30000',
+    '''CREATE TABLE IF NOT EXISTS blocked_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, username TEXT NOT NULL,
+        role TEXT NOT NULL, reason TEXT NOT NULL, blocked_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        status TEXT DEFAULT 'warning', FOREIGN KEY (user_id) REFERENCES users (id))''',
+    '''CREATE TABLE IF NOT EXISTS ip_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, ip TEXT, user_id INTEGER, path TEXT,
+        user_agent TEXT, visited_at TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS user_activity (user_id INTEGER PRIMARY KEY, ip TEXT, last_seen TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS active_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, session_id TEXT NOT NULL,
+        ip_address TEXT NOT NULL, user_agent TEXT, created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        last_activity TEXT DEFAULT CURRENT_TIMESTAMP, UNIQUE(user_id))''',
+]
+
+
+def copy_database(root):
+    """Consistent copy of users.db (including its WAL) into root"""
+    src = sqlite3.connect(os.path.join(REPO_DIR, 'users.db'))
+    dst = sqlite3.connect(os.path.join(root, 'users.db'))
+    src.backup(dst)
+    src.close()
+    dst.close()
+
+
+def set_user_version(root, version):
+    conn = sqlite3.connect(os.path.join(root, 'users.db'))
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+    conn.commit()
+    conn.close()
+
+
+def time_start(root):
+    """Seconds to import app and to run create_app() in a fresh interpreter, and the schema version afterwards"""
+    result = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT.format(repo=REPO_DIR)],
+                            cwd=root, capture_output=True, text=True, timeout=300)
+    for line in result.stdout.splitlines():
+        if line.startswith('RESULT '):
+            _, imported, created, version = line.split()
+            return float(imported), float(created), int(version)
+    raise RuntimeError(f"app start failed:\n{result.stderr[-2000:]}")
+
+
+def time_module_imports(root):
+    """
+    Cumulative import time per top-level package for ``import app``
+
+    Parses the ``-X importtime`` report (written to stderr) and keeps, for each
+    top-level name, the largest cumulative figure, i.e. the cost of its first
+    import including everything it pulled in.
+
+    Returns:
+        List of (module, seconds), slowest first
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             f'import sys; sys.path.insert(0, {REPO_DIR!r}); import app'],
+                            cwd=root, capture_output=True, text=True, timeout=300)
+    totals = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        try:
+            micros = int(cumulative)
+        except ValueError:
+            continue  # header row
+        top = name.strip().split('.')[0]
+        totals[top] = max(totals.get(top, 0), micros)
+    if not totals:
+        raise RuntimeError(f"app import failed:\n{result.stderr[-2000:]}")
+    return sorted(((name, micros / 1e6) for name, micros in totals.items()),
+                  key=lambda item: item[1], reverse=True)
+
+
+def time_legacy_ddl(root, requests):
+    """Per-request cost of the DDL the request hook used to run, and of the bare connection"""
+    db_path = os.path.join(root, 'users.db')
+    timings = {}
+    for label, statements in (('connect only', []), ('connect + legacy DDL', LEGACY_REQUEST_DDL)):
+        started = time.perf_counter()
+        for _ in range(requests):
+            conn = sqlite3.connect(db_path, timeout=30)
+            for statement in statements:
+                conn.execute(statement)
+            conn.commit()
+            conn.close()
+        timings[label] = (time.perf_counter() - started) / requests
+    return timings
+
+
+def time_requests(root, requests, path):
+    """Average seconds per request through the Flask test client"""
+    previous_dir = os.getcwd()
+    os.chdir(root)
+    try:
+        sys.path.insert(0, REPO_DIR)
+        import app as app_module
+        client = app_module.create_app().test_client()
+        client.get(path)  # warm up templates and caches
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        return (time.perf_counter() - started) / requests
+    finally:
+        os.chdir(previous_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark start-up and per-request schema overhead')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--path', default='/', help='Page requested through the test client')
+    parser.add_argument('--imports', type=int, default=15, help='How many of the slowest imports to list')
+    args = parser.parse_args()
+
+    import schema_bootstrap
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"🛠️  Copying users.db into {root}")
+        copy_database(root)
+
+        # Roll back to init_db's last migration so every bootstrap step runs
+        set_user_version(root, schema_bootstrap.SCHEMA_VERSION - 1)
+        imported, cold, version = time_start(root)
+        print(f"✅ Cold start (full bootstrap):    import {imported:.2f}s + create_app() {cold:.2f}s, "
+              f"schema now at version {version}")
+        imported, warm, version = time_start(root)
+        print(f"✅ Warm start (version current):   import {imported:.2f}s + create_app() {warm:.2f}s "
+              f"({cold - warm:.2f}s saved per start)")
+
+        if args.imports > 0:
+            try:
+                modules = time_module_imports(root)
+                print("🛠️  Slowest imports under 'import app' (cumulative):")
+                for name, seconds in modules[:args.imports]:
+                    print(f"   {name:<32} {seconds * 1000:8.1f} ms")
+            except Exception as e:
+                print(f"❌ Could not measure per-module import times: {e}")
+
+        ddl = time_legacy_ddl(root, args.requests)
+        saved = ddl['connect + legacy DDL'] - ddl['connect only']
+        for label, seconds in ddl.items():
+            print(f"   {label:<24} {seconds * 1000:.3f} ms/request")
+        print(f"✅ Request hook DDL removed:       {saved * 1000:.3f} ms saved per request")
+
+        try:
+            per_request = time_requests(root, args.requests, args.path)
+            print(f"✅ GET {args.path} through test client: {per_request * 1000:.2f} ms/request "
+                  f"over {args.requests} requests")
+        except Exception as e:
+            print(f"❌ Could not time requests through the test client: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,14 @@
 # This package contains all bulk upload functionality for the Sunrise Education Centre
 
 from .routes import bulk_upload_bp
-from .bulk_upload_handler import BulkUploadHandler
 
-bulk_upload_handler = BulkUploadHandler()
-bulk_upload_handler.create_queries_table()
 
-__all__ = ['bulk_upload_bp', 'BulkUploadHandler'] 
\ No newline at end of file
+def __getattr__(name):
+    # The handler pulls in pandas; only load it when someone asks for it
+    if name == 'BulkUploadHandler':
+        from .bulk_upload_handler import BulkUploadHandler
+        return BulkUploadHandler
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['bulk_upload_bp', 'BulkUploadHandler']
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark the study resources bulk ingest on a generated sheet.
+
+Builds a throwaway database, source files and an Excel sheet in a temp
+directory (nothing touches users.db or uploads/), then times each stage.
+
+Usage:
+    python -m bulk_upload.benchmark_ingest --rows 5000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from .study_resources_handler import StudyResourcesBulkUploadHandler
+
+
+def build_fixture(root, rows, classes=5, duplicate_every=50, missing_every=100):
+    """Create a database, source files and a sheet with some duplicates and missing files"""
+    db_path = os.path.join(root, 'bench.db')
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('CREATE TABLE classes (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL)')
+    c.execute('''CREATE TABLE resources (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT UNIQUE NOT NULL,
+        class_id INTEGER NOT NULL,
+        filepath TEXT NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT,
+        category TEXT NOT NULL
+    )''')
+    c.executemany('INSERT INTO classes (name) VALUES (?)', [(f'Class {i}',) for i in range(1, classes + 1)])
+    conn.commit()
+    conn.close()
+
+    source_dir = os.path.join(root, 'source')
+    os.makedirs(source_dir)
+    payload = b'%PDF-1.4\n' + os.urandom(16 * 1024)
+    records = []
+    for i in range(rows):
+        name = f'resource_{i}.pdf'
+        path = os.path.join(source_dir, name)
+        if i % missing_every != 0:
+            with open(path, 'wb') as f:
+                f.write(payload)
+        title_no = i - 1 if i % duplicate_every == 0 and i else i
+        records.append({
+            'File Name': name,
+            'File Path': path,
+            'Title': f'Resource {title_no}',
+            'Description': f'Generated resource {i}',
+            'Category': ['Study Material', 'Notes', 'Assignment'][i % 3],
+            'Class': f'Class {(title_no % classes) + 1}',
+        })
+    excel_path = os.path.join(root, 'bench.xlsx')
+    pd.DataFrame(records).to_excel(excel_path, index=False, sheet_name='Study Resources Upload')
+    return db_path, excel_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bulk study resources ingest')
+    parser.add_argument('--rows', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        print(f"🛠️  Building {args.rows}-row fixture in {root}")
+        started = time.perf_counter()
+        db_path, excel_path = build_fixture(root, args.rows)
+        print(f"   fixture ready in {time.perf_counter() - started:.2f}s")
+
+        handler = StudyResourcesBulkUploadHandler(
+            upload_folder=os.path.join(root, 'uploads'), db_path=db_path, notify=False
+        )
+        started = time.perf_counter()
+        results = handler.process_study_resources_excel(
+            excel_path, options={'skip_duplicates': True, 'skip_missing': True}
+        )
+        elapsed = time.perf_counter() - started
+
+        print(f"✅ Ingested {results['successful_uploads']} / {results['total_files']} rows in {elapsed:.2f}s "
+              f"({results['total_files'] / elapsed:.0f} rows/s)")
+        print(f"   skipped: {results['skipped_duplicates']} duplicates, {results['skipped_missing']} missing; "
+              f"failed: {results['failed_uploads']}")
+        for stage, seconds in results['timings'].items():
+            print(f"   {stage:<9} {seconds:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,7 @@ document.addEventListener('DOMContentLoaded', function() {
     let excelFilePath = null;
     let previewData = [];
     let rowChecks = {}; // index -> {is_duplicate, file_exists, duplicate_reason}
+    let activeJobId = null; // background import currently running, if any
 
     // Drag and drop functionality for Excel file
     excelUploadArea.addEventListener('dragover', (e) => {
@@ -141,6 +142,28 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Poll a background job until it finishes; resolves with the final job record
+    function waitForJob(jobId, onProgress) {
+        return new Promise((resolve, reject) => {
+            const poll = () => {
+                fetch('/jobs/' + jobId, { credentials: 'same-origin' })
+                .then(r => r.json())
+                .then(json => {
+                    if (!json.success) throw new Error(json.error || 'Job status unavailable');
+                    const job = json.job;
+                    if (job.status === 'queued' || job.status === 'running') {
+                        if (onProgress) onProgress(job);
+                        setTimeout(poll, 1000);
+                    } else {
+                        resolve(job);
+                    }
+                })
+                .catch(reject);
+            };
+            poll();
+        });
+    }
+
     function runDuplicateCheck(path) {
         fetch('/bulk-upload/check-duplicates', {
             method: 'POST',
@@ -148,8 +171,10 @@ document.addEventListener('DOMContentLoaded', function() {
             body: JSON.stringify({ file_path: path })
         })
         .then(r=>r.json())
-        .then(json => {
-            if (!json.success) return;
+        .then(data => data.success ? waitForJob(data.job_id) : null)
+        .then(job => {
+            if (!job || job.status !== 'succeeded' || !job.result) return;
+            const json = job.result;
             // Update rowChecks
             rowChecks = {};
             (json.rows||[]).forEach(r => {
@@ -246,31 +271,32 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(response => response.json())
         .then(data => {
-            if (data.success) {
-                const dryRun = data.results?.dry_run;
-                showProgress(dryRun ? 'Simulating upload (dry run)...' : 'Uploading study resources...', 3000);
-                
-                // Simulate progress updates
-                let progress = 0;
-                const interval = setInterval(() => {
-                    progress += 10;
-                    updateProgress(progress, `${dryRun ? 'Simulating' : 'Uploading'}... ${progress}%`);
-                    
-                    if (progress >= 100) {
-                        clearInterval(interval);
-                        hideProgress();
-                        showUploadResults(data.results);
-                    }
-                }, 300);
-                
+            if (!data.success) throw new Error(data.error);
+            activeJobId = data.job_id;
+            const verb = options.dry_run ? 'Simulating' : 'Uploading';
+            uploadProgress.style.display = 'block';
+            updateProgress(0, `${verb}... queued`);
+            return waitForJob(data.job_id, job => {
+                const pct = job.total ? (job.done / job.total) * 100 : 0;
+                updateProgress(pct, `${verb}... ${job.stage || 'starting'} ${job.done}/${job.total}`);
+            });
+        })
+        .then(job => {
+            hideProgress();
+            if (job.status === 'succeeded') {
+                showUploadResults(job.result);
+            } else if (job.status === 'cancelled') {
+                showError('Upload cancelled. Files copied so far were removed.');
             } else {
-                showError(data.error);
+                showError('Upload failed: ' + (job.error || 'unknown error'));
             }
         })
         .catch(error => {
+            hideProgress();
             showError('Upload failed: ' + error.message);
         })
         .finally(() => {
+            activeJobId = null;
             confirmUploadBtn.disabled = false;
             confirmUploadBtn.textContent = '✅ Confirm & Upload';
         });
@@ -278,6 +304,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Cancel upload functionality
     cancelUploadBtn.addEventListener('click', () => {
+        if (activeJobId) {
+            if (confirm('Stop the running upload? Rows not yet saved will be discarded.')) {
+                fetch('/jobs/' + activeJobId + '/cancel', { method: 'POST', credentials: 'same-origin' });
+            }
+            return;
+        }
         if (confirm('Are you sure you want to cancel? All uploaded data will be lost.')) {
             filePreview.style.display = 'none';
             excelInput.value = '';
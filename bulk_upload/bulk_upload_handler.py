@@ -5,6 +5,11 @@ from datetime import datetime
 import shutil
 from werkzeug.utils import secure_filename
 import logging
+import time
+from .ingest_engine import (
+    clean_text_columns, first_blank_required, extension_series, check_paths_exist,
+    plan_destinations, copy_files_parallel, remove_files, report_progress, IngestCancelled
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -38,36 +43,28 @@ class BulkUploadHandler:
                 os.makedirs(folder)
                 logger.info(f"Created folder: {folder}")
     
+    REQUIRED_COLUMNS = ['File Name', 'Category', 'Description', 'File Path']
+    
+    def validate_frame(self, df):
+        """Validate an already-loaded generic files sheet"""
+        missing_columns = [col for col in self.REQUIRED_COLUMNS if col not in df.columns]
+        if missing_columns:
+            return False, f"Missing required columns: {', '.join(missing_columns)}"
+        
+        if df.empty:
+            return False, "Excel file is empty"
+        
+        # Description may be blank
+        blank_error = first_blank_required(df, ['File Name', 'Category', 'File Path'])
+        if blank_error:
+            return False, blank_error
+        
+        return True, "Excel file is valid"
+    
     def validate_excel_file(self, file_path):
         """Validate Excel file format and structure"""
         try:
-            # Read Excel file
-            df = pd.read_excel(file_path)
-            
-            # Check required columns
-            required_columns = ['File Name', 'Category', 'Description', 'File Path']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                return False, f"Missing required columns: {', '.join(missing_columns)}"
-            
-            # Check if file is not empty
-            if df.empty:
-                return False, "Excel file is empty"
-            
-            # Validate data types and content
-            for index, row in df.iterrows():
-                if pd.isna(row['File Name']) or str(row['File Name']).strip() == '':
-                    return False, f"Row {index + 2}: File Name is required"
-                
-                if pd.isna(row['Category']) or str(row['Category']).strip() == '':
-                    return False, f"Row {index + 2}: Category is required"
-                
-                if pd.isna(row['File Path']) or str(row['File Path']).strip() == '':
-                    return False, f"Row {index + 2}: File Path is required"
-            
-            return True, "Excel file is valid"
-            
+            return self.validate_frame(pd.read_excel(file_path))
         except Exception as e:
             return False, f"Error reading Excel file: {str(e)}"
     
@@ -176,93 +173,140 @@ class BulkUploadHandler:
             logger.error(f"Error saving to database: {str(e)}")
             return False
     
-    def process_excel_upload(self, excel_file_path, uploaded_by='admin'):
-        """Process Excel file for bulk upload"""
+    def insert_uploaded_files(self, rows):
+        """Insert uploaded_files rows in one transaction"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS uploaded_files (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT NOT NULL,
+                    original_filename TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    description TEXT,
+                    file_path TEXT NOT NULL,
+                    file_size INTEGER,
+                    upload_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    uploaded_by TEXT,
+                    status TEXT DEFAULT 'active'
+                )
+            ''')
+            cursor.executemany('''
+                INSERT INTO uploaded_files 
+                (filename, original_filename, category, description, file_path, file_size, uploaded_by)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def process_excel_upload(self, excel_file_path, uploaded_by='admin', progress=None):
+        """
+        Process Excel file for bulk upload.
+        
+        Rows are validated column-wise, files are copied on a thread pool and
+        all rows are saved in one transaction. ``progress(stage, done, total)``
+        is called as work proceeds.
+        """
         results = {
             'success': [],
             'errors': [],
             'total_files': 0,
             'successful_uploads': 0,
-            'failed_uploads': 0
+            'failed_uploads': 0,
+            'timings': {}
         }
+        timings = results['timings']
+        started = time.perf_counter()
         
         try:
-            # Validate Excel file
-            is_valid, message = self.validate_excel_file(excel_file_path)
+            df = pd.read_excel(excel_file_path)
+            is_valid, message = self.validate_frame(df)
             if not is_valid:
                 results['errors'].append(f"Excel validation failed: {message}")
                 return results
             
-            # Read Excel file
-            df = pd.read_excel(excel_file_path)
-            results['total_files'] = len(df)
-            
-            logger.info(f"Processing {results['total_files']} files from Excel")
-            
-            # Process each row
-            for index, row in df.iterrows():
+            total = len(df)
+            results['total_files'] = total
+            logger.info(f"Processing {total} files from Excel")
+            
+            df = clean_text_columns(df, self.REQUIRED_COLUMNS)
+            exists = check_paths_exist(df['File Path'])
+            ext_ok = extension_series(df['File Path']).isin(self.allowed_extensions)
+            outcome = pd.Series('ok', index=df.index)
+            outcome[~exists] = 'missing'
+            outcome[exists & ~ext_ok] = 'bad_ext'
+            report_progress(progress, 'validate', total, total)
+            
+            ok = outcome == 'ok'
+            ok_index = df.index[ok]
+            folders = [
+                os.path.join(self.upload_folder, self.get_category_folder(category))
+                for category in df.loc[ok, 'Category']
+            ]
+            destinations = plan_destinations(folders, df.loc[ok, 'File Name'])
+            df['destination'] = None
+            df.loc[ok, 'destination'] = destinations
+            df['file_size'] = 0
+            
+            step = time.perf_counter()
+            copy_results = copy_files_parallel(list(zip(df.loc[ok, 'File Path'], destinations)), progress)
+            for idx, (error, size) in zip(ok_index, copy_results):
+                if error:
+                    logger.error(f"Error copying file {df.at[idx, 'File Path']}: {error}")
+                    outcome[idx] = 'copy_failed'
+                else:
+                    df.at[idx, 'file_size'] = size
+            ok = outcome == 'ok'
+            timings['copy'] = round(time.perf_counter() - step, 3)
+            
+            if ok.any():
+                step = time.perf_counter()
+                rows = [
+                    (os.path.basename(dest), name, cat, desc, dest, int(size), uploaded_by)
+                    for dest, name, cat, desc, size in zip(
+                        df.loc[ok, 'destination'], df.loc[ok, 'File Name'], df.loc[ok, 'Category'],
+                        df.loc[ok, 'Description'], df.loc[ok, 'file_size'])
+                ]
+                try:
+                    # Last point at which a cancelled import can still be rolled back
+                    report_progress(progress, 'insert', 0, len(rows))
+                except IngestCancelled:
+                    remove_files(df.loc[ok, 'destination'])
+                    raise
                 try:
-                    file_name = str(row['File Name']).strip()
-                    category = str(row['Category']).strip()
-                    description = str(row['Description']).strip() if pd.notna(row['Description']) else ''
-                    file_path = str(row['File Path']).strip()
-                    
-                    # Validate file exists
-                    if not self.validate_file_exists(file_path):
-                        error_msg = f"Row {index + 2}: File not found at {file_path}"
-                        results['errors'].append(error_msg)
-                        results['failed_uploads'] += 1
-                        continue
-                    
-                    # Validate file extension
-                    if not self.validate_file_extension(file_path):
-                        error_msg = f"Row {index + 2}: File type not allowed for {file_name}"
-                        results['errors'].append(error_msg)
-                        results['failed_uploads'] += 1
-                        continue
-                    
-                    # Get file size
-                    file_size = os.path.getsize(file_path)
-                    
-                    # Copy file to uploads folder
-                    new_filename, new_path = self.copy_file_to_uploads(file_path, category, file_name)
-                    
-                    if new_filename is None:
-                        error_msg = f"Row {index + 2}: Failed to copy file {file_name}"
-                        results['errors'].append(error_msg)
-                        results['failed_uploads'] += 1
-                        continue
-                    
-                    # Prepare file data for database
-                    file_data = {
-                        'filename': new_filename,
-                        'original_filename': file_name,
-                        'category': category,
-                        'description': description,
-                        'file_path': new_path,
-                        'file_size': file_size,
-                        'uploaded_by': uploaded_by
-                    }
-                    
-                    # Save to database
-                    if self.save_to_database(file_data):
-                        success_msg = f"Successfully uploaded: {file_name}"
-                        results['success'].append(success_msg)
-                        results['successful_uploads'] += 1
-                        logger.info(success_msg)
-                    else:
-                        error_msg = f"Row {index + 2}: Failed to save {file_name} to database"
-                        results['errors'].append(error_msg)
-                        results['failed_uploads'] += 1
-                    
+                    self.insert_uploaded_files(rows)
                 except Exception as e:
-                    error_msg = f"Row {index + 2}: Error processing {row.get('File Name', 'Unknown')}: {str(e)}"
-                    results['errors'].append(error_msg)
+                    logger.error(f"Error saving to database: {str(e)}")
+                    remove_files(df.loc[ok, 'destination'])
+                    outcome[ok] = 'db_failed'
+                timings['insert'] = round(time.perf_counter() - step, 3)
+            
+            for idx, state in outcome.items():
+                row_no = idx + 2
+                file_name = df.at[idx, 'File Name']
+                if state == 'ok':
+                    results['success'].append(f"Successfully uploaded: {file_name}")
+                    results['successful_uploads'] += 1
+                else:
+                    results['errors'].append({
+                        'missing': f"Row {row_no}: File not found at {df.at[idx, 'File Path']}",
+                        'bad_ext': f"Row {row_no}: File type not allowed for {file_name}",
+                        'copy_failed': f"Row {row_no}: Failed to copy file {file_name}",
+                        'db_failed': f"Row {row_no}: Failed to save {file_name} to database",
+                    }[state])
                     results['failed_uploads'] += 1
-                    logger.error(error_msg)
             
-            logger.info(f"Bulk upload completed: {results['successful_uploads']} successful, {results['failed_uploads']} failed")
+            timings['total'] = round(time.perf_counter() - started, 3)
+            logger.info(f"Bulk upload completed: {results['successful_uploads']} successful, {results['failed_uploads']} failed ({timings['total']}s)")
             
+        except IngestCancelled:
+            logger.info("Bulk upload cancelled")
+            raise
         except Exception as e:
             error_msg = f"Error processing Excel file: {str(e)}"
             results['errors'].append(error_msg)
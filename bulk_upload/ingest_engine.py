@@ -0,0 +1,156 @@
+"""
+Bulk ingest engine shared by the Excel bulk upload handlers.
+
+Rows are validated column-wise with pandas, file existence checks and copies
+run on a thread pool, and every database row for a sheet is written in a
+single transaction with executemany.
+"""
+
+import os
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# File copies are I/O bound, so a few more threads than cores is fine
+COPY_WORKERS = min(16, (os.cpu_count() or 2) * 2)
+PROGRESS_EVERY = 250
+
+ProgressCallback = Optional[Callable[[str, int, int], None]]
+
+
+class IngestCancelled(Exception):
+    """Raised by a progress callback to stop an ingest that was cancelled"""
+
+
+def report_progress(progress: ProgressCallback, stage: str, done: int, total: int):
+    """Forward progress to the caller and log it at a coarse interval"""
+    if progress:
+        try:
+            progress(stage, done, total)
+        except IngestCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Progress callback failed: {str(e)}")
+    if done == total or done % PROGRESS_EVERY == 0:
+        logger.info(f"[{stage}] {done}/{total}")
+
+
+def clean_text_columns(df: pd.DataFrame, columns: Iterable[str]) -> pd.DataFrame:
+    """Return a copy with the given columns as stripped strings ('' for blanks)"""
+    df = df.copy()
+    for col in columns:
+        if col in df.columns:
+            df[col] = df[col].fillna('').astype(str).str.strip()
+    return df
+
+
+def first_blank_required(df: pd.DataFrame, required: List[str]) -> Optional[str]:
+    """Return the error for the first row with a blank required field, or None"""
+    blank = pd.DataFrame({
+        col: df[col].isna() | (df[col].astype(str).str.strip() == '') for col in required
+    })
+    bad_rows = blank.any(axis=1)
+    if not bad_rows.any():
+        return None
+    index = bad_rows.idxmax()
+    column = next(col for col in required if blank.at[index, col])
+    return f"Row {index + 2}: {column} is required"
+
+
+def extension_series(paths: pd.Series) -> pd.Series:
+    """Lower-case file extension for each path ('' if none)"""
+    return paths.str.extract(r'\.([^./\\]+)$', expand=False).fillna('').str.lower()
+
+
+def check_paths_exist(paths: pd.Series, workers: int = COPY_WORKERS) -> pd.Series:
+    """Boolean series: does each path point at an existing file (checked once per unique path)"""
+    unique_paths = [p for p in paths.unique() if p]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        exists = dict(zip(unique_paths, pool.map(os.path.isfile, unique_paths)))
+    return paths.map(exists).fillna(False).astype(bool)
+
+
+def safe_class_folder(class_name: str) -> str:
+    """Folder-safe version of a class name (matches the handlers' existing layout)"""
+    return ''.join(ch for ch in class_name if ch.isalnum() or ch in (' ', '_', '-')).strip().replace(' ', '_')
+
+
+def plan_destinations(folders: Iterable[str], filenames: Iterable[str],
+                      reserved_names: Optional[Set[str]] = None) -> List[str]:
+    """
+    Choose a collision-free destination path for each file.
+
+    Each destination folder is listed once instead of probing os.path.exists
+    per candidate. Names in ``reserved_names`` (e.g. filenames already in the
+    database) are skipped as well, and planned names are added to it.
+    """
+    taken: Dict[str, Set[str]] = {}
+    reserved = reserved_names if reserved_names is not None else set()
+    planned = []
+    for folder, name in zip(folders, filenames):
+        if folder not in taken:
+            taken[folder] = set(os.listdir(folder)) if os.path.isdir(folder) else set()
+        used = taken[folder]
+        base, ext = os.path.splitext(name)
+        final = name
+        counter = 1
+        while final in used or final in reserved:
+            final = f"{base}_{counter}{ext}"
+            counter += 1
+        used.add(final)
+        reserved.add(final)
+        planned.append(os.path.join(folder, final))
+    return planned
+
+
+def _copy_one(pair: Tuple[str, str]) -> Tuple[Optional[str], int]:
+    source, destination = pair
+    try:
+        shutil.copy2(source, destination)
+        return None, os.path.getsize(destination)
+    except Exception as e:
+        return str(e), 0
+
+
+def copy_files_parallel(pairs: List[Tuple[str, str]], progress: ProgressCallback = None,
+                        workers: int = COPY_WORKERS) -> List[Tuple[Optional[str], int]]:
+    """
+    Copy (source, destination) pairs on a thread pool.
+
+    Returns one (error or None, size in bytes) per pair, in input order.
+    If the progress callback raises IngestCancelled, copies that have not
+    started are dropped and every destination written so far is removed.
+    """
+    for folder in {os.path.dirname(dst) for _, dst in pairs}:
+        os.makedirs(folder, exist_ok=True)
+    results = []
+    total = len(pairs)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_copy_one, pair) for pair in pairs]
+        try:
+            for done, future in enumerate(futures, start=1):
+                results.append(future.result())
+                report_progress(progress, 'copy', done, total)
+        except IngestCancelled:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=True)
+            remove_files(dst for future, (_, dst) in zip(futures, pairs)
+                         if not future.cancelled())
+            raise
+    return results
+
+
+def remove_files(paths: Iterable[str]):
+    """Best-effort removal of files copied for a batch that was rolled back"""
+    for path in paths:
+        try:
+            if path and os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            pass
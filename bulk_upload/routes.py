@@ -3,12 +3,11 @@ from werkzeug.utils import secure_filename
 import os
 import tempfile
 from datetime import datetime
-from .bulk_upload_handler import BulkUploadHandler
-from .study_resources_handler import StudyResourcesBulkUploadHandler
+from functools import lru_cache
 import logging
 import glob
-import pandas as pd
-from .unified_bulk_upload_handler import UnifiedBulkUploadHandler
+from job_runner import register_job_handler, submit_job, JobCancelled
+from data_export import register_export, serve_export
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,10 +16,129 @@ logger = logging.getLogger(__name__)
 # Create Blueprint
 bulk_upload_bp = Blueprint('bulk_upload', __name__, url_prefix='/bulk-upload')
 
-# Initialize handlers
-bulk_handler = BulkUploadHandler()
-study_resources_handler = StudyResourcesBulkUploadHandler()
-unified = UnifiedBulkUploadHandler()
+# Handlers (and pandas behind them) load on first use, so registering the
+# blueprint does not slow down every worker start
+@lru_cache(maxsize=None)
+def get_bulk_handler():
+    from .bulk_upload_handler import BulkUploadHandler
+    return BulkUploadHandler()
+
+
+@lru_cache(maxsize=None)
+def get_study_resources_handler():
+    from .study_resources_handler import StudyResourcesBulkUploadHandler
+    return StudyResourcesBulkUploadHandler()
+
+
+@lru_cache(maxsize=None)
+def get_unified_handler():
+    from .unified_bulk_upload_handler import UnifiedBulkUploadHandler
+    return UnifiedBulkUploadHandler()
+
+
+# ==================== Background jobs ====================
+
+def _cleanup_temp_excel(excel_path):
+    """Delete an uploaded sheet unless it lives in the shared xlsx folder"""
+    xlsx_folder = os.path.join(os.getcwd(), 'xlsx')
+    try:
+        if not excel_path.startswith(xlsx_folder):
+            os.remove(excel_path)
+            temp_dir = os.path.dirname(excel_path)
+            if os.path.exists(temp_dir):
+                os.rmdir(temp_dir)
+    except Exception:
+        pass
+
+
+def _job_progress(ctx):
+    """Progress callback that stops the ingest once the job is cancelled"""
+    from .ingest_engine import IngestCancelled
+    def progress(stage, done, total):
+        if not ctx.report(stage, done, total):
+            raise IngestCancelled()
+    return progress
+
+
+def run_resource_import_job(ctx, excel_path, uploaded_by='admin', options=None, unified_sheet=False):
+    """Job: import a study resources (or unified) sheet and return the results dict"""
+    from .ingest_engine import IngestCancelled
+    try:
+        if unified_sheet:
+            return get_unified_handler().process_excel(excel_path, uploaded_by, options or {}, _job_progress(ctx))
+        return get_study_resources_handler().process_study_resources_excel(
+            excel_path, uploaded_by, options or {}, _job_progress(ctx))
+    except IngestCancelled:
+        raise JobCancelled()
+    finally:
+        _cleanup_temp_excel(excel_path)
+
+
+def run_duplicate_check_job(ctx, excel_path):
+    """Job: report duplicates and missing files for a study resources sheet"""
+    import sqlite3
+    import pandas as pd
+    from .ingest_engine import check_paths_exist
+    df = pd.read_excel(excel_path, sheet_name='Study Resources Upload')
+    ctx.report('read', 0, len(df))
+    for col in ['Title', 'Class', 'Category', 'File Path']:
+        if col not in df.columns:
+            df[col] = ''
+        df[col] = df[col].fillna('').astype(str).str.strip()
+
+    conn = sqlite3.connect(get_study_resources_handler().db_path)
+    c = conn.cursor()
+    try:
+        # Class name -> id map without creating new classes
+        c.execute('SELECT name, id FROM classes')
+        classes = dict(c.fetchall())
+        c.execute('SELECT title, class_id FROM resources')
+        existing_pairs = set(c.fetchall())
+    finally:
+        conn.close()
+
+    class_ids = df['Class'].map(classes)
+    is_duplicate = [bool(cid) and bool(title) and (title, cid) in existing_pairs
+                    for title, cid in zip(df['Title'], class_ids)]
+    ctx.check_cancelled()
+    file_exists = check_paths_exist(df['File Path'])
+
+    rows = [{
+        'index': int(idx),
+        'title': title,
+        'class': class_name,
+        'category': category,
+        'file_path': file_path,
+        'file_exists': bool(exists),
+        'is_duplicate': dup,
+        'duplicate_reason': f"Title already exists in class '{class_name}'" if dup else ''
+    } for idx, title, class_name, category, file_path, exists, dup in zip(
+        df.index, df['Title'], df['Class'], df['Category'], df['File Path'], file_exists, is_duplicate)]
+    ctx.report('check', len(rows), len(rows))
+
+    return {
+        'summary': {
+            'total_rows': len(rows),
+            'duplicates': sum(is_duplicate),
+            'missing_files': int((~file_exists).sum())
+        },
+        'rows': rows
+    }
+
+
+register_job_handler('resource_import', run_resource_import_job)
+register_job_handler('resource_duplicate_check', run_duplicate_check_job)
+
+
+def _job_accepted(job_id):
+    """202 response pointing the client at the job status URL"""
+    if not job_id:
+        return jsonify({'success': False, 'error': 'Could not start background job'}), 500
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': f'/jobs/{job_id}'
+    }), 202
 
 @bulk_upload_bp.route('/')
 def bulk_upload_page():
@@ -64,7 +182,7 @@ def upload_excel():
         
         try:
             # First, validate and preview the Excel file
-            is_valid, message = study_resources_handler.validate_excel_file(excel_path)
+            is_valid, message = get_study_resources_handler().validate_excel_file(excel_path)
             
             if not is_valid:
                 # Clean up and return error
@@ -76,6 +194,7 @@ def upload_excel():
                 }), 400
             
             # Read Excel file for preview
+            import pandas as pd
             df = pd.read_excel(excel_path, sheet_name='Study Resources Upload')
             preview_data = df.head(10).to_dict('records')
             
@@ -119,27 +238,13 @@ def confirm_upload():
                 'error': 'Excel file not found'
             }), 400
         
-        # Process the Excel file
-        options = data.get('options') or {}
-        results = study_resources_handler.process_study_resources_excel(excel_path, uploaded_by, options)
-        
-        # Only delete the file if it is a temp file (not in xlsx folder)
-        xlsx_folder = os.path.join(os.getcwd(), 'xlsx')
-        try:
-            if not excel_path.startswith(xlsx_folder):
-                os.remove(excel_path)
-                temp_dir = os.path.dirname(excel_path)
-                if os.path.exists(temp_dir):
-                    os.rmdir(temp_dir)
-        except:
-            pass
-        
-        # Return results
-        return jsonify({
-            'success': True,
-            'results': results,
-            'message': f"Processed {results['total_files']} files. {results['successful_uploads']} successful, {results['failed_uploads']} failed."
-        })
+        # Process the Excel file in the background; the client polls /jobs/<id>
+        job_id = submit_job('resource_import', {
+            'excel_path': excel_path,
+            'uploaded_by': uploaded_by,
+            'options': data.get('options') or {}
+        }, session.get('username'))
+        return _job_accepted(job_id)
         
     except Exception as e:
         logger.error(f"Error in confirm upload: {str(e)}")
@@ -157,7 +262,7 @@ def download_template():
         template_path = os.path.join(temp_dir, 'study_resources_template.xlsx')
         
         # Generate template
-        success = study_resources_handler.create_study_resources_template(template_path)
+        success = get_study_resources_handler().create_study_resources_template(template_path)
         
         if not success:
             return jsonify({
@@ -184,7 +289,7 @@ def download_template():
 def get_statistics():
     """Get upload statistics"""
     try:
-        stats = bulk_handler.get_upload_statistics()
+        stats = get_bulk_handler().get_upload_statistics()
         
         if stats is None:
             return jsonify({
@@ -238,7 +343,7 @@ def validate_excel():
         
         try:
             # Validate the Excel file
-            is_valid, message = study_resources_handler.validate_excel_file(excel_path)
+            is_valid, message = get_study_resources_handler().validate_excel_file(excel_path)
             
             # Clean up temporary file
             os.remove(excel_path)
@@ -378,69 +483,8 @@ def check_duplicates():
         if not excel_path or not os.path.exists(excel_path):
             return jsonify({'success': False, 'error': 'Excel file path invalid'}), 400
 
-        import pandas as pd
-        df = pd.read_excel(excel_path, sheet_name='Study Resources Upload')
-
-        # Open DB connection
-        import sqlite3
-        conn = sqlite3.connect(study_resources_handler.db_path)
-        c = conn.cursor()
-
-        # Build class name -> id map without creating new classes
-        classes = {}
-        c.execute('SELECT id, name FROM classes')
-        for row in c.fetchall():
-            classes[row[1]] = row[0]
-
-        results = []
-        for idx, row in df.iterrows():
-            title = str(row.get('Title') or '').strip()
-            class_name = str(row.get('Class') or '').strip()
-            category = str(row.get('Category') or '').strip()
-            file_path = str(row.get('File Path') or '').strip()
-
-            class_id = classes.get(class_name)
-
-            is_duplicate = False
-            duplicate_reason = ''
-            if class_id and title:
-                # Check duplicate by title+class (and optionally category)
-                try:
-                    c.execute('SELECT COUNT(1) FROM resources WHERE title = ? AND class_id = ?', (title, class_id))
-                    count = c.fetchone()[0] or 0
-                    if count > 0:
-                        is_duplicate = True
-                        duplicate_reason = f"Title already exists in class '{class_name}'"
-                except Exception:
-                    pass
-
-            file_exists = bool(file_path) and os.path.exists(file_path) and os.path.isfile(file_path)
-
-            results.append({
-                'index': int(idx),
-                'title': title,
-                'class': class_name,
-                'category': category,
-                'file_path': file_path,
-                'file_exists': file_exists,
-                'is_duplicate': is_duplicate,
-                'duplicate_reason': duplicate_reason
-            })
-
-        conn.close()
-        total = len(results)
-        dup_count = sum(1 for r in results if r['is_duplicate'])
-        missing_count = sum(1 for r in results if not r['file_exists'])
-
-        return jsonify({
-            'success': True,
-            'summary': {
-                'total_rows': total,
-                'duplicates': dup_count,
-                'missing_files': missing_count
-            },
-            'rows': results
-        })
+        return _job_accepted(submit_job('resource_duplicate_check', {'excel_path': excel_path},
+                                        session.get('username')))
     except Exception as e:
         logger.error(f"Error checking duplicates: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -458,7 +502,7 @@ def unified_validate():
         temp_dir = tempfile.mkdtemp()
         excel_path = os.path.join(temp_dir, secure_filename(f.filename))
         f.save(excel_path)
-        ok, msg = unified.validate_excel_file(excel_path)
+        ok, msg = get_unified_handler().validate_excel_file(excel_path)
         try:
             os.remove(excel_path)
             os.rmdir(temp_dir)
@@ -481,7 +525,7 @@ def unified_preview():
         temp_dir = tempfile.mkdtemp()
         excel_path = os.path.join(temp_dir, secure_filename(f.filename))
         f.save(excel_path)
-        kind, sheet = unified.detect_sheet_type(excel_path)
+        kind, sheet = get_unified_handler().detect_sheet_type(excel_path)
         if not kind:
             return jsonify({'success': False, 'error': 'Unsupported Excel format'}), 400
         df = pd.read_excel(excel_path, sheet_name=sheet)
@@ -499,18 +543,13 @@ def unified_confirm():
             return jsonify({'success': False, 'error': 'Excel file not found'}), 400
         uploaded_by = data.get('uploaded_by', 'admin')
         options = data.get('options') or {}
-        results = unified.process_excel(excel_path, uploaded_by, options)
-        # Clean temp if not xlsx folder
-        xlsx_folder = os.path.join(os.getcwd(), 'xlsx')
-        try:
-            if not excel_path.startswith(xlsx_folder):
-                os.remove(excel_path)
-                temp_dir = os.path.dirname(excel_path)
-                if os.path.exists(temp_dir):
-                    os.rmdir(temp_dir)
-        except Exception:
-            pass
-        return jsonify({'success': True, 'results': results})
+        job_id = submit_job('resource_import', {
+            'excel_path': excel_path,
+            'uploaded_by': uploaded_by,
+            'options': options,
+            'unified_sheet': True
+        }, session.get('username'))
+        return _job_accepted(job_id)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -520,21 +559,31 @@ def download_master_template():
         import tempfile
         temp_dir = tempfile.mkdtemp()
         out = os.path.join(temp_dir, 'bulk_master_template.xlsx')
-        if unified.create_master_template(out):
+        if get_unified_handler().create_master_template(out):
             return send_file(out, as_attachment=True, download_name='bulk_master_template.xlsx')
         return jsonify({'success': False, 'error': 'Failed to create template'}), 500
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+register_export('bulk_master', [
+    {
+        'title': 'Study Resources',
+        'query': 'SELECT r.id, r.filename, r.filepath as file_path, r.title, r.description, r.category, c.name as class_name '
+                 'FROM resources r LEFT JOIN classes c ON c.id = r.class_id',
+    },
+    {
+        # Older databases lack some of these columns; the sheet is left empty then
+        'title': 'Uploaded Files',
+        'query': 'SELECT id, filename, original_filename, category, description, file_path, file_size, upload_date, uploaded_by '
+                 'FROM uploaded_files',
+        'optional': True,
+    },
+], filename='bulk_master_export')
+
 @bulk_upload_bp.route('/unified/export')
 def export_master_records():
     try:
-        import tempfile
-        temp_dir = tempfile.mkdtemp()
-        out = os.path.join(temp_dir, 'bulk_master_export.xlsx')
-        if unified.export_master_excel(out):
-            return send_file(out, as_attachment=True, download_name='bulk_master_export.xlsx')
-        return jsonify({'success': False, 'error': 'Failed to export'}), 500
+        return serve_export('bulk_master', default_format='xlsx')
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
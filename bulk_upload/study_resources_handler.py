@@ -5,15 +5,23 @@ from datetime import datetime
 import shutil
 from werkzeug.utils import secure_filename
 import logging
+import time
+from .ingest_engine import (
+    clean_text_columns, first_blank_required, extension_series, check_paths_exist,
+    safe_class_folder, plan_destinations, copy_files_parallel, remove_files, report_progress,
+    IngestCancelled
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class StudyResourcesBulkUploadHandler:
-    def __init__(self, upload_folder='uploads', db_path='users.db'):
+    def __init__(self, upload_folder='uploads', db_path='users.db', notify=True):
         self.upload_folder = upload_folder
         self.db_path = db_path
+        # Send class notifications and refresh the web app's caches after an import
+        self.notify = notify
         self.allowed_extensions = {'pdf', 'doc', 'docx', 'txt'}
         
         # Create upload folders if they don't exist
@@ -37,42 +45,45 @@ class StudyResourcesBulkUploadHandler:
                 os.makedirs(folder)
                 logger.info(f"Created folder: {folder}")
     
+    REQUIRED_COLUMNS = ['File Name', 'File Path', 'Title', 'Category', 'Class']
+    CATEGORY_FOLDERS = {
+        'study material': 'study_materials',
+        'study materials': 'study_materials',
+        'assignment': 'assignments',
+        'assignments': 'assignments',
+        'note': 'notes',
+        'notes': 'notes',
+        'practice test': 'practice_tests',
+        'practice tests': 'practice_tests',
+        'reference book': 'reference_books',
+        'reference books': 'reference_books',
+        'video': 'videos',
+        'videos': 'videos'
+    }
+    
+    def read_sheet(self, file_path):
+        """Read the study resources sheet"""
+        return pd.read_excel(file_path, sheet_name='Study Resources Upload')
+    
+    def validate_frame(self, df):
+        """Validate an already-loaded study resources sheet"""
+        missing_columns = [col for col in self.REQUIRED_COLUMNS if col not in df.columns]
+        if missing_columns:
+            return False, f"Missing required columns: {', '.join(missing_columns)}"
+        
+        if df.empty:
+            return False, "Excel file is empty"
+        
+        blank_error = first_blank_required(df, self.REQUIRED_COLUMNS)
+        if blank_error:
+            return False, blank_error
+        
+        return True, "Excel file is valid"
+    
     def validate_excel_file(self, file_path):
         """Validate Excel file format and structure for study resources"""
         try:
-            # Read Excel file
-            df = pd.read_excel(file_path, sheet_name='Study Resources Upload')
-            
-            # Check required columns
-            required_columns = ['File Name', 'File Path', 'Title', 'Category', 'Class']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                return False, f"Missing required columns: {', '.join(missing_columns)}"
-            
-            # Check if file is not empty
-            if df.empty:
-                return False, "Excel file is empty"
-            
-            # Validate data types and content
-            for index, row in df.iterrows():
-                if pd.isna(row['File Name']) or str(row['File Name']).strip() == '':
-                    return False, f"Row {index + 2}: File Name is required"
-                
-                if pd.isna(row['File Path']) or str(row['File Path']).strip() == '':
-                    return False, f"Row {index + 2}: File Path is required"
-                
-                if pd.isna(row['Title']) or str(row['Title']).strip() == '':
-                    return False, f"Row {index + 2}: Title is required"
-                
-                if pd.isna(row['Category']) or str(row['Category']).strip() == '':
-                    return False, f"Row {index + 2}: Category is required"
-                
-                if pd.isna(row['Class']) or str(row['Class']).strip() == '':
-                    return False, f"Row {index + 2}: Class is required"
-            
-            return True, "Excel file is valid"
-            
+            return self.validate_frame(self.read_sheet(file_path))
         except Exception as e:
             return False, f"Error reading Excel file: {str(e)}"
     
@@ -91,23 +102,8 @@ class StudyResourcesBulkUploadHandler:
     
     def get_category_folder(self, category):
         """Get the appropriate folder for a category"""
-        category_mapping = {
-            'study material': 'study_materials',
-            'study materials': 'study_materials',
-            'assignment': 'assignments',
-            'assignments': 'assignments',
-            'note': 'notes',
-            'notes': 'notes',
-            'practice test': 'practice_tests',
-            'practice tests': 'practice_tests',
-            'reference book': 'reference_books',
-            'reference books': 'reference_books',
-            'video': 'videos',
-            'videos': 'videos'
-        }
-        
         category_lower = category.lower().strip()
-        return category_mapping.get(category_lower, 'other')
+        return self.CATEGORY_FOLDERS.get(category_lower, 'other')
     
     def get_class_id(self, class_name):
         """Get class ID from class name"""
@@ -132,6 +128,7 @@ class StudyResourcesBulkUploadHandler:
                 
                 conn.commit()
                 conn.close()
+                self.invalidate_class_cache()
                 
                 logger.info(f"Created new class: {class_name} with ID: {class_id}")
                 return class_id
@@ -219,6 +216,22 @@ class StudyResourcesBulkUploadHandler:
             logger.error(f"Error saving to study resources: {str(e)}")
             return False
     
+    def invalidate_catalogue_cache(self):
+        """Drop the web app's cached per-class resource lists after a bulk insert"""
+        try:
+            from study_resources import invalidate_resource_catalogue
+            invalidate_resource_catalogue()
+        except Exception as e:
+            logger.error(f"Error invalidating resource catalogue cache: {str(e)}")
+    
+    def invalidate_class_cache(self):
+        """Make every worker reload the class list after classes were created here"""
+        try:
+            from auth_handler import invalidate_class_cache
+            invalidate_class_cache()
+        except Exception as e:
+            logger.error(f"Error invalidating class cache: {str(e)}")
+    
     def is_duplicate_resource(self, title, class_name):
         """Return True if a resource with same title exists in the class"""
         try:
@@ -237,8 +250,85 @@ class StudyResourcesBulkUploadHandler:
             logger.error(f"Error checking duplicate resource: {str(e)}")
             return False
     
-    def process_study_resources_excel(self, excel_file_path, uploaded_by='admin', options=None):
-        """Process Excel file for bulk study resources upload with options"""
+    def load_class_ids(self, class_names, create_missing=True):
+        """Map class names to IDs with one query, creating missing classes in one transaction"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT name, id FROM classes')
+            class_ids = dict(cursor.fetchall())
+            missing = sorted({name for name in class_names if name and name not in class_ids})
+            if missing and create_missing:
+                cursor.executemany('INSERT INTO classes (name) VALUES (?)', [(name,) for name in missing])
+                conn.commit()
+                self.invalidate_class_cache()
+                cursor.execute('SELECT name, id FROM classes')
+                class_ids = dict(cursor.fetchall())
+                logger.info(f"Created {len(missing)} new classes: {', '.join(missing)}")
+            return class_ids
+        finally:
+            conn.close()
+    
+    def load_existing_resources(self):
+        """Prefetch (title, class_id) pairs and filenames already in the resources table"""
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT title, class_id, filename FROM resources')
+            rows = cursor.fetchall()
+            return {(title, class_id) for title, class_id, _ in rows}, {filename for _, _, filename in rows}
+        finally:
+            conn.close()
+    
+    def insert_resources(self, rows):
+        """Insert (filename, class_id, filepath, title, description, category) rows in one transaction"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        cursor = conn.cursor()
+        try:
+            cursor.executemany('''
+                INSERT INTO resources 
+                (filename, class_id, filepath, title, description, category)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def notify_new_resources(self, inserted):
+        """Send one notification per class/audience instead of one per file"""
+        try:
+            from auth_handler import add_notification
+        except Exception as e:
+            logger.error(f"Error sending notification: {str(e)}")
+            return
+        paid_categories = ['worksheet', 'formula', 'formula sheet']
+        groups = {}
+        for class_id, title, category in inserted:
+            target_paid_status = 'paid' if category.lower() in paid_categories else 'all'
+            groups.setdefault((class_id, target_paid_status), []).append((title, category))
+        for (class_id, target_paid_status), items in groups.items():
+            if len(items) == 1:
+                message = f'New {items[0][1]} uploaded: {items[0][0]}'
+            else:
+                message = f'{len(items)} new study resources uploaded'
+            try:
+                add_notification(message, class_id, target_paid_status,
+                                 status='active', notification_type='study_resource')
+            except Exception as e:
+                logger.error(f"Error sending notification: {str(e)}")
+    
+    def process_study_resources_excel(self, excel_file_path, uploaded_by='admin', options=None, progress=None):
+        """
+        Process Excel file for bulk study resources upload with options.
+        
+        Validation is column-wise, duplicates are checked against one prefetched
+        set, files are copied on a thread pool and all rows are inserted in a
+        single transaction. ``progress(stage, done, total)`` is called as work
+        proceeds.
+        """
         results = {
             'success': [],
             'errors': [],
@@ -248,7 +338,8 @@ class StudyResourcesBulkUploadHandler:
             'failed_uploads': 0,
             'skipped_duplicates': 0,
             'skipped_missing': 0,
-            'dry_run': False
+            'dry_run': False,
+            'timings': {}
         }
         
         opts = options or {}
@@ -256,121 +347,141 @@ class StudyResourcesBulkUploadHandler:
         skip_missing = bool(opts.get('skip_missing'))
         dry_run = bool(opts.get('dry_run'))
         results['dry_run'] = dry_run
+        timings = results['timings']
+        started = time.perf_counter()
         
         try:
-            # Validate Excel file
-            is_valid, message = self.validate_excel_file(excel_file_path)
+            df = self.read_sheet(excel_file_path)
+            timings['read'] = round(time.perf_counter() - started, 3)
+            is_valid, message = self.validate_frame(df)
             if not is_valid:
                 results['errors'].append(f"Excel validation failed: {message}")
                 return results
             
-            # Read Excel file
-            df = pd.read_excel(excel_file_path, sheet_name='Study Resources Upload')
-            results['total_files'] = len(df)
+            total = len(df)
+            results['total_files'] = total
+            logger.info(f"Processing {total} study resources from Excel (dry_run={dry_run})")
+            report_progress(progress, 'validate', 0, total)
+            
+            # ---- Vectorized validation ----
+            step = time.perf_counter()
+            df = clean_text_columns(df, self.REQUIRED_COLUMNS + ['Description'])
+            if 'Description' not in df.columns:
+                df['Description'] = ''
+            exists = check_paths_exist(df['File Path'])
+            ext_ok = extension_series(df['File Path']).isin(self.allowed_extensions)
+            
+            class_ids = self.load_class_ids(df['Class'].unique(), create_missing=not dry_run)
+            df['class_id'] = df['Class'].map(class_ids)
+            existing_pairs, existing_filenames = self.load_existing_resources()
+            in_db = pd.Series(
+                [(t, c) in existing_pairs for t, c in zip(df['Title'], df['class_id'])], index=df.index
+            )
+            candidates = exists & ext_ok
+            # A later row repeating an earlier row's title in the same class is a duplicate too
+            in_sheet = df['Title'].where(candidates).to_frame().assign(c=df['Class']).duplicated() & candidates
+            duplicate = (in_db | in_sheet) & candidates
+            
+            outcome = pd.Series('ok', index=df.index)
+            outcome[~exists] = 'skip_missing' if skip_missing else 'missing'
+            outcome[exists & ~ext_ok] = 'bad_ext'
+            outcome[duplicate] = 'skip_duplicate' if skip_duplicates else 'duplicate'
+            timings['validate'] = round(time.perf_counter() - step, 3)
+            report_progress(progress, 'validate', total, total)
+            
+            # ---- Destinations ----
+            ok = outcome == 'ok'
+            category_folder = df['Category'].str.lower().map(self.CATEGORY_FOLDERS).fillna('other')
+            class_folder = df['Class'].map(safe_class_folder)
+            folders = [
+                os.path.join(self.upload_folder, cls, cat) if cls else os.path.join(self.upload_folder, cat)
+                for cls, cat in zip(class_folder[ok], category_folder[ok])
+            ]
+            if dry_run:
+                destinations = [os.path.join(folder, name) for folder, name in zip(folders, df.loc[ok, 'File Name'])]
+            else:
+                destinations = plan_destinations(folders, df.loc[ok, 'File Name'], set(existing_filenames))
+            df['destination'] = None
+            df.loc[ok, 'destination'] = destinations
             
-            logger.info(f"Processing {results['total_files']} study resources from Excel (dry_run={dry_run})")
+            # ---- Parallel copy ----
+            if not dry_run:
+                step = time.perf_counter()
+                ok_index = df.index[ok]
+                copy_results = copy_files_parallel(list(zip(df.loc[ok, 'File Path'], destinations)), progress)
+                failed_copy = [idx for idx, (error, _) in zip(ok_index, copy_results) if error]
+                for idx, (error, _) in zip(ok_index, copy_results):
+                    if error:
+                        logger.error(f"Error copying file {df.at[idx, 'File Path']}: {error}")
+                outcome[failed_copy] = 'copy_failed'
+                ok = outcome == 'ok'
+                timings['copy'] = round(time.perf_counter() - step, 3)
             
-            # Process each row
-            for index, row in df.iterrows():
+            # ---- Single-transaction insert ----
+            if not dry_run and ok.any():
+                step = time.perf_counter()
+                rows = [
+                    (os.path.basename(dest), int(cid), dest, title, desc, cat)
+                    for dest, cid, title, desc, cat in zip(
+                        df.loc[ok, 'destination'], df.loc[ok, 'class_id'], df.loc[ok, 'Title'],
+                        df.loc[ok, 'Description'], df.loc[ok, 'Category'])
+                ]
                 try:
-                    file_name = str(row['File Name']).strip()
-                    file_path = str(row['File Path']).strip()
-                    title = str(row['Title']).strip()
-                    description = str(row['Description']).strip() if pd.notna(row['Description']) else ''
-                    category = str(row['Category']).strip()
-                    class_name = str(row['Class']).strip()
-                    
-                    # Validate file exists
-                    if not self.validate_file_exists(file_path):
-                        if skip_missing:
-                            msg = f"Row {index + 2}: Skipped missing file at {file_path}"
-                            results['skipped'].append(msg)
-                            results['skipped_missing'] += 1
-                            continue
-                        else:
-                            error_msg = f"Row {index + 2}: File not found at {file_path}"
-                            results['errors'].append(error_msg)
-                            results['failed_uploads'] += 1
-                            continue
-                    
-                    # Validate file extension
-                    if not self.validate_file_extension(file_path):
-                        error_msg = f"Row {index + 2}: File type not allowed for {file_name}"
-                        results['errors'].append(error_msg)
-                        results['failed_uploads'] += 1
-                        continue
-                    
-                    # Duplicate check
-                    if self.is_duplicate_resource(title, class_name):
-                        if skip_duplicates:
-                            msg = f"Row {index + 2}: Skipped duplicate '{title}' in class {class_name}"
-                            results['skipped'].append(msg)
-                            results['skipped_duplicates'] += 1
-                            continue
-                        else:
-                            # Treat as error
-                            error_msg = f"Row {index + 2}: Duplicate resource '{title}' already exists in class {class_name}"
-                            results['errors'].append(error_msg)
-                            results['failed_uploads'] += 1
-                            continue
-                    
-                    # Get file size
-                    file_size = os.path.getsize(file_path)
-                    
-                    # Copy file to uploads folder (unless dry run)
-                    if not dry_run:
-                        new_filename, new_path = self.copy_file_to_uploads(file_path, category, file_name, class_name)
-                        if new_filename is None:
-                            error_msg = f"Row {index + 2}: Failed to copy file {file_name}"
-                            results['errors'].append(error_msg)
-                            results['failed_uploads'] += 1
-                            continue
-                    else:
-                        # Simulate destination path
-                        category_folder = self.get_category_folder(category)
-                        safe_class = ''.join(c for c in class_name if c.isalnum() or c in (' ', '_', '-')).strip().replace(' ', '_') if class_name else None
-                        if safe_class:
-                            new_path = os.path.join(self.upload_folder, safe_class, category_folder, file_name)
-                        else:
-                            new_path = os.path.join(self.upload_folder, category_folder, file_name)
-                        new_filename = file_name
-                    
-                    # Prepare file data for database
-                    file_data = {
-                        'filename': new_filename,
-                        'file_path': new_path,
-                        'title': title,
-                        'description': description,
-                        'category': category,
-                        'class': class_name
-                    }
-                    
-                    if not dry_run:
-                        # Save to study resources database
-                        if self.save_to_study_resources(file_data):
-                            success_msg = f"Successfully uploaded: {file_name} to {class_name} class"
-                            results['success'].append(success_msg)
-                            results['successful_uploads'] += 1
-                            logger.info(success_msg)
-                        else:
-                            error_msg = f"Row {index + 2}: Failed to save {file_name} to database"
-                            results['errors'].append(error_msg)
-                            results['failed_uploads'] += 1
-                    else:
-                        success_msg = f"DRY RUN: Would upload {file_name} to {class_name} class"
-                        results['success'].append(success_msg)
-                
+                    # Last point at which a cancelled import can still be rolled back
+                    report_progress(progress, 'insert', 0, len(rows))
+                except IngestCancelled:
+                    remove_files(df.loc[ok, 'destination'])
+                    raise
+                try:
+                    self.insert_resources(rows)
                 except Exception as e:
-                    error_msg = f"Row {index + 2}: Error processing {row.get('File Name', 'Unknown')}: {str(e)}"
-                    results['errors'].append(error_msg)
+                    logger.error(f"Error saving to study resources: {str(e)}")
+                    remove_files(df.loc[ok, 'destination'])
+                    outcome[ok] = 'db_failed'
+                    ok = outcome == 'ok'
+                timings['insert'] = round(time.perf_counter() - step, 3)
+            
+            # ---- Report in sheet order ----
+            for idx, state in outcome.items():
+                row_no = idx + 2
+                file_name = df.at[idx, 'File Name']
+                class_name = df.at[idx, 'Class']
+                if state == 'ok':
+                    if dry_run:
+                        results['success'].append(f"DRY RUN: Would upload {file_name} to {class_name} class")
+                    else:
+                        results['success'].append(f"Successfully uploaded: {file_name} to {class_name} class")
+                        results['successful_uploads'] += 1
+                elif state == 'skip_missing':
+                    results['skipped'].append(f"Row {row_no}: Skipped missing file at {df.at[idx, 'File Path']}")
+                    results['skipped_missing'] += 1
+                elif state == 'skip_duplicate':
+                    results['skipped'].append(f"Row {row_no}: Skipped duplicate '{df.at[idx, 'Title']}' in class {class_name}")
+                    results['skipped_duplicates'] += 1
+                else:
+                    results['errors'].append({
+                        'missing': f"Row {row_no}: File not found at {df.at[idx, 'File Path']}",
+                        'bad_ext': f"Row {row_no}: File type not allowed for {file_name}",
+                        'duplicate': f"Row {row_no}: Duplicate resource '{df.at[idx, 'Title']}' already exists in class {class_name}",
+                        'copy_failed': f"Row {row_no}: Failed to copy file {file_name}",
+                        'db_failed': f"Row {row_no}: Failed to save {file_name} to database",
+                    }[state])
                     results['failed_uploads'] += 1
-                    logger.error(error_msg)
             
+            if results['successful_uploads'] > 0 and self.notify:
+                self.notify_new_resources(zip(df.loc[ok, 'class_id'].astype(int), df.loc[ok, 'Title'], df.loc[ok, 'Category']))
+                self.invalidate_catalogue_cache()
+            
+            timings['total'] = round(time.perf_counter() - started, 3)
             logger.info(
                 f"Study resources bulk upload completed: {results['successful_uploads']} successful, {results['failed_uploads']} failed, "
-                f"{results['skipped_duplicates']} duplicates skipped, {results['skipped_missing']} missing skipped (dry_run={dry_run})"
+                f"{results['skipped_duplicates']} duplicates skipped, {results['skipped_missing']} missing skipped "
+                f"(dry_run={dry_run}, {timings['total']}s)"
             )
             
+        except IngestCancelled:
+            logger.info("Study resources bulk upload cancelled")
+            raise
         except Exception as e:
             error_msg = f"Error processing Excel file: {str(e)}"
             results['errors'].append(error_msg)
@@ -1,5 +1,4 @@
 import os
-import sqlite3
 import pandas as pd
 from datetime import datetime
 import shutil
@@ -71,38 +70,19 @@ class UnifiedBulkUploadHandler:
             return False, 'Unsupported Excel format. Expected Study Resources or Files template.'
         try:
             df = pd.read_excel(excel_path, sheet_name=sheet)
-            if kind == 'study_resources':
-                # basic validation
-                if df.empty:
-                    return False, 'Excel file is empty'
-                for idx, row in df.iterrows():
-                    if not str(row.get('File Name','')).strip():
-                        return False, f"Row {idx+2}: File Name is required"
-                    if not str(row.get('File Path','')).strip():
-                        return False, f"Row {idx+2}: File Path is required"
-                    if not str(row.get('Title','')).strip():
-                        return False, f"Row {idx+2}: Title is required"
-                    if not str(row.get('Category','')).strip():
-                        return False, f"Row {idx+2}: Category is required"
-                    if not str(row.get('Class','')).strip():
-                        return False, f"Row {idx+2}: Class is required"
-                return True, f"Valid Study Resources sheet '{sheet}' with {len(df)} rows"
-            else:
-                if df.empty:
-                    return False, 'Excel file is empty'
-                for idx, row in df.iterrows():
-                    if not str(row.get('File Name','')).strip():
-                        return False, f"Row {idx+2}: File Name is required"
-                    if not str(row.get('Category','')).strip():
-                        return False, f"Row {idx+2}: Category is required"
-                    if not str(row.get('File Path','')).strip():
-                        return False, f"Row {idx+2}: File Path is required"
-                return True, f"Valid Files sheet '{sheet}' with {len(df)} rows"
+            handler = self.study if kind == 'study_resources' else self.files
+            if handler is None:
+                return False, 'Bulk upload handler unavailable'
+            ok, msg = handler.validate_frame(df)
+            if not ok:
+                return False, msg
+            label = 'Study Resources' if kind == 'study_resources' else 'Files'
+            return True, f"Valid {label} sheet '{sheet}' with {len(df)} rows"
         except Exception as e:
             return False, f"Error reading Excel: {e}"
 
     # ---------- Processing ----------
-    def process_excel(self, excel_path, uploaded_by='admin', options=None):
+    def process_excel(self, excel_path, uploaded_by='admin', options=None, progress=None):
         kind, sheet = self.detect_sheet_type(excel_path)
         if kind == 'study_resources':
             if not self.study:
@@ -110,13 +90,13 @@ class UnifiedBulkUploadHandler:
                         'successful_uploads': 0, 'failed_uploads': 0, 'skipped': [], 'skipped_duplicates': 0,
                         'skipped_missing': 0, 'dry_run': bool(options and options.get('dry_run'))}
             # Delegate with options
-            return self.study.process_study_resources_excel(excel_path, uploaded_by, options or {})
+            return self.study.process_study_resources_excel(excel_path, uploaded_by, options or {}, progress)
         elif kind == 'files':
             if not self.files:
                 return {'success': [], 'errors': ["Generic files handler unavailable"], 'total_files': 0,
                         'successful_uploads': 0, 'failed_uploads': 0}
             # Use existing generic handler
-            return self.files.process_excel_upload(excel_path, uploaded_by)
+            return self.files.process_excel_upload(excel_path, uploaded_by, progress)
         else:
             return {'success': [], 'errors': ["Unsupported Excel format"], 'total_files': 0,
                     'successful_uploads': 0, 'failed_uploads': 0}
@@ -149,22 +129,14 @@ class UnifiedBulkUploadHandler:
 
     # ---------- Export Master Records ----------
     def export_master_excel(self, output_path):
-        """Export a master workbook with current DB records: resources and uploaded_files."""
+        """Export a master workbook with current DB records: resources and uploaded_files.
+
+        Streams rows into a write-only workbook (see data_export); the 'bulk_master'
+        export is registered by bulk_upload.routes.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            resources_df = pd.read_sql_query(
-                'SELECT r.id, r.filename, r.filepath as file_path, r.title, r.description, r.category, c.name as class_name '
-                'FROM resources r LEFT JOIN classes c ON c.id = r.class_id', conn)
-            try:
-                uploaded_files_df = pd.read_sql_query(
-                    'SELECT id, filename, original_filename, category, description, file_path, file_size, upload_date, uploaded_by '
-                    'FROM uploaded_files', conn)
-            except Exception:
-                uploaded_files_df = pd.DataFrame()
-            conn.close()
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                resources_df.to_excel(writer, index=False, sheet_name='Study Resources')
-                uploaded_files_df.to_excel(writer, index=False, sheet_name='Uploaded Files')
+            from data_export import write_xlsx
+            write_xlsx('bulk_master', output_path, db_path=self.db_path)
             return True
         except Exception as e:
             logger.error(f"Failed to export master excel: {e}")
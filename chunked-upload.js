@@ -0,0 +1,149 @@
+// Resumable chunked uploads (tus-style) for the admin upload forms.
+// Large files are sent to /api/uploads in fixed-size PATCH requests; an interrupted
+// upload of the same file resumes from the last byte the server acknowledged.
+(function () {
+  const TUS_VERSION = '1.0.0';
+  const CHUNK_SIZE = 8 * 1024 * 1024;
+  const MAX_RETRIES = 5;
+
+  function encodeMeta(value) {
+    return btoa(unescape(encodeURIComponent(value)));
+  }
+
+  function storageKey(file, kind) {
+    return ['chunked-upload', kind, file.name, file.size, file.lastModified].join(':');
+  }
+
+  function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+  }
+
+  async function readError(res, fallback) {
+    try {
+      const data = await res.json();
+      return data.error || fallback;
+    } catch (e) {
+      return fallback;
+    }
+  }
+
+  async function createUpload(file, kind) {
+    const res = await fetch('/api/uploads', {
+      method: 'POST',
+      credentials: 'same-origin',
+      headers: {
+        'Tus-Resumable': TUS_VERSION,
+        'Upload-Length': String(file.size),
+        'Upload-Metadata': 'filename ' + encodeMeta(file.name) + ',kind ' + encodeMeta(kind)
+      }
+    });
+    if (res.status !== 201) {
+      throw new Error(await readError(res, 'Could not start upload'));
+    }
+    const data = await res.json();
+    return data.upload_id;
+  }
+
+  async function getOffset(uploadId) {
+    const res = await fetch('/api/uploads/' + uploadId, {
+      method: 'HEAD',
+      credentials: 'same-origin',
+      headers: { 'Tus-Resumable': TUS_VERSION }
+    });
+    if (!res.ok) return null;
+    return parseInt(res.headers.get('Upload-Offset'), 10);
+  }
+
+  async function uploadFile(file, kind, onProgress) {
+    const key = storageKey(file, kind);
+    let uploadId = localStorage.getItem(key);
+    let offset = uploadId ? await getOffset(uploadId) : null;
+    if (offset === null || isNaN(offset)) {
+      uploadId = await createUpload(file, kind);
+      localStorage.setItem(key, uploadId);
+      offset = 0;
+    }
+    if (onProgress) onProgress(offset, file.size);
+
+    let retries = 0;
+    while (offset < file.size) {
+      let res;
+      try {
+        res = await fetch('/api/uploads/' + uploadId, {
+          method: 'PATCH',
+          credentials: 'same-origin',
+          headers: {
+            'Tus-Resumable': TUS_VERSION,
+            'Upload-Offset': String(offset),
+            'Content-Type': 'application/offset+octet-stream'
+          },
+          body: file.slice(offset, offset + CHUNK_SIZE)
+        });
+      } catch (networkError) {
+        if (++retries > MAX_RETRIES) throw networkError;
+        await sleep(1000 * retries);
+        const serverOffset = await getOffset(uploadId);
+        if (serverOffset !== null) offset = serverOffset;
+        continue;
+      }
+      if (res.status === 409) {
+        if (++retries > MAX_RETRIES) throw new Error(await readError(res, 'Upload conflict'));
+        await sleep(500);
+        const serverOffset = await getOffset(uploadId);
+        if (serverOffset === null) throw new Error('Upload no longer exists');
+        offset = serverOffset;
+        continue;
+      }
+      if (!res.ok) {
+        localStorage.removeItem(key);
+        throw new Error(await readError(res, 'Upload failed (' + res.status + ')'));
+      }
+      retries = 0;
+      offset = parseInt(res.headers.get('Upload-Offset'), 10);
+      if (onProgress) onProgress(offset, file.size);
+    }
+    localStorage.removeItem(key);
+    return uploadId;
+  }
+
+  // Upload the selected file before the form is submitted, then submit the
+  // form with only the upload id so the file body is not sent a second time.
+  function attach(form, options) {
+    const fileInput = options.fileInput;
+    const statusEl = options.statusEl;
+    let idField = form.querySelector('input[name="upload_id"]');
+    if (!idField) {
+      idField = document.createElement('input');
+      idField.type = 'hidden';
+      idField.name = 'upload_id';
+      form.appendChild(idField);
+    }
+
+    form.addEventListener('submit', async function (e) {
+      if (options.enabled && !options.enabled()) return;
+      const file = fileInput.files && fileInput.files[0];
+      if (!file || idField.value) return;
+      e.preventDefault();
+      const submitBtn = form.querySelector('button[type="submit"]');
+      if (submitBtn) submitBtn.disabled = true;
+      try {
+        idField.value = await uploadFile(file, options.kind, function (sent, total) {
+          if (statusEl) {
+            statusEl.style.display = 'block';
+            statusEl.textContent = 'Uploading… ' + Math.floor((sent / total) * 100) + '%';
+          }
+        });
+        fileInput.disabled = true;
+        form.submit();
+      } catch (err) {
+        if (statusEl) {
+          statusEl.style.display = 'block';
+          statusEl.textContent = 'Upload failed: ' + err.message + '. Submit again to resume.';
+        }
+        if (submitBtn) submitBtn.disabled = false;
+      }
+    });
+  }
+
+  window.ChunkedUpload = { uploadFile: uploadFile, attach: attach };
+})();
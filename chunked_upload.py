@@ -0,0 +1,644 @@
+"""
+Chunked Upload Service for Sunrise Education Centre
+Resumable, streaming uploads (tus-style) for lecture videos, study resources and forum media.
+
+Bytes from the request body are written straight into a ``.part`` file next to the
+final destination while being hashed and size-checked, so large lectures are never
+spooled to a temp file and copied a second time. When the last byte arrives the part
+file is renamed into place and the upload can be claimed by the form that needed it.
+"""
+
+import os
+import sqlite3
+import hashlib
+import secrets
+import shutil
+import threading
+import base64
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from flask import Blueprint, request, jsonify, session, make_response
+try:
+    from werkzeug.utils import secure_filename
+except ImportError:
+    import re
+    def secure_filename(filename):
+        """Fallback secure filename function"""
+        filename = re.sub(r'[^a-zA-Z0-9._-]', '', filename)
+        return filename
+
+# Database configuration
+DATABASE = 'users.db'
+UPLOAD_FOLDER = 'uploads'
+
+TUS_VERSION = '1.0.0'
+STREAM_CHUNK_SIZE = 1024 * 1024  # bytes read from the request stream per write
+
+# Server-enforced quotas
+USER_PENDING_QUOTA_BYTES = 4 * 1024 ** 3  # unfinished uploads a single user may hold
+MIN_FREE_DISK_BYTES = 512 * 1024 ** 2     # headroom kept free on the uploads volume
+
+UPLOAD_KINDS = {
+    'video': {
+        'folder': os.path.join(UPLOAD_FOLDER, 'videos'),
+        'extensions': {'mp4', 'webm'},
+        'max_bytes': 2 * 1024 ** 3,
+        'roles': {'admin', 'teacher'},
+        'unique_prefix': True,
+    },
+    'resource': {
+        'folder': UPLOAD_FOLDER,
+        'extensions': {'pdf', 'doc', 'docx', 'ppt', 'pptx', 'xls', 'xlsx', 'txt', 'jpg', 'jpeg', 'png', 'gif'},
+        'max_bytes': 200 * 1024 ** 2,
+        'roles': {'admin', 'teacher'},
+        'unique_prefix': False,
+    },
+    'forum_media': {
+        'folder': os.path.join(UPLOAD_FOLDER, 'forum_media'),
+        'extensions': {'jpg', 'jpeg', 'png', 'gif', 'webp', 'mp4', 'webm', 'pdf'},
+        'max_bytes': 25 * 1024 ** 2,
+        'roles': None,  # any signed-in user
+        'unique_prefix': False,
+    },
+}
+
+chunked_upload_bp = Blueprint('chunked_upload', __name__)
+
+# Running SHA-256 state per upload as (offset hashed up to, hasher), so each PATCH
+# only hashes the new bytes. Rebuilt from the part file when this process's copy is
+# not at the PATCH offset (e.g. earlier chunks went to another worker).
+_hashers: Dict[str, Tuple[int, 'hashlib._Hash']] = {}
+_upload_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def ensure_upload_tables():
+    """Ensure the upload_sessions table exists"""
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            kind TEXT NOT NULL,
+            original_filename TEXT NOT NULL,
+            stored_filename TEXT NOT NULL,
+            final_path TEXT NOT NULL,
+            upload_length INTEGER NOT NULL,
+            upload_offset INTEGER NOT NULL DEFAULT 0,
+            sha256 TEXT,
+            expected_sha256 TEXT,
+            status TEXT NOT NULL DEFAULT 'uploading',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_upload_sessions_user_status ON upload_sessions(user_id, status)')
+        conn.commit()
+        print("✅ Upload tables ensured")
+    except Exception as e:
+        print(f"❌ Error ensuring upload tables: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def _lock_for(upload_id: str) -> threading.Lock:
+    with _registry_lock:
+        lock = _upload_locks.get(upload_id)
+        if lock is None:
+            lock = threading.Lock()
+            _upload_locks[upload_id] = lock
+        return lock
+
+
+def _forget(upload_id: str) -> None:
+    with _registry_lock:
+        _hashers.pop(upload_id, None)
+        _upload_locks.pop(upload_id, None)
+
+
+def _part_path(final_path: str, upload_id: str) -> str:
+    # Unique per upload: kinds without a unique prefix share final names, and the
+    # plain name only applies once the finished file is moved into place
+    return f"{final_path}.{upload_id}.part"
+
+
+def _extension(filename: str) -> str:
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def _tus_response(body=None, status: int = 204, headers: Optional[Dict[str, str]] = None):
+    resp = make_response(jsonify(body) if body is not None else '', status)
+    resp.headers['Tus-Resumable'] = TUS_VERSION
+    resp.headers['Cache-Control'] = 'no-store'
+    for key, value in (headers or {}).items():
+        resp.headers[key] = value
+    return resp
+
+
+def _parse_upload_metadata(header: str) -> Dict[str, str]:
+    """
+    Parse a tus ``Upload-Metadata`` header (``key base64value,key2 base64value``)
+
+    Args:
+        header: Raw header value
+
+    Returns:
+        Dict[str, str]: Decoded metadata
+    """
+    metadata = {}
+    for pair in (header or '').split(','):
+        parts = pair.strip().split(' ', 1)
+        if not parts[0]:
+            continue
+        value = ''
+        if len(parts) == 2:
+            try:
+                value = base64.b64decode(parts[1]).decode('utf-8')
+            except Exception:
+                value = ''
+        metadata[parts[0]] = value
+    return metadata
+
+
+def _hasher_for(upload_id: str, part_path: str, offset: int):
+    """
+    Take the running hash for an upload at ``offset``, re-reading the part file if needed
+
+    The entry is removed while the chunk is written; write_chunk stores it back
+    with the new offset once the write has been recorded.
+    """
+    with _registry_lock:
+        entry = _hashers.pop(upload_id, None)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    hasher = hashlib.sha256()
+    if offset > 0:
+        with open(part_path, 'rb') as f:
+            remaining = offset
+            while remaining > 0:
+                chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+    return hasher
+
+
+def check_upload_quota(user_id: Optional[int], kind: str, upload_length: int) -> Tuple[bool, str]:
+    """
+    Check the per-kind size limit, the per-user pending quota and free disk space
+
+    Args:
+        user_id: Uploading user's ID
+        kind: Upload kind (key of UPLOAD_KINDS)
+        upload_length: Declared total size in bytes
+
+    Returns:
+        Tuple[bool, str]: (allowed, reason)
+    """
+    config = UPLOAD_KINDS[kind]
+    if upload_length <= 0:
+        return False, 'Upload-Length must be greater than zero'
+    if upload_length > config['max_bytes']:
+        return False, f"File exceeds the {config['max_bytes'] // (1024 * 1024)} MB limit for {kind} uploads"
+
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''SELECT COALESCE(SUM(upload_length), 0) FROM upload_sessions
+                     WHERE user_id IS ? AND status = 'uploading' ''', (user_id,))
+        pending = c.fetchone()[0] or 0
+    finally:
+        conn.close()
+    if pending + upload_length > USER_PENDING_QUOTA_BYTES:
+        return False, 'Too many unfinished uploads; finish or cancel them first'
+
+    os.makedirs(config['folder'], exist_ok=True)
+    free_bytes = shutil.disk_usage(config['folder']).free
+    if free_bytes - upload_length < MIN_FREE_DISK_BYTES:
+        return False, 'Not enough free disk space on the server'
+    return True, ''
+
+
+def create_upload(user_id: Optional[int], kind: str, filename: str, upload_length: int,
+                  expected_sha256: Optional[str] = None) -> Optional[Dict]:
+    """
+    Register a new resumable upload and create its empty part file
+
+    Args:
+        user_id: Uploading user's ID
+        kind: Upload kind (key of UPLOAD_KINDS)
+        filename: Client file name
+        upload_length: Declared total size in bytes
+        expected_sha256: Optional hex digest to verify on completion
+
+    Returns:
+        Optional[Dict]: Upload record or None on failure
+    """
+    config = UPLOAD_KINDS[kind]
+    safe_name = secure_filename(filename)
+    stored_filename = f"{secrets.token_hex(8)}_{safe_name}" if config['unique_prefix'] else safe_name
+    final_path = os.path.join(config['folder'], stored_filename)
+    upload_id = secrets.token_hex(16)
+
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        os.makedirs(config['folder'], exist_ok=True)
+        open(_part_path(final_path, upload_id), 'wb').close()
+        c.execute('''INSERT INTO upload_sessions
+                     (id, user_id, kind, original_filename, stored_filename, final_path,
+                      upload_length, expected_sha256)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                  (upload_id, user_id, kind, filename, stored_filename, final_path,
+                   upload_length, (expected_sha256 or '').lower() or None))
+        conn.commit()
+        print(f"✅ Upload {upload_id} created for {stored_filename} ({upload_length} bytes)")
+        return {
+            'id': upload_id,
+            'kind': kind,
+            'stored_filename': stored_filename,
+            'final_path': final_path,
+            'upload_length': upload_length,
+            'upload_offset': 0,
+        }
+    except Exception as e:
+        print(f"❌ Error creating upload: {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
+
+def get_upload(upload_id: str) -> Optional[Dict]:
+    """
+    Get an upload record by ID
+
+    Args:
+        upload_id: Upload ID
+
+    Returns:
+        Optional[Dict]: Upload record or None if not found
+    """
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''SELECT id, user_id, kind, original_filename, stored_filename, final_path,
+                            upload_length, upload_offset, sha256, expected_sha256, status
+                     FROM upload_sessions WHERE id = ?''', (upload_id,))
+        row = c.fetchone()
+        if not row:
+            return None
+        keys = ('id', 'user_id', 'kind', 'original_filename', 'stored_filename', 'final_path',
+                'upload_length', 'upload_offset', 'sha256', 'expected_sha256', 'status')
+        return dict(zip(keys, row))
+    finally:
+        conn.close()
+
+
+def _set_offset(upload_id: str, old_offset: int, new_offset: int) -> bool:
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''UPDATE upload_sessions SET upload_offset = ?, updated_at = CURRENT_TIMESTAMP
+                     WHERE id = ? AND upload_offset = ? AND status = 'uploading' ''',
+                  (new_offset, upload_id, old_offset))
+        conn.commit()
+        return c.rowcount == 1
+    finally:
+        conn.close()
+
+
+def _set_status(upload_id: str, status: str, sha256: Optional[str] = None) -> None:
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''UPDATE upload_sessions SET status = ?, sha256 = COALESCE(?, sha256),
+                            updated_at = CURRENT_TIMESTAMP WHERE id = ?''',
+                  (status, sha256, upload_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_chunk(upload: Dict, offset: int, stream, content_length: Optional[int]) -> Tuple[int, str]:
+    """
+    Stream a request body into the upload's part file at ``offset``
+
+    Bytes are hashed and size-checked as they are written. If the client disconnects
+    part-way, whatever arrived is kept so the upload can resume from there.
+
+    Args:
+        upload: Upload record from get_upload
+        offset: Offset the client claims to be writing at
+        stream: File-like request body
+        content_length: Declared body length, if any
+
+    Returns:
+        Tuple[int, str]: (new offset, error message or '')
+    """
+    upload_id = upload['id']
+    remaining = upload['upload_length'] - offset
+    if content_length is not None and content_length > remaining:
+        return offset, 'Chunk exceeds the declared Upload-Length'
+
+    part_path = _part_path(upload['final_path'], upload_id)
+    hasher = _hasher_for(upload_id, part_path, offset)
+    written = 0
+    error = ''
+    with open(part_path, 'r+b') as f:
+        # Drop any bytes a previous, unacknowledged PATCH left past the offset
+        f.truncate(offset)
+        f.seek(offset)
+        try:
+            while written <= remaining:
+                chunk = stream.read(min(STREAM_CHUNK_SIZE, remaining - written + 1))
+                if not chunk:
+                    break
+                if written + len(chunk) > remaining:
+                    error = 'Chunk exceeds the declared Upload-Length'
+                    break
+                f.write(chunk)
+                hasher.update(chunk)
+                written += len(chunk)
+        except Exception as e:
+            print(f"❌ Upload {upload_id} interrupted after {written} bytes: {e}")
+        f.flush()
+        os.fsync(f.fileno())
+        if error:
+            f.truncate(offset)
+            return offset, error
+
+    new_offset = offset + written
+    if not _set_offset(upload_id, offset, new_offset):
+        return offset, 'Upload offset changed concurrently'
+    with _registry_lock:
+        _hashers[upload_id] = (new_offset, hasher)
+
+    if new_offset == upload['upload_length']:
+        return new_offset, _finish_upload(upload, hasher.hexdigest())
+    return new_offset, ''
+
+
+def _finish_upload(upload: Dict, digest: str) -> str:
+    upload_id = upload['id']
+    part_path = _part_path(upload['final_path'], upload_id)
+    if upload.get('expected_sha256') and upload['expected_sha256'] != digest:
+        abort_upload(upload_id)
+        print(f"❌ Upload {upload_id} checksum mismatch")
+        return 'Checksum mismatch; upload discarded'
+    os.replace(part_path, upload['final_path'])
+    _set_status(upload_id, 'complete', digest)
+    _forget(upload_id)
+    print(f"✅ Upload {upload_id} complete: {upload['final_path']} sha256={digest}")
+    return ''
+
+
+def abort_upload(upload_id: str) -> bool:
+    """
+    Cancel an unfinished upload and remove its part file
+
+    Args:
+        upload_id: Upload ID
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    upload = get_upload(upload_id)
+    if not upload:
+        return False
+    try:
+        part_path = _part_path(upload['final_path'], upload_id)
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        _set_status(upload_id, 'aborted')
+        _forget(upload_id)
+        return True
+    except Exception as e:
+        print(f"❌ Error aborting upload {upload_id}: {e}")
+        return False
+
+
+def claim_upload(upload_id: str, user_id: Optional[int], kind: str) -> Optional[Dict]:
+    """
+    Hand a completed upload to the form that requested it (single use)
+
+    Args:
+        upload_id: Upload ID submitted with the form
+        user_id: Session user's ID, must match the uploader
+        kind: Expected upload kind
+
+    Returns:
+        Optional[Dict]: {'stored_filename', 'path', 'size', 'sha256', 'original_filename'}
+        or None if the upload is unknown, unfinished, already used or not the user's
+    """
+    if not upload_id:
+        return None
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''UPDATE upload_sessions SET status = 'consumed', updated_at = CURRENT_TIMESTAMP
+                     WHERE id = ? AND user_id IS ? AND kind = ? AND status = 'complete' ''',
+                  (upload_id, user_id, kind))
+        conn.commit()
+        if c.rowcount != 1:
+            return None
+        c.execute('''SELECT stored_filename, final_path, upload_length, sha256, original_filename
+                     FROM upload_sessions WHERE id = ?''', (upload_id,))
+        row = c.fetchone()
+        return {
+            'stored_filename': row[0],
+            'path': row[1],
+            'size': row[2],
+            'sha256': row[3],
+            'original_filename': row[4],
+        }
+    except Exception as e:
+        print(f"❌ Error claiming upload {upload_id}: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def stream_save(file_storage, dest_path: str, max_bytes: int) -> Tuple[int, str]:
+    """
+    Save a multipart FileStorage in chunks with an on-the-fly size limit and hash
+
+    Used by the plain form fallback when the browser did not use the chunked endpoint.
+
+    Args:
+        file_storage: Werkzeug FileStorage
+        dest_path: Final destination path
+        max_bytes: Maximum allowed size
+
+    Returns:
+        Tuple[int, str]: (size in bytes, sha256 hex digest)
+
+    Raises:
+        ValueError: If the file is larger than max_bytes
+    """
+    part_path = _part_path(dest_path, secrets.token_hex(8))
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(part_path, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
+                out.write(chunk)
+                hasher.update(chunk)
+        os.replace(part_path, dest_path)
+        return size, hasher.hexdigest()
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def cleanup_stale_uploads(max_age_hours: int = 24) -> int:
+    """
+    Abort unfinished uploads that have not received data for a while
+
+    Args:
+        max_age_hours: Idle time after which an upload is abandoned
+
+    Returns:
+        int: Number of uploads removed
+    """
+    cutoff = (datetime.utcnow() - timedelta(hours=max_age_hours)).strftime('%Y-%m-%d %H:%M:%S')
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''SELECT id FROM upload_sessions
+                     WHERE status = 'uploading' AND updated_at < ?''', (cutoff,))
+        stale_ids = [row[0] for row in c.fetchall()]
+    except Exception as e:
+        print(f"❌ Error finding stale uploads: {e}")
+        stale_ids = []
+    finally:
+        conn.close()
+    removed = sum(1 for upload_id in stale_ids if abort_upload(upload_id))
+    if removed:
+        print(f"✅ Cleaned up {removed} stale uploads")
+    return removed
+
+
+# ==================== tus-style endpoints ====================
+
+def _owns(upload: Dict) -> bool:
+    return upload['user_id'] == session.get('user_id') or session.get('role') == 'admin'
+
+
+@chunked_upload_bp.route('/api/uploads', methods=['OPTIONS'])
+def uploads_options():
+    max_size = max(config['max_bytes'] for config in UPLOAD_KINDS.values())
+    return _tus_response(status=204, headers={
+        'Tus-Version': TUS_VERSION,
+        'Tus-Max-Size': str(max_size),
+        'Tus-Extension': 'creation,termination',
+    })
+
+
+@chunked_upload_bp.route('/api/uploads', methods=['POST'])
+def uploads_create():
+    if not session.get('user_id') and not session.get('role'):
+        return _tus_response({'success': False, 'error': 'Unauthorized'}, 401)
+
+    metadata = _parse_upload_metadata(request.headers.get('Upload-Metadata', ''))
+    data = request.get_json(silent=True) or {}
+    kind = metadata.get('kind') or data.get('kind') or 'resource'
+    filename = metadata.get('filename') or data.get('filename') or ''
+    try:
+        upload_length = int(request.headers.get('Upload-Length') or data.get('size') or 0)
+    except (TypeError, ValueError):
+        return _tus_response({'success': False, 'error': 'Invalid Upload-Length'}, 400)
+
+    config = UPLOAD_KINDS.get(kind)
+    if not config:
+        return _tus_response({'success': False, 'error': 'Unknown upload kind'}, 400)
+    if config['roles'] and session.get('role') not in config['roles']:
+        return _tus_response({'success': False, 'error': 'Unauthorized'}, 403)
+    if not filename or _extension(filename) not in config['extensions']:
+        return _tus_response({'success': False, 'error': 'File type not allowed'}, 415)
+
+    user_id = session.get('user_id')
+    allowed, reason = check_upload_quota(user_id, kind, upload_length)
+    if not allowed:
+        return _tus_response({'success': False, 'error': reason}, 413)
+
+    upload = create_upload(user_id, kind, filename, upload_length,
+                           metadata.get('sha256') or data.get('sha256'))
+    if not upload:
+        return _tus_response({'success': False, 'error': 'Could not create upload'}, 500)
+
+    location = f"/api/uploads/{upload['id']}"
+    return _tus_response({'success': True, 'upload_id': upload['id'], 'location': location}, 201, {
+        'Location': location,
+        'Upload-Offset': '0',
+    })
+
+
+@chunked_upload_bp.route('/api/uploads/<upload_id>', methods=['HEAD'])
+def uploads_head(upload_id):
+    upload = get_upload(upload_id)
+    if not upload or not _owns(upload) or upload['status'] == 'aborted':
+        return _tus_response(status=404)
+    return _tus_response(status=200, headers={
+        'Upload-Offset': str(upload['upload_offset']),
+        'Upload-Length': str(upload['upload_length']),
+    })
+
+
+@chunked_upload_bp.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def uploads_patch(upload_id):
+    if request.headers.get('Content-Type', '').split(';')[0].strip() != 'application/offset+octet-stream':
+        return _tus_response({'success': False, 'error': 'Unsupported Content-Type'}, 415)
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return _tus_response({'success': False, 'error': 'Missing Upload-Offset'}, 400)
+
+    # Checked before taking a lock, so unknown or foreign IDs never add a lock entry
+    upload = get_upload(upload_id)
+    if not upload or not _owns(upload) or upload['status'] == 'aborted':
+        return _tus_response(status=404)
+    if upload['status'] != 'uploading':
+        return _tus_response(status=204, headers={'Upload-Offset': str(upload['upload_offset'])})
+
+    lock = _lock_for(upload_id)
+    if not lock.acquire(blocking=False):
+        return _tus_response({'success': False, 'error': 'Upload is busy'}, 409)
+    try:
+        # Re-read under the lock: a previous PATCH may have just moved the offset
+        upload = get_upload(upload_id)
+        if not upload or upload['status'] == 'aborted':
+            return _tus_response(status=404)
+        if upload['status'] != 'uploading':
+            return _tus_response(status=204, headers={'Upload-Offset': str(upload['upload_offset'])})
+        if offset != upload['upload_offset']:
+            return _tus_response({'success': False, 'error': 'Offset mismatch'}, 409,
+                                 {'Upload-Offset': str(upload['upload_offset'])})
+
+        new_offset, error = write_chunk(upload, offset, request.stream, request.content_length)
+        if error:
+            status = 460 if error.startswith('Checksum') else 409 if 'concurrently' in error else 413
+            return _tus_response({'success': False, 'error': error}, status,
+                                 {'Upload-Offset': str(new_offset)})
+        return _tus_response(status=204, headers={'Upload-Offset': str(new_offset)})
+    finally:
+        lock.release()
+
+
+@chunked_upload_bp.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def uploads_delete(upload_id):
+    upload = get_upload(upload_id)
+    if not upload or not _owns(upload):
+        return _tus_response(status=404)
+    if upload['status'] != 'uploading':
+        return _tus_response({'success': False, 'error': 'Upload already finished'}, 409)
+    abort_upload(upload_id)
+    return _tus_response(status=204)
@@ -3,6 +3,8 @@ import json
 from datetime import datetime
 from typing import Optional, Dict, Any
 
+from reference_cache import reference_cached, invalidate_reference
+
 DATABASE = 'users.db'
 
 def init_countdown_table():
@@ -56,8 +58,9 @@ def init_countdown_table():
     finally:
         conn.close()
 
+@reference_cached('countdown')
 def get_countdown_settings() -> Optional[Dict[str, Any]]:
-    """Get current countdown settings"""
+    """Get current countdown settings (cached until the settings change)"""
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     try:
@@ -116,6 +119,7 @@ def update_countdown_settings(settings: Dict[str, Any]) -> bool:
         ))
         
         conn.commit()
+        invalidate_reference('countdown')
         return True
     except Exception as e:
         print(f"Error updating countdown settings: {e}")
@@ -133,6 +137,7 @@ def toggle_countdown_status() -> bool:
             new_status = not current_settings['is_active']
             c.execute('UPDATE countdown_settings SET is_active = ? WHERE id = ?', (new_status, current_settings['id']))
             conn.commit()
+            invalidate_reference('countdown')
             return True
         return False
     except Exception as e:
@@ -165,6 +170,3 @@ def is_website_live() -> bool:
         return datetime.now() > launch_date
     except:
         return True  # If date parsing fails, assume live
-
-# Initialize table when module is imported
-init_countdown_table()
\ No newline at end of file
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Data Archive for Sunrise Education Centre
+Moves old log and chat rows out of users.db into monthly compressed files.
+
+Rows older than a table's retention window are copied, in small batches, to
+``archives/<table>/<table>-YYYY-MM.jsonl.gz`` (month of the row's epoch
+column, UTC) and then deleted in the same batch, one short transaction at a
+time, so the WAL stays small and writers are never blocked for long. Each
+batch is appended as its own gzip member; ``gzip`` reads the members back as
+one stream. A crash between the append and the delete can leave a row in the
+file twice, so readers drop repeated ids.
+
+Freed pages are handed back with ``PRAGMA incremental_vacuum`` once the
+database is in auto_vacuum=INCREMENTAL mode (a one-off full VACUUM, see
+``enable_incremental_vacuum``).
+
+Usage:
+    python data_archive.py run                         # archive everything due
+    python data_archive.py query ip_logs --from 2025-08 --to 2025-09 --match ip=1.2.3.4
+    python data_archive.py enable-incremental-vacuum   # once, while the site is down
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from epoch_columns import epoch_now
+
+# Database configuration
+DATABASE = 'users.db'
+ARCHIVE_DIR = 'archives'
+
+ARCHIVE_BATCH_SIZE = 500
+BATCH_PAUSE = 0.05              # seconds between batches so request writers get the lock
+VACUUM_PAGES_PER_RUN = 2000     # pages returned to the OS per incremental_vacuum call
+
+# table -> (epoch column, days kept in the database, extra condition for rows that may go)
+ARCHIVE_POLICIES: Dict[str, Tuple[str, int, str]] = {
+    'ip_logs': ('visited_ts', 30, ''),
+    'live_class_messages': ('created_ts', 90, ''),
+    # Keep a thread's root while it still has recent replies
+    'forum_messages': ('posted_ts', 365,
+                       'AND NOT EXISTS (SELECT 1 FROM forum_messages r '
+                       'WHERE r.parent_id = forum_messages.id AND r.posted_ts >= ?)'),
+    # Unread messages stay until they have been read
+    'personal_chats': ('created_ts', 180, 'AND is_read = 1'),
+}
+
+
+def _archive_path(table: str, month: str, archive_dir: str = ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, table, f'{table}-{month}.jsonl.gz')
+
+
+def _month_of(ts: Optional[int]) -> str:
+    if ts is None:
+        return 'undated'
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m')
+
+
+def _write_batch(table: str, ts_index: int, columns: List[str], rows: List[Tuple],
+                 archive_dir: str = ARCHIVE_DIR) -> None:
+    by_month: Dict[str, List[Tuple]] = {}
+    for row in rows:
+        by_month.setdefault(_month_of(row[ts_index]), []).append(row)
+    for month, month_rows in by_month.items():
+        path = _archive_path(table, month, archive_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                for row in month_rows:
+                    f.write((json.dumps(dict(zip(columns, row)), default=str) + '\n').encode())
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def archive_where(table: str, where: str, params: Sequence = (), ts_column: Optional[str] = None,
+                  db_path: str = DATABASE, archive_dir: str = ARCHIVE_DIR,
+                  batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Archive and delete every row of a table matching a condition
+
+    Args:
+        table: Table name
+        where: SQL condition (without WHERE) selecting the rows to move
+        params: Parameters for the condition
+        ts_column: Epoch column that picks the monthly file; defaults to the
+                   table's ARCHIVE_POLICIES entry
+        db_path: SQLite database
+        archive_dir: Root folder for archive files
+        batch_size: Rows per batch/transaction
+
+    Returns:
+        int: Rows archived
+    """
+    ts_column = ts_column or ARCHIVE_POLICIES[table][0]
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA busy_timeout=30000')
+    c = conn.cursor()
+    archived = 0
+    try:
+        columns = [row[1] for row in c.execute(f'PRAGMA table_info({table})')]
+        if not columns:
+            return 0
+        ts_index = columns.index(ts_column)
+        select_columns = ', '.join(columns)
+        while True:
+            c.execute(f'SELECT rowid, {select_columns} FROM {table} WHERE {where} LIMIT ?',
+                      tuple(params) + (batch_size,))
+            rows = c.fetchall()
+            if not rows:
+                break
+            _write_batch(table, ts_index, columns, [row[1:] for row in rows], archive_dir)
+            c.executemany(f'DELETE FROM {table} WHERE rowid = ?', [(row[0],) for row in rows])
+            conn.commit()
+            archived += len(rows)
+            if len(rows) < batch_size:
+                break
+            time.sleep(BATCH_PAUSE)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error archiving {table}: {e}")
+    finally:
+        conn.close()
+    return archived
+
+
+def archive_table(table: str, db_path: str = DATABASE, archive_dir: str = ARCHIVE_DIR) -> int:
+    """
+    Archive the rows of one table that are past its retention window
+
+    Args:
+        table: Key of ARCHIVE_POLICIES
+
+    Returns:
+        int: Rows archived
+    """
+    ts_column, days, extra = ARCHIVE_POLICIES[table]
+    cutoff = epoch_now() - days * 86400
+    params = (cutoff,) + ((cutoff,) if '?' in extra else ())
+    return archive_where(table, f'{ts_column} < ? {extra}', params, ts_column,
+                         db_path=db_path, archive_dir=archive_dir)
+
+
+def incremental_vacuum(db_path: str = DATABASE, pages: int = VACUUM_PAGES_PER_RUN) -> int:
+    """
+    Return up to ``pages`` free pages to the OS and checkpoint the WAL
+
+    A no-op for page reclaim unless auto_vacuum is INCREMENTAL.
+
+    Returns:
+        int: Free pages left afterwards
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+        conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
+        return conn.execute('PRAGMA freelist_count').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def enable_incremental_vacuum(db_path: str = DATABASE) -> bool:
+    """
+    Switch the database to auto_vacuum=INCREMENTAL (rewrites the whole file once)
+
+    Run with the site stopped; needs free disk space about the size of the database.
+
+    Returns:
+        bool: True if the mode is INCREMENTAL afterwards
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+        mode = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+        print(f"{'✅' if mode == 2 else '❌'} auto_vacuum mode is {mode}")
+        return mode == 2
+    finally:
+        conn.close()
+
+
+def run_archival(db_path: str = DATABASE, archive_dir: str = ARCHIVE_DIR) -> Dict[str, int]:
+    """
+    Archive every table in ARCHIVE_POLICIES, then reclaim freed pages
+
+    Returns:
+        Dict[str, int]: Rows archived per table
+    """
+    results = {table: archive_table(table, db_path, archive_dir) for table in ARCHIVE_POLICIES}
+    if any(results.values()):
+        free_pages = incremental_vacuum(db_path)
+        print(f"✅ Archived {results} ({free_pages} free pages left)")
+    return results
+
+
+# ==================== Reading archives ====================
+
+def list_archive_months(table: str, archive_dir: str = ARCHIVE_DIR) -> List[str]:
+    """Months (YYYY-MM) that have an archive file for a table"""
+    folder = os.path.join(archive_dir, table)
+    if not os.path.isdir(folder):
+        return []
+    prefix, suffix = f'{table}-', '.jsonl.gz'
+    return sorted(name[len(prefix):-len(suffix)] for name in os.listdir(folder)
+                  if name.startswith(prefix) and name.endswith(suffix))
+
+
+def read_archive(table: str, start_month: Optional[str] = None, end_month: Optional[str] = None,
+                 match: Optional[Dict[str, str]] = None, archive_dir: str = ARCHIVE_DIR) -> Iterator[Dict]:
+    """
+    Stream archived rows, oldest month first
+
+    Args:
+        table: Archived table
+        start_month: First month to read (YYYY-MM), inclusive
+        end_month: Last month to read (YYYY-MM), inclusive
+        match: Column -> value filters, compared as strings
+        archive_dir: Root folder for archive files
+
+    Yields:
+        Dict: One archived row (repeated ids from an interrupted run are skipped)
+    """
+    for month in list_archive_months(table, archive_dir):
+        if (start_month and month < start_month) or (end_month and month > end_month):
+            continue
+        seen = set()
+        with gzip.open(_archive_path(table, month, archive_dir), 'rt', encoding='utf-8') as f:
+            for line in f:
+                row = json.loads(line)
+                if row.get('id') is not None:
+                    if row['id'] in seen:
+                        continue
+                    seen.add(row['id'])
+                if match and any(str(row.get(k)) != v for k, v in match.items()):
+                    continue
+                yield row
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Archive old rows and read archives')
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('run', help='Archive every table past its retention window')
+    sub.add_parser('enable-incremental-vacuum', help='One-off switch to auto_vacuum=INCREMENTAL')
+    query = sub.add_parser('query', help='Print archived rows as JSON lines')
+    query.add_argument('table', choices=sorted(ARCHIVE_POLICIES))
+    query.add_argument('--from', dest='start_month', help='First month, YYYY-MM')
+    query.add_argument('--to', dest='end_month', help='Last month, YYYY-MM')
+    query.add_argument('--match', action='append', default=[], help='column=value filter (repeatable)')
+    query.add_argument('--limit', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        run_archival(args.db, args.archive_dir)
+    elif args.command == 'enable-incremental-vacuum':
+        return 0 if enable_incremental_vacuum(args.db) else 1
+    else:
+        match = dict(item.split('=', 1) for item in args.match)
+        for n, row in enumerate(read_archive(args.table, args.start_month, args.end_month, match,
+                                             args.archive_dir), 1):
+            print(json.dumps(row, default=str))
+            if args.limit and n >= args.limit:
+                break
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+Data Export for Sunrise Education Centre
+Streams admin CSV and XLSX downloads instead of building them in memory.
+
+Each export is registered by name with the query (or queries, one per
+worksheet) that feeds it. Rows are read with ``fetchmany`` in
+EXPORT_BATCH_SIZE batches:
+
+- CSV is sent as a ``Response`` over a generator that writes one batch at a
+  time, gzip-compressed on the fly when asked for (``?gzip=1``).
+- XLSX is written with openpyxl's write-only workbook, which holds one row at
+  a time, into a spooled temporary file that moves to disk past
+  SPOOL_MAX_MEMORY. XLSX is already zip-compressed, so gzip only applies to CSV.
+
+Exports of more than BACKGROUND_EXPORT_ROWS rows requested by a script
+(``Accept: application/json``), or any export requested with
+``?background=1``, run as an ``export`` job instead. The file lands in
+EXPORT_FOLDER and the job result carries its download URL; files older than
+EXPORT_MAX_AGE_HOURS are removed by ``cleanup_stale_exports``.
+"""
+
+import csv
+import io
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from flask import Blueprint, Response, jsonify, request, send_file, send_from_directory, session
+
+from job_runner import JobCancelled, register_job_handler, submit_job
+
+# Database configuration
+DATABASE = 'users.db'
+
+EXPORT_FOLDER = 'exports'
+EXPORT_BATCH_SIZE = 500
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024      # bytes of XLSX kept in memory before spilling to disk
+BACKGROUND_EXPORT_ROWS = 20000
+EXPORT_MAX_AGE_HOURS = 24
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+exports_bp = Blueprint('exports', __name__)
+
+# name -> {'filename', 'sheets': [{'title', 'query', 'header', 'optional'}]};
+# a query is plain SQL or a function of the request parameters returning (sql, args)
+_exports: Dict[str, Dict] = {}
+
+
+def register_export(name: str, sheets: List[Dict], filename: Optional[str] = None) -> None:
+    """
+    Register a named export
+
+    Args:
+        name: Export name, used in job parameters
+        sheets: One dict per worksheet with 'title', 'query' (SQL or callable),
+                optional 'header' (defaults to the query's column names) and
+                optional 'optional' (write an empty sheet if the query fails)
+        filename: Download name without extension (defaults to the name);
+                  may contain a {timestamp} placeholder
+    """
+    _exports[name] = {'filename': filename or name, 'sheets': sheets}
+
+
+def _get_export(name: str) -> Dict:
+    export = _exports.get(name)
+    if export is None:
+        raise ValueError(f"Unknown export: {name}")
+    return export
+
+
+def _sheet_sql(sheet: Dict, params: Optional[Dict]) -> Tuple[str, list]:
+    query = sheet['query']
+    if callable(query):
+        return query(params or {})
+    return query, []
+
+
+def _base_filename(name: str) -> str:
+    return _get_export(name)['filename'].format(timestamp=datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+
+def count_export_rows(name: str, params: Optional[Dict] = None) -> int:
+    """
+    Number of rows an export would write, over all its sheets
+
+    Returns:
+        int: Row count (optional sheets whose query fails count as empty)
+    """
+    total = 0
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    try:
+        for sheet in _get_export(name)['sheets']:
+            sql, args = _sheet_sql(sheet, params)
+            try:
+                total += conn.execute(f'SELECT COUNT(*) FROM ({sql})', args).fetchone()[0]
+            except sqlite3.Error:
+                if not sheet.get('optional'):
+                    raise
+    finally:
+        conn.close()
+    return total
+
+
+def _open_sheet(conn: sqlite3.Connection, sheet: Dict, params: Optional[Dict]) -> Tuple[List[str], Optional[sqlite3.Cursor]]:
+    """Run a sheet's query; returns (header, cursor), cursor None for a failed optional sheet"""
+    sql, args = _sheet_sql(sheet, params)
+    try:
+        cursor = conn.execute(sql, args)
+    except sqlite3.Error as e:
+        if not sheet.get('optional'):
+            raise
+        print(f"❌ Export sheet '{sheet['title']}' skipped: {e}")
+        return list(sheet.get('header') or []), None
+    header = sheet.get('header') or [column[0] for column in cursor.description]
+    return list(header), cursor
+
+
+def _batches(cursor: Optional[sqlite3.Cursor]) -> Iterator[list]:
+    if cursor is None:
+        return
+    while True:
+        rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def iter_csv(name: str, params: Optional[Dict] = None, compress: bool = False,
+             progress: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    Yield an export's first sheet as CSV, one batch of rows per chunk
+
+    The database connection is opened on the first chunk and closed when the
+    generator finishes or is closed (e.g. the client disconnects).
+
+    Args:
+        name: Registered export
+        params: Request parameters for the export's query
+        compress: Gzip the output
+        progress: Called with the number of rows written so far after each batch
+
+    Yields:
+        bytes: UTF-8 (or gzip) encoded chunks
+    """
+    sheet = _get_export(name)['sheets'][0]
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    try:
+        header, cursor = _open_sheet(conn, sheet, params)
+        writer.writerow(header)
+        written = 0
+        for rows in _batches(cursor):
+            writer.writerows(rows)
+            written += len(rows)
+            chunk = drain()
+            if chunk:
+                yield chunk
+            if progress:
+                progress(written)
+        chunk = drain()
+        if compressor:
+            chunk += compressor.flush()
+        if chunk:
+            yield chunk
+    finally:
+        conn.close()
+
+
+def write_xlsx(name: str, fileobj, params: Optional[Dict] = None,
+               progress: Optional[Callable[[int], None]] = None, db_path: str = DATABASE) -> int:
+    """
+    Write an export as an XLSX workbook, one worksheet per sheet
+
+    Args:
+        name: Registered export
+        fileobj: Path or binary file object to save to
+        params: Request parameters for the export's queries
+        progress: Called with the number of rows written so far after each batch
+        db_path: Database to read from
+
+    Returns:
+        int: Rows written
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    written = 0
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        for sheet in _get_export(name)['sheets']:
+            header, cursor = _open_sheet(conn, sheet, params)
+            worksheet = workbook.create_sheet(title=sheet['title'])
+            worksheet.append(header)
+            for rows in _batches(cursor):
+                for row in rows:
+                    worksheet.append(row)
+                written += len(rows)
+                if progress:
+                    progress(written)
+    finally:
+        conn.close()
+    workbook.save(fileobj)
+    return written
+
+
+def export_response(name: str, params: Optional[Dict] = None, fmt: str = 'csv',
+                    compress: bool = False) -> Response:
+    """
+    Stream an export to the client
+
+    Args:
+        name: Registered export
+        params: Request parameters for the export's queries
+        fmt: 'csv' or 'xlsx'
+        compress: Gzip a CSV export (sent as a .csv.gz file)
+    """
+    if fmt == 'xlsx':
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        try:
+            write_xlsx(name, spooled, params)
+        except Exception:
+            spooled.close()
+            raise
+        spooled.seek(0)
+        # send_file closes the spooled file once the response has been sent
+        return send_file(spooled, mimetype=XLSX_MIMETYPE, as_attachment=True,
+                         download_name=f"{_base_filename(name)}.xlsx")
+
+    filename = f"{_base_filename(name)}.{'csv.gz' if compress else 'csv'}"
+    return Response(iter_csv(name, params, compress),
+                    mimetype='application/gzip' if compress else 'text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def queue_export(name: str, params: Optional[Dict] = None, fmt: str = 'csv', compress: bool = False,
+                 created_by: Optional[str] = None) -> Optional[str]:
+    """
+    Run an export as a background job
+
+    Returns:
+        Optional[str]: Job ID, or None if the job could not be created
+    """
+    return submit_job('export', {'name': name, 'fmt': fmt, 'compress': compress, 'params': params or {}},
+                      created_by=created_by)
+
+
+def serve_export(name: str, params: Optional[Dict] = None, default_format: str = 'csv'):
+    """
+    Answer an export request: stream it, or queue it as a job when it is large
+
+    Reads ``format`` ('csv' or 'xlsx'), ``gzip`` and ``background`` from the
+    query string. Large exports only switch to a job for clients asking for
+    JSON; a browser following a download link still gets the streamed file.
+    """
+    fmt = request.args.get('format', default_format).lower()
+    export = _get_export(name)
+    if fmt not in ('csv', 'xlsx') or (fmt == 'csv' and len(export['sheets']) > 1):
+        return jsonify({'success': False, 'error': f'Unsupported export format: {fmt}'}), 400
+    compress = fmt == 'csv' and request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+
+    background = request.args.get('background', '').lower() in ('1', 'true', 'yes')
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    if not background and wants_json:
+        background = count_export_rows(name, params) > BACKGROUND_EXPORT_ROWS
+    if background:
+        job_id = queue_export(name, params, fmt, compress, created_by=session.get('username'))
+        if not job_id:
+            return jsonify({'success': False, 'error': 'Could not start background job'}), 500
+        return jsonify({'success': True, 'job_id': job_id, 'status_url': f'/jobs/{job_id}'}), 202
+
+    return export_response(name, params, fmt, compress)
+
+
+def run_export_job(ctx, name: str, fmt: str = 'csv', compress: bool = False, params: Optional[Dict] = None) -> Dict:
+    """Job handler: write an export into EXPORT_FOLDER and return its download link"""
+    total = count_export_rows(name, params)
+    ctx.report('Exporting rows', 0, total)
+
+    def progress(done: int) -> None:
+        if not ctx.report('Exporting rows', min(done, total), total):
+            raise JobCancelled()
+
+    extension = 'xlsx' if fmt == 'xlsx' else ('csv.gz' if compress else 'csv')
+    filename = f"{_base_filename(name)}_{ctx.job_id[:8]}.{extension}"
+    os.makedirs(EXPORT_FOLDER, exist_ok=True)
+    path = os.path.join(EXPORT_FOLDER, filename)
+    partial = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        if fmt == 'xlsx':
+            rows = write_xlsx(name, partial, params, progress)
+        else:
+            rows = 0
+
+            def count_rows(done: int) -> None:
+                nonlocal rows
+                rows = done
+                progress(done)
+
+            with open(partial, 'wb') as f:
+                for chunk in iter_csv(name, params, compress, count_rows):
+                    f.write(chunk)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    ctx.report('Export ready', total, total)
+    return {
+        'filename': filename,
+        'download_url': f'/admin/exports/{filename}',
+        'rows': rows,
+        'size': os.path.getsize(path),
+    }
+
+
+register_job_handler('export', run_export_job)
+
+
+def cleanup_stale_exports(max_age_hours: int = EXPORT_MAX_AGE_HOURS) -> int:
+    """
+    Delete finished export files older than max_age_hours
+
+    Returns:
+        int: Number of files removed
+    """
+    if not os.path.isdir(EXPORT_FOLDER):
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for entry in os.scandir(EXPORT_FOLDER):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError as e:
+            print(f"❌ Error removing export {entry.name}: {e}")
+    if removed:
+        print(f"✅ Removed {removed} stale exports")
+    return removed
+
+
+# ==================== Routes ====================
+
+@exports_bp.route('/admin/exports/<path:filename>')
+def download_export(filename):
+    if session.get('role') not in ['admin', 'teacher']:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    return send_from_directory(EXPORT_FOLDER, filename, as_attachment=True)
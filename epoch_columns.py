@@ -0,0 +1,163 @@
+"""
+Epoch Timestamp Columns for Sunrise Education Centre
+Adds canonical integer UTC epoch columns next to the legacy time columns.
+
+Time values have been stored several ways over the years: epoch floats from
+``get_ist_timestamp()``, server-local ``'%Y-%m-%d %H:%M:%S'`` strings, IST
+strings, SQLite ``CURRENT_TIMESTAMP`` (UTC) and ISO strings with an offset.
+Comparing or sorting those needs ``datetime(...)``/``date(...)`` around the
+column, which rules out indexes. Each table listed in EPOCH_COLUMNS gets an
+indexed ``*_ts INTEGER`` column holding seconds since the epoch (UTC),
+backfilled from the legacy column and kept in step by triggers, so existing
+writers keep working unchanged while queries range-scan on the new column.
+
+Usage:
+    python epoch_columns.py          # migrate users.db
+"""
+
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Database configuration
+DATABASE = 'users.db'
+
+# How a legacy value without an explicit offset should be read
+ZONE_MODIFIERS = {
+    'utc': None,                # CURRENT_TIMESTAMP defaults
+    'local': "'utc'",           # datetime.now() strings, server local time
+    'ist': "'-330 minutes'",    # format_ist_time() strings
+}
+
+# (table, legacy column, epoch column, zone of plain date strings)
+EPOCH_COLUMNS: List[Tuple[str, str, str, str]] = [
+    ('ip_logs', 'visited_at', 'visited_ts', 'local'),
+    ('user_activity', 'last_seen', 'last_seen_ts', 'local'),
+    ('active_sessions', 'created_at', 'created_ts', 'local'),
+    ('active_sessions', 'last_activity', 'last_activity_ts', 'local'),
+    ('notifications', 'created_at', 'created_ts', 'utc'),
+    ('user_notification_status', 'seen_at', 'seen_ts', 'utc'),
+    ('live_classes', 'created_at', 'created_ts', 'ist'),
+    ('live_classes', 'scheduled_time', 'scheduled_ts', 'ist'),
+    ('live_classes', 'activated_at', 'activated_ts', 'ist'),
+    ('live_class_attendance', 'joined_at', 'joined_ts', 'utc'),
+    ('live_class_messages', 'created_at', 'created_ts', 'utc'),
+    ('forum_messages', 'timestamp', 'posted_ts', 'utc'),
+    ('personal_chats', 'created_at', 'created_ts', 'ist'),
+    ('queries', 'submitted_at', 'submitted_ts', 'local'),
+    ('admissions', 'submitted_at', 'submitted_ts', 'local'),
+    ('resource_downloads', 'downloaded_at', 'downloaded_ts', 'utc'),
+]
+
+# Extra columns appended to an epoch index so hot queries are covered by it
+COVERING_COLUMNS: Dict[Tuple[str, str], Tuple[str, ...]] = {
+    ('ip_logs', 'visited_ts'): ('ip',),
+}
+
+
+def epoch_expression(value: str, zone: str) -> str:
+    """
+    SQL expression converting a legacy time value to integer UTC epoch seconds
+
+    Args:
+        value: Column reference, e.g. 'visited_at' or 'NEW.visited_at'
+        zone: Key of ZONE_MODIFIERS used for strings without an offset
+
+    Returns:
+        str: Expression that is NULL for NULL, empty or unparseable values
+    """
+    modifier = ZONE_MODIFIERS[zone]
+    plain = f"strftime('%s', {value}, {modifier})" if modifier else f"strftime('%s', {value})"
+    return f"""CASE
+            WHEN {value} IS NULL OR {value} = '' THEN NULL
+            WHEN typeof({value}) IN ('integer', 'real') OR {value} NOT GLOB '*[^0-9.]*'
+                THEN CAST(CAST({value} AS REAL) AS INTEGER)
+            WHEN {value} GLOB '*[+-][0-9][0-9]:[0-9][0-9]' OR {value} GLOB '*Z'
+                THEN CAST(strftime('%s', {value}) AS INTEGER)
+            ELSE CAST({plain} AS INTEGER)
+        END"""
+
+
+def _columns(c: sqlite3.Cursor, table: str) -> List[str]:
+    return [row[1] for row in c.execute(f'PRAGMA table_info({table})')]
+
+
+def _ensure_epoch_column(c: sqlite3.Cursor, table: str, source: str, target: str, zone: str) -> Optional[int]:
+    columns = _columns(c, table)
+    if source not in columns:
+        return None  # table not created yet on this install
+    if target not in columns:
+        c.execute(f'ALTER TABLE {table} ADD COLUMN {target} INTEGER')
+
+    index_columns = ', '.join((target,) + COVERING_COLUMNS.get((table, target), ()))
+    c.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{target} ON {table}({index_columns})')
+
+    # Writers that fill the epoch column themselves skip the trigger's extra update
+    expression = epoch_expression(f'NEW.{source}', zone)
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_{target}_insert
+        AFTER INSERT ON {table} WHEN NEW.{target} IS NULL
+        BEGIN
+            UPDATE {table} SET {target} = {expression} WHERE rowid = NEW.rowid;
+        END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_{target}_update
+        AFTER UPDATE OF {source} ON {table}
+        BEGIN
+            UPDATE {table} SET {target} = {expression} WHERE rowid = NEW.rowid;
+        END''')
+
+    c.execute(f'''UPDATE {table} SET {target} = {epoch_expression(source, zone)}
+                  WHERE {target} IS NULL AND {source} IS NOT NULL''')
+    return c.rowcount
+
+
+def ensure_epoch_columns(db_path: str = DATABASE) -> Dict[str, int]:
+    """
+    Add, index and backfill every epoch column, and install the sync triggers
+
+    Safe to run on every start: only rows still missing an epoch value are
+    backfilled, and tables that do not exist yet are skipped.
+
+    Args:
+        db_path: SQLite database to migrate
+
+    Returns:
+        Dict[str, int]: Rows backfilled per 'table.column'
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    c = conn.cursor()
+    backfilled = {}
+    try:
+        for table, source, target, zone in EPOCH_COLUMNS:
+            count = _ensure_epoch_column(c, table, source, target, zone)
+            if count is not None:
+                backfilled[f'{table}.{target}'] = count
+        conn.commit()
+        total = sum(backfilled.values())
+        print(f"✅ Epoch timestamp columns ensured on {len(backfilled)} columns ({total} rows backfilled)")
+    except Exception as e:
+        print(f"❌ Error ensuring epoch timestamp columns: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+    return backfilled
+
+
+def epoch_now() -> int:
+    """Current time as integer epoch seconds"""
+    return int(time.time())
+
+
+def start_of_local_day(now: Optional[datetime] = None) -> int:
+    """
+    Epoch seconds at midnight today in server local time
+
+    Matches what date('now', 'localtime') meant in the queries this replaces.
+    """
+    now = now or datetime.now()
+    return int(now.replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+
+if __name__ == '__main__':
+    for column, count in ensure_epoch_columns().items():
+        print(f"   {column:<40} {count} rows backfilled")
@@ -0,0 +1,399 @@
+"""
+Background Job Runner for Sunrise Education Centre
+Runs long imports (bulk resources, students, admissions) outside the HTTP request.
+
+Jobs are persisted in the ``jobs`` table so their status, progress and JSON
+result survive the request that created them. Worker threads pick jobs off an
+in-process queue; progress is written back to the table and pushed to the
+``job_<id>`` Socket.IO room. Clients poll ``/jobs/<id>`` or listen for
+``job_progress`` events, and can cancel with ``POST /jobs/<id>/cancel``.
+
+A running job records its owner (``host:pid``) and a lease that the owning
+process renews every few seconds. A job whose lease has run out belonged to a
+process that died; any process marks it failed. Live processes never touch
+each other's running jobs, so a second or respawned worker can start safely.
+"""
+
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+from flask import Blueprint, jsonify, session
+
+# Database configuration
+DATABASE = 'users.db'
+
+JOB_WORKERS = 2
+PROGRESS_WRITE_INTERVAL = 0.5  # seconds between progress writes for one job
+JOB_LEASE = 60                 # seconds a running job stays ours without a heartbeat
+HEARTBEAT_INTERVAL = 15        # seconds between lease renewals (and expired-lease sweeps)
+
+jobs_bp = Blueprint('jobs', __name__)
+
+_job_handlers: Dict[str, Callable] = {}
+_job_queue: "queue.Queue[str]" = queue.Queue()
+_workers: List[threading.Thread] = []
+_workers_lock = threading.Lock()
+_emit_event: Optional[Callable[[str, Dict, str], None]] = None
+_owner = f'{socket.gethostname()}:{os.getpid()}'
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation has been requested"""
+
+
+def ensure_jobs_table():
+    """Ensure the jobs table exists"""
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            stage TEXT,
+            progress_done INTEGER DEFAULT 0,
+            progress_total INTEGER DEFAULT 0,
+            params TEXT,
+            result TEXT,
+            error TEXT,
+            cancel_requested INTEGER DEFAULT 0,
+            created_by TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            started_at TEXT,
+            finished_at TEXT,
+            owner TEXT,
+            lease_until INTEGER DEFAULT 0
+        )''')
+        c.execute('PRAGMA table_info(jobs)')
+        columns = {row[1] for row in c.fetchall()}
+        if 'owner' not in columns:
+            c.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+        if 'lease_until' not in columns:
+            c.execute('ALTER TABLE jobs ADD COLUMN lease_until INTEGER DEFAULT 0')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at)')
+        conn.commit()
+        print("✅ Jobs table ensured")
+    except Exception as e:
+        print(f"❌ Error ensuring jobs table: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def register_job_handler(kind: str, handler: Callable) -> None:
+    """
+    Register the function that runs jobs of a given kind
+
+    Args:
+        kind: Job kind, e.g. 'resource_import'
+        handler: Called as handler(ctx, **params); returns a JSON-serializable result
+    """
+    _job_handlers[kind] = handler
+
+
+def set_job_event_emitter(emit: Callable[[str, Dict, str], None]) -> None:
+    """
+    Set the function used to push job events (event name, payload, room)
+
+    Args:
+        emit: Usually a thin wrapper around socketio.emit
+    """
+    global _emit_event
+    _emit_event = emit
+
+
+def _execute(query: str, params: tuple = ()) -> int:
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    try:
+        c.execute(query, params)
+        conn.commit()
+        return c.rowcount
+    finally:
+        conn.close()
+
+
+def _emit(job_id: str, payload: Dict) -> None:
+    if _emit_event is None:
+        return
+    try:
+        _emit_event('job_progress', payload, f'job_{job_id}')
+    except Exception as e:
+        print(f"❌ Error emitting job event for {job_id}: {e}")
+
+
+class JobContext:
+    """Handed to job handlers for progress reporting and cancellation checks"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    def cancel_requested(self) -> bool:
+        conn = sqlite3.connect(DATABASE, timeout=30)
+        try:
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (self.job_id,)).fetchone()
+            return bool(row and row[0])
+        finally:
+            conn.close()
+
+    def check_cancelled(self) -> None:
+        """Raise JobCancelled if the job has been cancelled"""
+        if self.cancel_requested():
+            raise JobCancelled()
+
+    def report(self, stage: str, done: int, total: int) -> bool:
+        """
+        Record progress (throttled) and push it to listeners
+
+        Returns:
+            bool: False if cancellation was requested, True otherwise
+        """
+        now = time.time()
+        if done < total and now - self._last_write < PROGRESS_WRITE_INTERVAL:
+            return True
+        self._last_write = now
+        _execute('UPDATE jobs SET stage = ?, progress_done = ?, progress_total = ? WHERE id = ?',
+                 (stage, done, total, self.job_id))
+        _emit(self.job_id, {'job_id': self.job_id, 'status': 'running', 'stage': stage,
+                            'done': done, 'total': total})
+        return not self.cancel_requested()
+
+
+def submit_job(kind: str, params: Optional[Dict] = None, created_by: Optional[str] = None) -> Optional[str]:
+    """
+    Persist a new job and queue it for a worker
+
+    Args:
+        kind: Registered job kind
+        params: JSON-serializable keyword arguments for the handler
+        created_by: Username that started the job
+
+    Returns:
+        Optional[str]: Job ID, or None if the kind is unknown or the insert failed
+    """
+    if kind not in _job_handlers:
+        print(f"❌ Unknown job kind: {kind}")
+        return None
+    job_id = uuid.uuid4().hex
+    try:
+        _execute('INSERT INTO jobs (id, kind, params, created_by) VALUES (?, ?, ?, ?)',
+                 (job_id, kind, json.dumps(params or {}), created_by))
+    except Exception as e:
+        print(f"❌ Error creating job: {e}")
+        return None
+    start_job_workers()
+    _job_queue.put(job_id)
+    print(f"✅ Queued {kind} job {job_id}")
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """
+    Get a job with its decoded result
+
+    Args:
+        job_id: Job ID
+
+    Returns:
+        Optional[Dict]: Job record or None if not found
+    """
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''SELECT id, kind, status, stage, progress_done, progress_total, result, error,
+                            cancel_requested, created_by, created_at, started_at, finished_at
+                     FROM jobs WHERE id = ?''', (job_id,))
+        row = c.fetchone()
+        if not row:
+            return None
+        return {
+            'id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'stage': row[3],
+            'done': row[4] or 0,
+            'total': row[5] or 0,
+            'result': json.loads(row[6]) if row[6] else None,
+            'error': row[7],
+            'cancel_requested': bool(row[8]),
+            'created_by': row[9],
+            'created_at': row[10],
+            'started_at': row[11],
+            'finished_at': row[12],
+        }
+    finally:
+        conn.close()
+
+
+def list_jobs(limit: int = 50) -> List[Dict]:
+    """
+    List recent jobs without their results
+
+    Args:
+        limit: Maximum number of jobs
+
+    Returns:
+        List[Dict]: Most recent jobs first
+    """
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''SELECT id, kind, status, stage, progress_done, progress_total, created_by,
+                            created_at, finished_at
+                     FROM jobs ORDER BY created_at DESC LIMIT ?''', (limit,))
+        keys = ('id', 'kind', 'status', 'stage', 'done', 'total', 'created_by', 'created_at', 'finished_at')
+        return [dict(zip(keys, row)) for row in c.fetchall()]
+    finally:
+        conn.close()
+
+
+def cancel_job(job_id: str) -> bool:
+    """
+    Request cancellation; queued jobs are cancelled at once, running jobs at their next check
+
+    Args:
+        job_id: Job ID
+
+    Returns:
+        bool: True if the job was still queued or running
+    """
+    changed = _execute('''UPDATE jobs SET cancel_requested = 1
+                          WHERE id = ? AND status IN ('queued', 'running')''', (job_id,))
+    _execute('''UPDATE jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status = 'queued' ''', (job_id,))
+    return changed == 1
+
+
+def _run_job(job_id: str) -> None:
+    claimed = _execute('''UPDATE jobs SET status = 'running', started_at = CURRENT_TIMESTAMP,
+                                 owner = ?, lease_until = ?
+                          WHERE id = ? AND status = 'queued' ''',
+                       (_owner, int(time.time()) + JOB_LEASE, job_id))
+    if claimed != 1:
+        return  # cancelled while queued, or already taken
+    job = get_job(job_id)
+    conn = sqlite3.connect(DATABASE)
+    try:
+        params = json.loads(conn.execute('SELECT params FROM jobs WHERE id = ?', (job_id,)).fetchone()[0] or '{}')
+    finally:
+        conn.close()
+
+    ctx = JobContext(job_id)
+    handler = _job_handlers.get(job['kind'])
+    status, result, error = 'succeeded', None, None
+    try:
+        if handler is None:
+            raise RuntimeError(f"No handler registered for {job['kind']}")
+        result = handler(ctx, **params)
+        if ctx.cancel_requested():
+            status = 'cancelled'
+    except JobCancelled:
+        status = 'cancelled'
+    except Exception as e:
+        status = 'cancelled' if ctx.cancel_requested() else 'failed'
+        error = str(e)
+        print(f"❌ Job {job_id} ({job['kind']}) failed: {e}")
+
+    _execute('''UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = CURRENT_TIMESTAMP
+                WHERE id = ?''',
+             (status, json.dumps(result, default=str) if result is not None else None, error, job_id))
+    _emit(job_id, {'job_id': job_id, 'status': status, 'error': error})
+    print(f"✅ Job {job_id} ({job['kind']}) finished: {status}")
+
+
+def _worker_loop() -> None:
+    while True:
+        job_id = _job_queue.get()
+        try:
+            _run_job(job_id)
+        except Exception as e:
+            print(f"❌ Job worker error on {job_id}: {e}")
+
+
+def _fail_abandoned_jobs() -> int:
+    """Mark failed the running jobs whose owner stopped renewing the lease"""
+    return _execute('''UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart',
+                             finished_at = CURRENT_TIMESTAMP
+                      WHERE status = 'running' AND COALESCE(lease_until, 0) < ?''', (int(time.time()),))
+
+
+def _heartbeat_loop() -> None:
+    while True:
+        try:
+            _execute("UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = 'running'",
+                     (int(time.time()) + JOB_LEASE, _owner))
+            failed = _fail_abandoned_jobs()
+            if failed:
+                print(f"❌ Marked {failed} abandoned jobs failed")
+        except Exception as e:
+            print(f"❌ Job heartbeat error: {e}")
+        time.sleep(HEARTBEAT_INTERVAL)
+
+
+def start_job_workers(count: int = JOB_WORKERS) -> None:
+    """
+    Start the worker threads (idempotent) and recover jobs from a previous run
+
+    Running jobs whose lease has expired (their process is gone) are marked
+    failed; jobs that were still queued are queued again. Jobs another live
+    process is running are left alone.
+    """
+    with _workers_lock:
+        if _workers:
+            return
+        try:
+            _fail_abandoned_jobs()
+            conn = sqlite3.connect(DATABASE)
+            try:
+                pending = [row[0] for row in conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at")]
+            finally:
+                conn.close()
+            for job_id in pending:
+                _job_queue.put(job_id)
+        except Exception as e:
+            print(f"❌ Error recovering jobs: {e}")
+        for i in range(count):
+            worker = threading.Thread(target=_worker_loop, daemon=True, name=f'job-worker-{i}')
+            worker.start()
+            _workers.append(worker)
+        heartbeat = threading.Thread(target=_heartbeat_loop, daemon=True, name='job-heartbeat')
+        heartbeat.start()
+        _workers.append(heartbeat)
+        print(f"✅ Started {count} job workers ({_owner})")
+
+
+# ==================== Routes ====================
+
+@jobs_bp.route('/jobs')
+def jobs_list():
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    return jsonify({'success': True, 'jobs': list_jobs()})
+
+
+@jobs_bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    if session.get('role') not in ['admin', 'teacher']:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    job = get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
+
+@jobs_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    if session.get('role') not in ['admin', 'teacher']:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    if not cancel_job(job_id):
+        return jsonify({'success': False, 'error': 'Job is not running'}), 409
+    return jsonify({'success': True})
@@ -0,0 +1,212 @@
+"""
+Live Class Status Timers for Sunrise Education Centre
+Moves live classes through scheduled -> active -> completed at the right moment.
+
+Each process keeps a heap of (due time, class id, transition) built from the
+``scheduled_ts``/``activated_ts`` epoch columns and a timer thread that
+sleeps until the earliest entry. A due transition is one conditional UPDATE
+of that class (``... WHERE id = ? AND status = 'scheduled' AND scheduled_ts
+<= ?``), so whichever process gets there first makes the change and every
+other attempt — another worker, or a stale heap entry after the class was
+rescheduled — changes nothing. Only the process whose UPDATE matched emits
+``live_class_status_changed`` to the ``live_class_updates`` Socket.IO room.
+
+Code that creates or edits a class calls ``class_changed`` so its timers are
+scheduled immediately; ``reload_live_class_timers`` rebuilds the heap from
+the database to pick up classes created by other processes, and
+``add_transition_listener`` lets caches drop their copy when a timer fires.
+"""
+
+import heapq
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from time_config import format_ist_time, get_current_ist_time
+
+# Database configuration
+DATABASE = 'users.db'
+
+AUTO_COMPLETE_AFTER = 2 * 3600    # active classes are completed after two hours
+LIVE_CLASS_ROOM = 'live_class_updates'
+
+_heap: List[Tuple[int, int, str]] = []
+_scheduled: set = set()           # (class_id, transition, due) already in the heap
+_condition = threading.Condition()
+_timer_thread: Optional[threading.Thread] = None
+_emit_event: Optional[Callable[[str, Dict, str], None]] = None
+_listeners: List[Callable[[int], None]] = []
+
+
+def set_live_class_event_emitter(emit: Callable[[str, Dict, str], None]) -> None:
+    """
+    Set the function used to push status events (event name, payload, room)
+
+    Args:
+        emit: Usually a thin wrapper around socketio.emit
+    """
+    global _emit_event
+    _emit_event = emit
+
+
+def add_transition_listener(callback: Callable[[int], None]) -> None:
+    """
+    Call back with the class id whenever a due transition is attempted here
+
+    Every process runs the same timers, so this fires in each of them around
+    the moment a class changes state, whichever process made the change.
+
+    Args:
+        callback: Usually a cache invalidation hook
+    """
+    if callback not in _listeners:
+        _listeners.append(callback)
+
+
+def _emit(class_id: int, status: str, previous: Optional[str]) -> None:
+    if _emit_event is None:
+        return
+    try:
+        _emit_event('live_class_status_changed',
+                    {'class_id': class_id, 'status': status, 'previous': previous, 'at': int(time.time())},
+                    LIVE_CLASS_ROOM)
+    except Exception as e:
+        print(f"❌ Error emitting live class status for {class_id}: {e}")
+
+
+def _push(due: int, class_id: int, transition: str) -> None:
+    key = (class_id, transition, due)
+    with _condition:
+        if key in _scheduled:
+            return
+        _scheduled.add(key)
+        heapq.heappush(_heap, (due, class_id, transition))
+        _condition.notify()
+
+
+def _schedule_row(class_id: int, status: str, scheduled_ts: Optional[int],
+                  activated_ts: Optional[int], created_ts: Optional[int]) -> None:
+    if status == 'scheduled' and scheduled_ts is not None:
+        _push(scheduled_ts, class_id, 'activate')
+    elif status == 'active':
+        started = activated_ts if activated_ts is not None else created_ts
+        if started is not None:
+            _push(started + AUTO_COMPLETE_AFTER, class_id, 'complete')
+
+
+def reload_live_class_timers() -> int:
+    """
+    Schedule timers for every scheduled/active class in the database
+
+    Returns:
+        int: Number of classes looked at
+    """
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    try:
+        rows = conn.execute('''SELECT id, status, scheduled_ts, activated_ts, created_ts FROM live_classes
+                               WHERE status IN ('scheduled', 'active')''').fetchall()
+    finally:
+        conn.close()
+    for row in rows:
+        _schedule_row(*row)
+    return len(rows)
+
+
+def class_changed(class_id: int, previous: Optional[str] = None) -> None:
+    """
+    Re-read one class after it was created or edited: schedule its next
+    transition and, if its status changed, tell listeners
+
+    Args:
+        class_id: Live class ID
+        previous: Status before the edit, if known
+    """
+    try:
+        conn = sqlite3.connect(DATABASE, timeout=30)
+        try:
+            row = conn.execute('SELECT id, status, scheduled_ts, activated_ts, created_ts FROM live_classes WHERE id = ?',
+                               (class_id,)).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return
+        _schedule_row(*row)
+        if previous is not None and previous != row[1]:
+            _emit(class_id, row[1], previous)
+    except Exception as e:
+        print(f"❌ Error scheduling live class {class_id}: {e}")
+
+
+def _fire(class_id: int, transition: str, now: int) -> bool:
+    """Apply one due transition; True if this call made the change"""
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    try:
+        if transition == 'activate':
+            c.execute('''UPDATE live_classes SET status = 'active', activated_at = ?
+                         WHERE id = ? AND status = 'scheduled' AND scheduled_ts <= ?''',
+                      (format_ist_time(get_current_ist_time()), class_id, now))
+            previous, status = 'scheduled', 'active'
+        else:
+            c.execute('''UPDATE live_classes SET status = 'completed'
+                         WHERE id = ? AND status = 'active' AND COALESCE(activated_ts, created_ts) <= ?''',
+                      (class_id, now - AUTO_COMPLETE_AFTER))
+            previous, status = 'active', 'completed'
+        conn.commit()
+        changed = c.rowcount == 1
+    finally:
+        conn.close()
+    for callback in _listeners:
+        try:
+            callback(class_id)
+        except Exception as e:
+            print(f"❌ Error in live class transition listener: {e}")
+    if changed:
+        print(f"✅ Live class {class_id}: {previous} -> {status}")
+        _emit(class_id, status, previous)
+        # An activated class now needs its completion timer
+        class_changed(class_id)
+    return changed
+
+
+def run_due_transitions(now: Optional[int] = None) -> int:
+    """
+    Fire every heap entry that is due
+
+    Returns:
+        int: Number of transitions this process applied
+    """
+    now = int(now if now is not None else time.time())
+    fired = 0
+    while True:
+        with _condition:
+            if not _heap or _heap[0][0] > now:
+                return fired
+            due, class_id, transition = heapq.heappop(_heap)
+            _scheduled.discard((class_id, transition, due))
+        try:
+            fired += _fire(class_id, transition, now)
+        except Exception as e:
+            print(f"❌ Error applying {transition} to live class {class_id}: {e}")
+
+
+def _timer_loop() -> None:
+    while True:
+        with _condition:
+            delay = (_heap[0][0] - time.time()) if _heap else 300
+            if delay > 0:
+                _condition.wait(min(delay, 300))
+                continue
+        run_due_transitions()
+
+
+def start_live_class_timers() -> None:
+    """Load timers from the database and start this process's timer thread (idempotent)"""
+    global _timer_thread
+    if _timer_thread is not None and _timer_thread.is_alive():
+        return
+    count = reload_live_class_timers()
+    _timer_thread = threading.Thread(target=_timer_loop, daemon=True, name='live-class-timers')
+    _timer_thread.start()
+    print(f"✅ Live class timers started ({count} scheduled/active classes)")
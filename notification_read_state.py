@@ -0,0 +1,191 @@
+"""
+Notification Read State for Sunrise Education Centre
+Tracks which class and personal notifications a user has read, compactly.
+
+A class notification is stored once, however many students it reaches, but
+read state used to be one ``user_notification_status`` row per student per
+notification, and finding unread ones meant anti-joining that table. Here
+each user has:
+
+- a high-water mark (``notification_read_marks.read_upto``): every
+  notification ID at or below it counts as read, and
+- a sparse exception set (``notification_read_exceptions``): IDs above the
+  mark that were read out of order.
+
+Marking everything read is one upsert of the mark. Unread notifications are
+a range scan above the mark minus the exceptions. Marking one notification
+read adds an exception and then moves the mark up past every notification
+the user has read or that belongs to another class, dropping the exceptions
+it covers, so the set only holds the gaps in front of notifications still
+unread. Notifications the user cannot see yet only because of their paid
+status or the notification's status hold the mark back; they may become
+visible later and must not count as read.
+"""
+
+import sqlite3
+from typing import Optional
+
+from request_cache import clear_request_memo
+
+# Database configuration
+DATABASE = 'users.db'
+
+# Notifications a user with (class_id, paid) sees; used with "n" as the notifications alias
+VISIBLE_TO_USER_SQL = '''(
+    (n.class_id = ? AND (n.target_paid_status = 'all' OR n.target_paid_status = ?))
+    OR (n.class_id IS NULL AND n.target_paid_status = 'personal')
+) AND n.status IN ('active', 'scheduled')'''
+
+# The user's class and personal notifications, whatever their paid target or
+# status (either may change later); the mark only skips other classes
+MARK_SCOPE_SQL = '(n.class_id = ? OR n.class_id IS NULL)'
+
+# Unread for a user; parameters: (user_id, user_id)
+UNREAD_SQL = '''n.id > COALESCE((SELECT read_upto FROM notification_read_marks WHERE user_id = ?), 0)
+    AND NOT EXISTS (SELECT 1 FROM notification_read_exceptions e
+                    WHERE e.user_id = ? AND e.notification_id = n.id)'''
+
+
+def ensure_notification_read_state_tables() -> None:
+    """Create the read-state tables, migrating user_notification_status once"""
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    try:
+        c.execute('''CREATE TABLE IF NOT EXISTS notification_read_marks (
+            user_id INTEGER PRIMARY KEY,
+            read_upto INTEGER NOT NULL DEFAULT 0
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS notification_read_exceptions (
+            user_id INTEGER NOT NULL,
+            notification_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, notification_id)
+        ) WITHOUT ROWID''')
+        # With the implicit rowid suffix this serves "class_id = ? AND id > mark"
+        c.execute('CREATE INDEX IF NOT EXISTS idx_notifications_class ON notifications(class_id)')
+
+        c.execute('SELECT 1 FROM notification_read_marks LIMIT 1')
+        migrate = c.fetchone() is None
+        c.execute('SELECT 1 FROM notification_read_exceptions LIMIT 1')
+        migrate = migrate and c.fetchone() is None
+        if migrate:
+            c.execute('''
+                INSERT OR IGNORE INTO notification_read_exceptions (user_id, notification_id)
+                SELECT s.user_id, s.notification_id FROM user_notification_status s
+                JOIN notifications n ON n.id = s.notification_id
+            ''')
+            migrated = c.rowcount
+            c.execute('SELECT DISTINCT user_id FROM notification_read_exceptions')
+            for (user_id,) in c.fetchall():
+                _advance_mark(c, user_id)
+            if migrated:
+                c.execute('SELECT COUNT(*) FROM notification_read_exceptions')
+                remaining = c.fetchone()[0]
+                print(f"✅ Migrated {migrated} notification read rows ({remaining} exceptions left)")
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        print(f"❌ Error ensuring notification read state tables: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def _advance_mark(c: sqlite3.Cursor, user_id: int) -> int:
+    """Move the user's mark to just below their oldest unread notification; returns the mark"""
+    c.execute('SELECT class_id FROM users WHERE id = ?', (user_id,))
+    user = c.fetchone()
+    c.execute('SELECT read_upto FROM notification_read_marks WHERE user_id = ?', (user_id,))
+    row = c.fetchone()
+    mark = row[0] if row else 0
+    if user is None:
+        return mark
+
+    c.execute(f'''
+        SELECT MIN(n.id) FROM notifications n
+        WHERE {MARK_SCOPE_SQL} AND {UNREAD_SQL}
+    ''', (user[0], user_id, user_id))
+    oldest_unread = c.fetchone()[0]
+    if oldest_unread is not None:
+        new_mark = oldest_unread - 1
+    else:
+        c.execute('SELECT COALESCE(MAX(id), 0) FROM notifications')
+        new_mark = c.fetchone()[0]
+    if new_mark <= mark:
+        return mark
+
+    c.execute('''
+        INSERT INTO notification_read_marks (user_id, read_upto) VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET read_upto = MAX(read_upto, excluded.read_upto)
+    ''', (user_id, new_mark))
+    c.execute('DELETE FROM notification_read_exceptions WHERE user_id = ? AND notification_id <= ?',
+              (user_id, new_mark))
+    return new_mark
+
+
+def mark_notification_read(user_id: int, notification_id: int) -> bool:
+    """
+    Mark one class or personal notification as read for a user
+
+    Returns:
+        True on success
+    """
+    clear_request_memo()
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        c.execute('SELECT read_upto FROM notification_read_marks WHERE user_id = ?', (user_id,))
+        row = c.fetchone()
+        if row is None or notification_id > row[0]:
+            c.execute('INSERT OR IGNORE INTO notification_read_exceptions (user_id, notification_id) VALUES (?, ?)',
+                      (user_id, notification_id))
+            _advance_mark(c, user_id)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"❌ Error marking notification {notification_id} read for user {user_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def mark_all_notifications_read(user_id: int, upto_id: Optional[int] = None) -> bool:
+    """
+    Mark every notification up to upto_id (default: the newest) as read, in one statement
+
+    Exceptions below the new mark are left in place; they no longer match
+    anything and the next mark_notification_read drops them.
+
+    Returns:
+        True on success
+    """
+    clear_request_memo()
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    try:
+        conn.execute('''
+            INSERT INTO notification_read_marks (user_id, read_upto)
+            VALUES (?, COALESCE(?, (SELECT MAX(id) FROM notifications), 0))
+            ON CONFLICT(user_id) DO UPDATE SET read_upto = MAX(read_upto, excluded.read_upto)
+        ''', (user_id, upto_id))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        print(f"❌ Error marking all notifications read for user {user_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def forget_notification_reads(c: sqlite3.Cursor, notification_id: Optional[int] = None) -> None:
+    """
+    Drop read exceptions for a deleted notification (or for every deleted one)
+
+    Args:
+        c: Cursor inside the caller's deleting transaction
+        notification_id: The deleted notification, or None to sweep orphans
+    """
+    if notification_id is not None:
+        c.execute('DELETE FROM notification_read_exceptions WHERE notification_id = ?', (notification_id,))
+    else:
+        c.execute('''DELETE FROM notification_read_exceptions
+                     WHERE notification_id NOT IN (SELECT id FROM notifications)''')
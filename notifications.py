@@ -8,6 +8,9 @@ from datetime import datetime, timezone
 import re
 from typing import List, Dict, Optional, Tuple
 
+from request_cache import request_memoized, clear_request_memo
+from notification_read_state import UNREAD_SQL, mark_notification_read, forget_notification_reads
+
 # Database configuration
 DATABASE = 'users.db'
 
@@ -102,6 +105,7 @@ def add_general_notification(message: str, class_id: Optional[int] = None,
     Returns:
         Notification ID
     """
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
@@ -140,6 +144,7 @@ def add_personal_notification(message: str, user_id: int,
     Returns:
         Notification ID
     """
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
@@ -178,6 +183,7 @@ def add_mention_notification(mentioned_user_id: int, sender_id: int,
     Returns:
         Mention notification ID
     """
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
@@ -199,6 +205,7 @@ def add_mention_notification(mentioned_user_id: int, sender_id: int,
     finally:
         conn.close()
 
+@request_memoized
 def get_unread_notifications_for_user(user_id: int) -> List[Tuple]:
     """
     Get all unread notifications for a specific user
@@ -222,16 +229,15 @@ def get_unread_notifications_for_user(user_id: int) -> List[Tuple]:
         class_id, user_paid_status = result
         all_notifications = []
         
-        # 1. Get general notifications for user's class
-        c.execute('''
+        # 1. Get general notifications for user's class (above the read mark, minus exceptions)
+        c.execute(f'''
             SELECT n.id, n.message, n.created_at, n.status, n.notification_type, 
                    n.scheduled_time, 'general' as item_type, NULL as sender_name
             FROM notifications n
-            LEFT JOIN user_notification_status uns ON n.id = uns.notification_id AND uns.user_id = ?
-            WHERE n.class_id = ? AND uns.notification_id IS NULL
+            WHERE n.class_id = ? AND {UNREAD_SQL}
             AND (n.target_paid_status = 'all' OR n.target_paid_status = ?)
             AND n.status IN ('active', 'scheduled')
-        ''', (user_id, class_id, user_paid_status))
+        ''', (class_id, user_id, user_id, user_paid_status))
         general_notifications = c.fetchall()
         all_notifications.extend(general_notifications)
         
@@ -295,16 +301,15 @@ def mark_notification_as_read(user_id: int, notification_id: int, notification_t
         notification_id: Notification ID
         notification_type: Type of notification ('general', 'personal', 'mention', 'personal_chat')
     """
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
     try:
         if notification_type == 'general':
-            # Mark general notification as seen
-            c.execute('''
-                INSERT OR REPLACE INTO user_notification_status 
-                (user_id, notification_id, seen_at) VALUES (?, ?, ?)
-            ''', (user_id, notification_id, get_ist_timestamp()))
+            # Mark general notification as seen (per-user mark plus exceptions)
+            if not mark_notification_read(user_id, int(notification_id)):
+                return False
             
         elif notification_type == 'personal':
             # Mark personal notification as read
@@ -332,12 +337,15 @@ def mark_notification_as_read(user_id: int, notification_id: int, notification_t
         
         conn.commit()
         print(f"✅ Marked {notification_type} notification {notification_id} as read for user {user_id}")
+        return True
         
     except Exception as e:
         print(f"❌ Error marking notification as read: {e}")
+        return False
     finally:
         conn.close()
 
+@request_memoized
 def get_notification_count_for_user(user_id: int) -> int:
     """
     Get count of unread notifications for a user
@@ -359,6 +367,7 @@ def delete_notification(notification_id: int, notification_type: str = 'general'
         notification_id: Notification ID
         notification_type: Type of notification
     """
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
@@ -366,8 +375,9 @@ def delete_notification(notification_id: int, notification_type: str = 'general'
         if notification_type == 'general':
             # Delete from notifications table
             c.execute('DELETE FROM notifications WHERE id = ?', (notification_id,))
-            # Also delete from user_notification_status
+            # Also delete its read state
             c.execute('DELETE FROM user_notification_status WHERE notification_id = ?', (notification_id,))
+            forget_notification_reads(c, notification_id)
             
         elif notification_type == 'personal':
             # Delete from user_notifications table
@@ -496,6 +506,7 @@ def cleanup_old_notifications(days_old: int = 30):
     Args:
         days_old: Number of days after which to delete notifications
     """
+    clear_request_memo()
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
@@ -520,6 +531,7 @@ def cleanup_old_notifications(days_old: int = 30):
             WHERE notification_id NOT IN (SELECT id FROM notifications)
         ''')
         status_deleted = c.rowcount
+        forget_notification_reads(c)
         
         conn.commit()
         print(f"✅ Cleaned up {general_deleted} general, {personal_deleted} personal, {mention_deleted} mention notifications")
@@ -529,6 +541,3 @@ def cleanup_old_notifications(days_old: int = 30):
         print(f"❌ Error cleaning up notifications: {e}")
     finally:
         conn.close()
-
-# Initialize tables when module is imported
-ensure_notification_tables()
\ No newline at end of file
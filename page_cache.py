@@ -0,0 +1,166 @@
+"""
+Page Cache for Sunrise Education Centre
+Serves rendered public pages from memory, with conditional GET support.
+
+Routes decorated with ``cached_page`` keep their rendered HTML keyed by
+(page, query string, role, paid status, class, data generation) for a TTL.
+The generation combines the reference data sets the page is built from
+(see reference_cache, so an admin edit in any worker changes the key), an
+optional extra counter such as the resource catalogue generation, and this
+module's own counter that ``invalidate_page_cache`` bumps.
+
+Every template also shows per-user details (name, notification bell), so
+only visitors without a login and without pending flash messages are served
+from the cache; everyone else gets the normal route. Cached responses carry
+an ETag and a Last-Modified time (the later of the site's last deployment
+and the moment the page was rendered), so a revalidating browser gets a 304.
+
+Hits, misses, bypasses and 304s are counted per page; see
+``get_page_cache_stats()``.
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional
+
+from flask import Response, make_response, request, session
+
+from reference_cache import get_reference_generation
+
+PAGE_CACHE_TTL = 300                   # seconds a rendered page is reused
+PAGE_CACHE_MAX_ENTRIES = 256
+
+_lock = threading.Lock()
+_entries: Dict[tuple, Dict] = {}
+_page_generation = 0
+_stats: Dict[str, Dict[str, int]] = {}
+_last_updated_source: Optional[Callable[[], datetime]] = None
+
+
+def set_last_updated_source(source: Callable[[], datetime]) -> None:
+    """
+    Set the function giving the site's last-updated time (used for Last-Modified)
+
+    Args:
+        source: Returns a timezone-aware datetime
+    """
+    global _last_updated_source
+    _last_updated_source = source
+
+
+def invalidate_page_cache() -> None:
+    """Drop every cached page in this process"""
+    global _page_generation
+    with _lock:
+        _page_generation += 1
+        _entries.clear()
+
+
+def _count(name: str, outcome: str) -> None:
+    with _lock:
+        counters = _stats.setdefault(name, {'hits': 0, 'misses': 0, 'bypassed': 0, 'not_modified': 0})
+        counters[outcome] += 1
+
+
+def _last_modified(rendered_at: float) -> datetime:
+    rendered = datetime.fromtimestamp(int(rendered_at), tz=timezone.utc)
+    if _last_updated_source is None:
+        return rendered
+    try:
+        return max(rendered, _last_updated_source().astimezone(timezone.utc).replace(microsecond=0))
+    except Exception:
+        return rendered
+
+
+def _store(key: tuple, entry: Dict) -> None:
+    with _lock:
+        if len(_entries) >= PAGE_CACHE_MAX_ENTRIES:
+            oldest = min(_entries, key=lambda k: _entries[k]['rendered_at'])
+            del _entries[oldest]
+        _entries[key] = entry
+
+
+def cached_page(name: str, ttl: int = PAGE_CACHE_TTL, depends: Iterable[str] = (),
+                generation: Optional[Callable[[], int]] = None) -> Callable:
+    """
+    Serve a route's rendered HTML from the cache for anonymous visitors
+
+    Args:
+        name: Page name used in the key and in the stats
+        ttl: Seconds a rendering is reused
+        depends: Reference data sets the page shows (e.g. 'classes', 'countdown')
+        generation: Extra counter to key on, e.g. get_catalogue_generation
+
+    Returns:
+        Decorator for a Flask view function
+    """
+    depends = tuple(depends)
+
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('user_id') or session.get('_flashes'):
+                _count(name, 'bypassed')
+                return view(*args, **kwargs)
+
+            key = (
+                name, request.query_string, args, tuple(sorted(kwargs.items())),
+                session.get('role'), session.get('paid_status'), session.get('class_id'),
+                tuple(get_reference_generation(d) for d in depends),
+                generation() if generation else 0, _page_generation,
+            )
+            now = time.time()
+            with _lock:
+                entry = _entries.get(key)
+            if entry is not None and now - entry['rendered_at'] < ttl:
+                outcome = 'hits'
+            else:
+                response = make_response(view(*args, **kwargs))
+                # Only plain pages that left the session alone (no flash, no login) are reusable
+                if (response.status_code != 200 or response.mimetype != 'text/html'
+                        or response.direct_passthrough or session.modified):
+                    _count(name, 'bypassed')
+                    return response
+                body = response.get_data()
+                entry = {
+                    'body': body,
+                    'etag': hashlib.sha1(body).hexdigest()[:20],
+                    'rendered_at': now,
+                    'last_modified': _last_modified(now),
+                }
+                _store(key, entry)
+                outcome = 'misses'
+
+            response = Response(entry['body'], mimetype='text/html')
+            response.set_etag(entry['etag'])
+            response.last_modified = entry['last_modified']
+            # Browsers revalidate every time; the page changes as soon as someone logs in
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Cookie')
+            response = response.make_conditional(request)
+            _count(name, 'not_modified' if response.status_code == 304 else outcome)
+            return response
+
+        return wrapper
+    return decorator
+
+
+def get_page_cache_stats() -> List[Dict]:
+    """
+    Cache outcomes per page since the process started
+
+    Returns:
+        List of {'page', 'hits', 'misses', 'bypassed', 'not_modified', 'hit_ratio'};
+        the hit ratio counts 304s as hits and ignores bypassed (logged-in) requests
+    """
+    with _lock:
+        snapshot = {name: dict(counters) for name, counters in _stats.items()}
+    report = []
+    for name, c in sorted(snapshot.items()):
+        served = c['hits'] + c['not_modified']
+        cacheable = served + c['misses']
+        report.append(dict(c, page=name, hit_ratio=round(served / cacheable, 3) if cacheable else 0.0))
+    return report
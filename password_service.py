@@ -0,0 +1,153 @@
+"""
+Password Hashing Service for Sunrise Education Centre
+One place for hashing, verifying and upgrading stored passwords.
+
+Hashes use the werkzeug ``method$salt$hash`` format, so values written here
+and by ``werkzeug.security.generate_password_hash`` are interchangeable. The
+cost is set with the PASSWORD_HASH_METHOD environment variable (for example
+``pbkdf2:sha256:260000``). Older stored values — plain text in ``users`` and
+the salted SHA-256 fallback once used for admission credentials — still
+verify, and are reported as needing a rehash so callers can upgrade them.
+"""
+
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import string
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    from werkzeug.security import generate_password_hash, check_password_hash
+    WERKZEUG_AVAILABLE = True
+except ImportError:
+    WERKZEUG_AVAILABLE = False
+
+# Full method spec including the cost, so stored hashes can be compared against it
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+PARALLEL_THRESHOLD = 64  # below this a pool costs more than it saves
+
+_LEGACY_SHA256_SALT = 'admission_salt_2024'
+_LEGACY_SHA256 = re.compile(r'[0-9a-f]{64}')
+_HASH_PREFIXES = ('pbkdf2:', 'scrypt')
+_SALT_CHARS = string.ascii_letters + string.digits
+
+
+def _pbkdf2_hash(password: str, method: str) -> str:
+    """werkzeug-compatible pbkdf2 hash, used when werkzeug is not installed"""
+    _, digest, iterations = (method.split(':') + ['260000'])[:3]
+    salt = ''.join(secrets.choice(_SALT_CHARS) for _ in range(16))
+    value = hashlib.pbkdf2_hmac(digest, password.encode(), salt.encode(), int(iterations)).hex()
+    return f"pbkdf2:{digest}:{iterations}${salt}${value}"
+
+
+def _pbkdf2_check(stored: str, password: str) -> bool:
+    try:
+        method, salt, value = stored.split('$', 2)
+        _, digest, iterations = method.split(':')
+        computed = hashlib.pbkdf2_hmac(digest, password.encode(), salt.encode(), int(iterations)).hex()
+        return hmac.compare_digest(computed, value)
+    except (ValueError, TypeError):
+        return False
+
+
+def is_password_hash(stored: Optional[str]) -> bool:
+    """True if the stored value is a werkzeug-format hash (not a legacy value)"""
+    return bool(stored) and '$' in stored and stored.startswith(_HASH_PREFIXES)
+
+
+def hash_password(password: str, method: Optional[str] = None) -> str:
+    """
+    Hash a password with the configured method
+
+    Args:
+        password: Plain password
+        method: Override PASSWORD_HASH_METHOD (e.g. a cheaper cost in benchmarks)
+
+    Returns:
+        str: Hash in method$salt$hash format
+    """
+    method = method or PASSWORD_HASH_METHOD
+    if WERKZEUG_AVAILABLE:
+        return generate_password_hash(password, method=method)
+    return _pbkdf2_hash(password, method)
+
+
+def verify_password(stored: Optional[str], password: Optional[str], allow_plaintext: bool = True,
+                    method: Optional[str] = None) -> Tuple[bool, bool]:
+    """
+    Check a password against a stored value
+
+    Args:
+        stored: Value from the database
+        password: Password entered by the user
+        allow_plaintext: Accept legacy plain-text stored values (users table only)
+        method: Method new hashes should use; defaults to PASSWORD_HASH_METHOD
+
+    Returns:
+        Tuple[bool, bool]: (matches, needs_rehash) — needs_rehash is only True on a match
+    """
+    if not stored or password is None:
+        return False, False
+    method = method or PASSWORD_HASH_METHOD
+    if is_password_hash(stored):
+        if WERKZEUG_AVAILABLE:
+            ok = check_password_hash(stored, password)
+        else:
+            ok = _pbkdf2_check(stored, password)
+        return ok, ok and stored.split('$', 1)[0] != method
+    if _LEGACY_SHA256.fullmatch(stored):
+        legacy = hashlib.sha256((password + _LEGACY_SHA256_SALT).encode()).hexdigest()
+        if hmac.compare_digest(stored, legacy):
+            return True, True
+    if allow_plaintext and hmac.compare_digest(stored.encode(), password.encode()):
+        return True, True
+    return False, False
+
+
+def check_password(stored: Optional[str], password: Optional[str]) -> bool:
+    """Drop-in for werkzeug's check_password_hash (hashes and the SHA-256 fallback only)"""
+    return verify_password(stored, password, allow_plaintext=False)[0]
+
+
+def _verify_pair(pair: Tuple[Optional[str], str], method: Optional[str] = None) -> Tuple[bool, bool]:
+    return verify_password(pair[0], pair[1], method=method)
+
+
+def _pool_map(func, items: List, workers: int) -> List:
+    if workers <= 1 or len(items) < PARALLEL_THRESHOLD:
+        return [func(item) for item in items]
+    chunksize = max(1, len(items) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, items, chunksize=chunksize))
+
+
+def hash_passwords(passwords: Iterable[str], method: Optional[str] = None,
+                   workers: int = HASH_WORKERS) -> List[str]:
+    """
+    Hash many passwords on a process pool (hashing is CPU bound)
+
+    Args:
+        passwords: Plain passwords
+        method: Override PASSWORD_HASH_METHOD
+        workers: Number of processes
+
+    Returns:
+        List[str]: Hashes in input order
+    """
+    return _pool_map(partial(hash_password, method=method or PASSWORD_HASH_METHOD), list(passwords), workers)
+
+
+def verify_passwords(pairs: Iterable[Tuple[Optional[str], str]], method: Optional[str] = None,
+                     workers: int = HASH_WORKERS) -> List[Tuple[bool, bool]]:
+    """
+    Verify many (stored, password) pairs on a process pool
+
+    Returns:
+        List[Tuple[bool, bool]]: (matches, needs_rehash) per pair, in input order
+    """
+    return _pool_map(partial(_verify_pair, method=method or PASSWORD_HASH_METHOD), list(pairs), workers)
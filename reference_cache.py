@@ -0,0 +1,157 @@
+"""
+Reference Data Cache for Sunrise Education Centre
+Keeps small, rarely changing tables in memory, coherent across workers.
+
+Classes, forum topics, countdown settings and batch metadata are read on
+almost every request but only change when an admin edits them. A loader
+decorated with ``reference_cached('classes')`` keeps its result in this
+process, stamped with the generation of each data set it depends on.
+Writers call ``invalidate_reference('classes')``, which bumps that
+generation in the ``reference_generations`` table and drops this process's
+copies straight away.
+
+Other processes see the bump the next time they look at the table, which
+they do at most every GENERATION_CHECK_INTERVAL seconds: one read of a
+handful of rows shared by every cached data set, instead of re-reading each
+table on each request. Results are handed out as deep copies, so callers
+may modify them.
+"""
+
+import copy
+import sqlite3
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from request_cache import clear_request_memo
+
+# Database configuration
+DATABASE = 'users.db'
+
+GENERATION_CHECK_INTERVAL = 2.0         # seconds between reads of reference_generations
+
+_lock = threading.Lock()
+_generations: Dict[str, int] = {}
+_checked_at = 0.0
+_table_missing_reported = False
+# (loader, arguments) -> (generation stamp, value)
+_values: Dict[Tuple[str, tuple], Tuple[Tuple[int, ...], Any]] = {}
+# loader -> data sets it depends on
+_dependencies: Dict[str, Tuple[str, ...]] = {}
+
+
+def ensure_reference_cache_table() -> None:
+    """Create the table holding one generation counter per reference data set"""
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS reference_generations (
+                name TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _current_generations() -> Optional[Dict[str, int]]:
+    """Generation per data set, re-read when older than GENERATION_CHECK_INTERVAL; None if unreadable"""
+    global _checked_at, _generations, _table_missing_reported
+    now = time.monotonic()
+    with _lock:
+        if now - _checked_at < GENERATION_CHECK_INTERVAL:
+            return _generations
+    try:
+        conn = sqlite3.connect(DATABASE, timeout=30)
+        try:
+            rows = conn.execute('SELECT name, generation FROM reference_generations').fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        if not _table_missing_reported:
+            _table_missing_reported = True
+            print(f"❌ Reference cache disabled, cannot read generations: {e}")
+        return None
+    with _lock:
+        _generations = dict(rows)
+        _checked_at = now
+        return _generations
+
+
+def get_reference_generation(name: str) -> int:
+    """
+    Current generation of one reference data set (0 if never invalidated)
+
+    Handy as part of an ETag or a cache key for pages built from the data set.
+    """
+    generations = _current_generations()
+    return generations.get(name, 0) if generations else 0
+
+
+def invalidate_reference(*names: str) -> None:
+    """
+    Mark reference data sets as changed, in every process
+
+    Call after committing a write to the underlying tables.
+
+    Args:
+        names: Data set names, e.g. 'classes', 'topics'
+    """
+    global _checked_at
+    try:
+        conn = sqlite3.connect(DATABASE, timeout=30)
+        try:
+            conn.executemany('''
+                INSERT INTO reference_generations (name, generation) VALUES (?, 1)
+                ON CONFLICT(name) DO UPDATE SET generation = generation + 1
+            ''', [(name,) for name in names])
+            conn.commit()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"❌ Error bumping reference generation for {', '.join(names)}: {e}")
+    changed = set(names)
+    with _lock:
+        _checked_at = 0.0
+        for key in [key for key in _values if changed & set(_dependencies[key[0]])]:
+            del _values[key]
+    clear_request_memo()
+
+
+def reference_cached(*names: str) -> Callable:
+    """
+    Cache a loader's result per argument tuple until one of the named data sets changes
+
+    Args:
+        names: Data sets the loader reads, e.g. reference_cached('classes', 'batch_meta')
+
+    Returns:
+        Decorator; the original loader stays available as ``.uncached``
+    """
+    def decorator(func: Callable) -> Callable:
+        loader = f"{func.__module__}.{func.__qualname__}"
+        _dependencies[loader] = names
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            generations = _current_generations()
+            if generations is None:
+                return func(*args, **kwargs)
+            stamp = tuple(generations.get(name, 0) for name in names)
+            key = (loader, args + tuple(sorted(kwargs.items())))
+            with _lock:
+                entry = _values.get(key)
+            if entry is None or entry[0] != stamp:
+                # Stamp taken before loading: a write landing meanwhile makes this entry stale
+                value = func(*args, **kwargs)
+                with _lock:
+                    _values[key] = (stamp, value)
+            else:
+                value = entry[1]
+            return copy.deepcopy(value)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
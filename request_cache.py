@@ -0,0 +1,124 @@
+"""
+Request-Scoped Memoization for Sunrise Education Centre
+Runs each read helper at most once per request for the same arguments.
+
+A page render often asks for the same thing several times: the route, the
+context processor and helpers such as ``can_user_access_topic`` each look
+up the current user, the class list and the unread notifications. Helpers
+decorated with ``request_memoized`` keep their results on ``flask.g`` for
+the rest of the request (or Socket.IO event), so repeats cost a dict lookup.
+Outside a request they simply run.
+
+Write helpers in the same modules call ``clear_request_memo()`` so a request
+that changes data and reads it back sees its own write. List results are
+handed out as copies, so callers may sort or append freely.
+
+Each call is counted per endpoint and function; ``get_request_memo_stats()``
+reports how many calls were repeats and roughly how much time they saved
+(repeats x the function's average uncached time).
+"""
+
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, List
+
+from flask import g, has_request_context, request
+
+_stats_lock = threading.Lock()
+# endpoint -> function -> {'calls', 'hits', 'miss_seconds'}
+_stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+
+def _record(name: str, hit: bool, elapsed: float = 0.0) -> None:
+    endpoint = request.endpoint or request.path
+    with _stats_lock:
+        counters = _stats.setdefault(endpoint, {}).setdefault(name, {'calls': 0, 'hits': 0, 'miss_seconds': 0.0})
+        counters['calls'] += 1
+        if hit:
+            counters['hits'] += 1
+        else:
+            counters['miss_seconds'] += elapsed
+
+
+def request_memoized(func: Callable) -> Callable:
+    """
+    Cache a read helper's result for the rest of the current request
+
+    Args:
+        func: Function whose result depends only on its (hashable) arguments
+              and on data not changed earlier in the same request
+
+    Returns:
+        Wrapped function; the original stays available as ``.uncached``
+    """
+    name = f"{func.__module__}.{func.__name__}"
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not has_request_context():
+            return func(*args, **kwargs)
+        memo = g.setdefault('_request_memo', {})
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hit = key in memo
+        except TypeError:
+            return func(*args, **kwargs)  # unhashable arguments
+        if hit:
+            result = memo[key]
+            _record(name, True)
+        else:
+            started = time.perf_counter()
+            result = memo[key] = func(*args, **kwargs)
+            _record(name, False, time.perf_counter() - started)
+        return list(result) if isinstance(result, list) else result
+
+    wrapper.uncached = func
+    return wrapper
+
+
+def clear_request_memo() -> None:
+    """Forget everything memoized in the current request (call after a write)"""
+    if has_request_context():
+        g.pop('_request_memo', None)
+
+
+def get_request_memo_stats() -> List[Dict]:
+    """
+    Duplicate-call savings per endpoint since the process started
+
+    Returns:
+        List of {'endpoint', 'calls', 'hits', 'hit_ratio', 'saved_ms', 'functions'},
+        largest saving first; 'functions' breaks the same figures down per helper
+    """
+    with _stats_lock:
+        snapshot = {endpoint: {name: dict(c) for name, c in functions.items()}
+                    for endpoint, functions in _stats.items()}
+
+    report = []
+    for endpoint, functions in snapshot.items():
+        rows = []
+        for name, c in functions.items():
+            misses = c['calls'] - c['hits']
+            saved = c['hits'] * (c['miss_seconds'] / misses) if misses else 0.0
+            rows.append({'function': name, 'calls': c['calls'], 'hits': c['hits'],
+                         'saved_ms': round(saved * 1000, 2)})
+        rows.sort(key=lambda r: r['saved_ms'], reverse=True)
+        calls = sum(r['calls'] for r in rows)
+        hits = sum(r['hits'] for r in rows)
+        report.append({
+            'endpoint': endpoint,
+            'calls': calls,
+            'hits': hits,
+            'hit_ratio': round(hits / calls, 3) if calls else 0.0,
+            'saved_ms': round(sum(r['saved_ms'] for r in rows), 2),
+            'functions': rows,
+        })
+    report.sort(key=lambda r: r['saved_ms'], reverse=True)
+    return report
+
+
+def reset_request_memo_stats() -> None:
+    """Start the counters afresh"""
+    with _stats_lock:
+        _stats.clear()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import sys
-from app import app
+from app import create_app
+
+app = create_app()
 
 app.testing = True
 client = app.test_client()
@@ -0,0 +1,400 @@
+"""
+Background Scheduler for Sunrise Education Centre
+One place for periodic maintenance jobs (status checks, cleanup, archival).
+
+Jobs are registered with ``schedule_interval`` or ``schedule_cron`` and run
+by a single scheduler thread per process. Under gunicorn every worker runs
+the scheduler, so each run first claims the job's current slot in the
+``scheduler_state`` table: the claim succeeds for exactly one process per
+slot, and holds a lease so a long run is not started again elsewhere while
+it is still going. Jobs marked ``leader=False`` skip the claim and run in
+every process (for per-process in-memory state).
+
+Every run is recorded in ``scheduler_runs`` with its duration and outcome;
+admins can see jobs and history at ``/admin/scheduler`` and trigger a run.
+"""
+
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+from flask import Blueprint, jsonify, render_template, session
+
+# Database configuration
+DATABASE = 'users.db'
+
+POLL_INTERVAL = 30            # longest sleep between due checks, seconds
+DEFAULT_LEASE = 600           # seconds a claimed run blocks other processes
+RUN_HISTORY_DAYS = 14
+
+scheduler_bp = Blueprint('scheduler', __name__)
+
+_jobs: Dict[str, 'ScheduledJob'] = {}
+_running: Set[str] = set()
+_running_lock = threading.Lock()
+_wakeup = threading.Event()
+_scheduler_thread: Optional[threading.Thread] = None
+_owner = f'{socket.gethostname()}:{os.getpid()}'
+
+
+# ==================== Schedules ====================
+
+class CronSchedule:
+    """Five-field cron expression: minute hour day-of-month month day-of-week"""
+
+    RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES))
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for part in field.split(','):
+            spec, _, step = part.partition('/')
+            if spec == '*':
+                start, end = low, high
+            elif '-' in spec:
+                start, end = (int(v) for v in spec.split('-'))
+            else:
+                start = end = int(spec)
+                if step:
+                    end = high
+            values.update(range(start, end + 1, int(step or 1)))
+        if not values or min(values) < low or max(values) > high:
+            raise ValueError(f"Cron field {field!r} outside {low}-{high}")
+        return values
+
+    def matches(self, dt: datetime) -> bool:
+        # cron counts Sunday as 0, Python's weekday() counts Monday as 0
+        return (dt.minute in self.minutes and dt.hour in self.hours and dt.day in self.days
+                and dt.month in self.months and (dt.weekday() + 1) % 7 in self.weekdays)
+
+    def next_after(self, ts: float) -> int:
+        """Epoch second of the first matching minute strictly after ts (server local time)"""
+        dt = datetime.fromtimestamp(ts).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(366 * 24 * 60):
+            if self.matches(dt):
+                return int(dt.timestamp())
+            dt += timedelta(minutes=1)
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+class ScheduledJob:
+    """A registered job and its schedule"""
+
+    def __init__(self, name: str, func: Callable, interval: Optional[int] = None,
+                 cron: Optional[str] = None, jitter: int = 0, lease: int = DEFAULT_LEASE,
+                 leader: bool = True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = CronSchedule(cron) if cron else None
+        self.jitter = jitter
+        self.lease = lease
+        self.leader = leader
+        # due is the schedule time; next_run adds this process's jitter to it
+        self.due = self.cron.next_after(time.time()) if self.cron else time.time()
+        self.next_run = self.due + (0 if self.cron else random.uniform(0, self.jitter))
+
+    def slot(self, ts: float) -> int:
+        """Identifier of the schedule period a run at ts belongs to"""
+        if self.cron:
+            return int(ts) - int(ts) % 60
+        return int(ts) // self.interval
+
+    def advance(self, ts: float) -> None:
+        self.due = self.cron.next_after(ts) if self.cron else ts + self.interval
+        self.next_run = self.due + random.uniform(0, self.jitter)
+
+    def describe(self) -> str:
+        return f"cron {self.cron.expression}" if self.cron else f"every {self.interval}s"
+
+
+def schedule_interval(name: str, func: Callable, seconds: int, jitter: int = 0,
+                      lease: int = DEFAULT_LEASE, leader: bool = True) -> None:
+    """
+    Run a job every ``seconds``
+
+    Args:
+        name: Unique job name
+        func: Called with no arguments
+        seconds: Interval between runs
+        jitter: Up to this many seconds of random delay per run
+        lease: Seconds other processes keep off the job while a run is in progress
+        leader: False to run in every process instead of once per slot
+    """
+    _jobs[name] = ScheduledJob(name, func, interval=seconds, jitter=jitter, lease=lease, leader=leader)
+    _wakeup.set()
+
+
+def schedule_cron(name: str, func: Callable, expression: str, jitter: int = 0,
+                  lease: int = DEFAULT_LEASE) -> None:
+    """
+    Run a job on a cron schedule (server local time), e.g. '0 0 * * *' for midnight
+
+    Args:
+        name: Unique job name
+        func: Called with no arguments
+        expression: Five-field cron expression
+        jitter: Up to this many seconds of random delay per run
+        lease: Seconds other processes keep off the job while a run is in progress
+    """
+    _jobs[name] = ScheduledJob(name, func, cron=expression, jitter=jitter, lease=lease)
+    _wakeup.set()
+
+
+# ==================== Persistence ====================
+
+def ensure_scheduler_tables():
+    """Ensure the scheduler state and run history tables exist"""
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''CREATE TABLE IF NOT EXISTS scheduler_state (
+            job TEXT PRIMARY KEY,
+            last_slot INTEGER,
+            owner TEXT,
+            lease_until INTEGER DEFAULT 0,
+            run_requested INTEGER DEFAULT 0
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS scheduler_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job TEXT NOT NULL,
+            owner TEXT,
+            started_at INTEGER NOT NULL,
+            duration_ms INTEGER,
+            status TEXT NOT NULL DEFAULT 'running',
+            error TEXT
+        )''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_scheduler_runs_job_started ON scheduler_runs(job, started_at)')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_scheduler_runs_started ON scheduler_runs(started_at)')
+        conn.commit()
+        print("✅ Scheduler tables ensured")
+    except Exception as e:
+        print(f"❌ Error ensuring scheduler tables: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def _execute(query: str, params: tuple = ()) -> int:
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    try:
+        c.execute(query, params)
+        conn.commit()
+        return c.rowcount
+    finally:
+        conn.close()
+
+
+def _claim(job: ScheduledJob, slot: int, now: int, forced: bool = False) -> bool:
+    """Take the job for this slot; True for exactly one process per slot"""
+    _execute('INSERT OR IGNORE INTO scheduler_state (job) VALUES (?)', (job.name,))
+    slot_clause = 'run_requested = 1' if forced else '(last_slot IS NULL OR last_slot < ?)'
+    params = (slot, _owner, now + job.lease, job.name) + (() if forced else (slot,)) + (now,)
+    return _execute(f'''UPDATE scheduler_state
+                        SET last_slot = MAX(COALESCE(last_slot, 0), ?), owner = ?, lease_until = ?,
+                            run_requested = 0
+                        WHERE job = ? AND {slot_clause} AND COALESCE(lease_until, 0) <= ?''', params) == 1
+
+
+def _release(job: ScheduledJob) -> None:
+    _execute('UPDATE scheduler_state SET lease_until = 0 WHERE job = ? AND owner = ?', (job.name, _owner))
+
+
+def _run(job: ScheduledJob) -> None:
+    started = time.time()
+    run_id = None
+    try:
+        conn = sqlite3.connect(DATABASE, timeout=30)
+        try:
+            cur = conn.execute('INSERT INTO scheduler_runs (job, owner, started_at) VALUES (?, ?, ?)',
+                               (job.name, _owner, int(started)))
+            conn.commit()
+            run_id = cur.lastrowid
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"❌ Could not record start of {job.name}: {e}")
+
+    status, error = 'succeeded', None
+    try:
+        job.func()
+    except Exception as e:
+        status, error = 'failed', f"{e}\n{traceback.format_exc(limit=5)}"
+        print(f"❌ Scheduled job {job.name} failed: {e}")
+    finally:
+        duration_ms = int((time.time() - started) * 1000)
+        try:
+            if run_id is not None:
+                _execute('UPDATE scheduler_runs SET status = ?, error = ?, duration_ms = ? WHERE id = ?',
+                         (status, error, duration_ms, run_id))
+            if job.leader:
+                _release(job)
+        except Exception as e:
+            print(f"❌ Could not record end of {job.name}: {e}")
+        with _running_lock:
+            _running.discard(job.name)
+
+
+def _start(job: ScheduledJob) -> None:
+    with _running_lock:
+        if job.name in _running:
+            return
+        _running.add(job.name)
+    threading.Thread(target=_run, args=(job,), daemon=True, name=f'sched-{job.name}').start()
+
+
+def _requested_jobs() -> List[str]:
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    try:
+        return [row[0] for row in conn.execute('SELECT job FROM scheduler_state WHERE run_requested = 1')]
+    finally:
+        conn.close()
+
+
+def _tick() -> float:
+    """Start every due job; returns seconds until the next one is due"""
+    now = time.time()
+    for name in _requested_jobs():
+        job = _jobs.get(name)
+        if job and job.name not in _running and _claim(job, job.slot(now), int(now), forced=True):
+            _start(job)
+    for job in list(_jobs.values()):
+        if job.next_run > now:
+            continue
+        slot = job.slot(job.due if job.cron else now)
+        job.advance(now)
+        if job.name in _running:
+            continue
+        if not job.leader or _claim(job, slot, int(now)):
+            _start(job)
+    upcoming = min((job.next_run for job in _jobs.values()), default=now + POLL_INTERVAL)
+    return max(0.5, min(POLL_INTERVAL, upcoming - time.time()))
+
+
+def _scheduler_loop() -> None:
+    while True:
+        try:
+            delay = _tick()
+        except Exception as e:
+            print(f"❌ Scheduler error: {e}")
+            delay = POLL_INTERVAL
+        _wakeup.wait(delay)
+        _wakeup.clear()
+
+
+def prune_run_history(days: int = RUN_HISTORY_DAYS) -> int:
+    """Delete scheduler run records older than ``days``"""
+    return _execute('DELETE FROM scheduler_runs WHERE started_at < ?', (int(time.time()) - days * 86400,))
+
+
+def start_scheduler() -> None:
+    """Start this process's scheduler thread (idempotent)"""
+    global _scheduler_thread
+    if _scheduler_thread is not None and _scheduler_thread.is_alive():
+        return
+    if 'scheduler_history_cleanup' not in _jobs:
+        schedule_cron('scheduler_history_cleanup', prune_run_history, '30 3 * * *')
+    _scheduler_thread = threading.Thread(target=_scheduler_loop, daemon=True, name='scheduler')
+    _scheduler_thread.start()
+    print(f"✅ Scheduler started with {len(_jobs)} jobs ({_owner})")
+
+
+def request_run(name: str) -> bool:
+    """
+    Ask the scheduler (in whichever process gets there first) to run a job now
+
+    Returns:
+        bool: False if no such job is registered
+    """
+    if name not in _jobs:
+        return False
+    _execute('INSERT OR IGNORE INTO scheduler_state (job) VALUES (?)', (name,))
+    _execute('UPDATE scheduler_state SET run_requested = 1 WHERE job = ?', (name,))
+    _wakeup.set()
+    return True
+
+
+def get_scheduler_overview(history: int = 50) -> Dict:
+    """
+    Registered jobs with their last run, plus the most recent runs
+
+    Args:
+        history: Number of recent runs to include
+
+    Returns:
+        Dict: {'jobs': [...], 'runs': [...]}
+    """
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        jobs = []
+        for job in sorted(_jobs.values(), key=lambda j: j.name):
+            c.execute('''SELECT started_at, duration_ms, status, owner FROM scheduler_runs
+                         WHERE job = ? ORDER BY started_at DESC LIMIT 1''', (job.name,))
+            last = c.fetchone()
+            c.execute('''SELECT AVG(duration_ms), SUM(status = 'failed'), COUNT(*) FROM scheduler_runs
+                         WHERE job = ? AND started_at >= ?''', (job.name, int(time.time()) - 86400))
+            avg_ms, failures, runs = c.fetchone()
+            jobs.append({
+                'name': job.name,
+                'schedule': job.describe(),
+                'leader_only': job.leader,
+                'next_run': datetime.fromtimestamp(job.next_run).strftime('%Y-%m-%d %H:%M:%S'),
+                'running_here': job.name in _running,
+                'last_started': datetime.fromtimestamp(last[0]).strftime('%Y-%m-%d %H:%M:%S') if last else None,
+                'last_duration_ms': last[1] if last else None,
+                'last_status': last[2] if last else None,
+                'last_owner': last[3] if last else None,
+                'runs_24h': runs or 0,
+                'failures_24h': failures or 0,
+                'avg_duration_ms_24h': int(avg_ms) if avg_ms is not None else None,
+            })
+        c.execute('''SELECT id, job, owner, started_at, duration_ms, status, error FROM scheduler_runs
+                     ORDER BY id DESC LIMIT ?''', (history,))
+        runs = [{
+            'id': r[0], 'job': r[1], 'owner': r[2],
+            'started_at': datetime.fromtimestamp(r[3]).strftime('%Y-%m-%d %H:%M:%S'),
+            'duration_ms': r[4], 'status': r[5], 'error': r[6],
+        } for r in c.fetchall()]
+        return {'jobs': jobs, 'runs': runs}
+    finally:
+        conn.close()
+
+
+# ==================== Routes ====================
+
+@scheduler_bp.route('/admin/scheduler')
+def scheduler_page():
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    return render_template('scheduler_admin.html')
+
+
+@scheduler_bp.route('/api/admin/scheduler')
+def scheduler_overview():
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    return jsonify({'success': True, **get_scheduler_overview()})
+
+
+@scheduler_bp.route('/api/admin/scheduler/<name>/run', methods=['POST'])
+def scheduler_run_now(name):
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    if not request_run(name):
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True})
@@ -0,0 +1,118 @@
+"""
+Schema Bootstrap for Sunrise Education Centre
+Creates and migrates every table once, at process start.
+
+Each module keeps its own ``ensure_*``/``init_*`` function for its tables;
+app.py registers them here in dependency order with ``register_schema_step``
+and ``create_app()`` calls ``bootstrap_schema()`` before the process serves
+requests or starts any background worker. Request handlers and module imports run no DDL and assume
+their tables exist.
+
+The schema version is kept in ``PRAGMA user_version``, which the numbered
+migrations in ``auth_handler.init_db`` (V1-V6) already use. When the database
+is at SCHEMA_VERSION every step is skipped and a start costs one PRAGMA read
+instead of a hundred-odd CREATE/ALTER checks and backfill scans. Bump
+SCHEMA_VERSION whenever a step or an init_db migration changes.
+
+Usage:
+    python benchmark_startup.py      # cold vs warm start and per-request overhead
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+# Database configuration
+DATABASE = 'users.db'
+
+# V7: all module tables bootstrapped in one pass (init_db's own migrations stop at V6)
+# V8: reference_generations (cross-process reference cache invalidation)
+# V9: conversations summary table maintained by personal_chats triggers
+# V10: chat receipts (conversations.delivered_upto/read_upto), personal_chats.client_msg_id
+# V11: notification read marks + exceptions replace user_notification_status
+# V12: jobs.owner/lease_until (running jobs survive other workers starting)
+SCHEMA_VERSION = 12
+
+_steps: List[Tuple[str, Callable[[], None]]] = []
+_lock = threading.Lock()
+_bootstrapped = False
+_timings: Dict[str, float] = {}
+
+
+def register_schema_step(name: str, func: Callable[[], None]) -> None:
+    """
+    Add a schema step; steps run in registration order
+
+    Args:
+        name: Label used in logs and timings
+        func: Idempotent function creating/migrating one module's tables
+    """
+    if all(existing != name for existing, _ in _steps):
+        _steps.append((name, func))
+
+
+def get_schema_version(db_path: str = DATABASE) -> int:
+    """Schema version recorded in the database (PRAGMA user_version)"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _set_schema_version(db_path: str, version: int) -> None:
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        # Never lower it: a newer deployment may already have moved it on
+        if conn.execute('PRAGMA user_version').fetchone()[0] < version:
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def bootstrap_schema(force: bool = False, db_path: str = DATABASE) -> Dict[str, float]:
+    """
+    Run the registered schema steps if the database is behind SCHEMA_VERSION
+
+    Only the first call in a process does any work. If a step fails the
+    version is left unchanged so the next start tries again.
+
+    Args:
+        force: Run every step even if the version is current
+        db_path: Database holding the version (steps use their module's DATABASE)
+
+    Returns:
+        Dict[str, float]: Seconds spent per step; empty when nothing had to run
+    """
+    global _bootstrapped
+    with _lock:
+        if _bootstrapped and not force:
+            return dict(_timings)
+        _bootstrapped = True
+        version = get_schema_version(db_path)
+        if version >= SCHEMA_VERSION and not force:
+            print(f"✅ Database schema at version {version}, bootstrap skipped")
+            return {}
+
+        _timings.clear()
+        failed = []
+        started = time.perf_counter()
+        for name, func in _steps:
+            step_started = time.perf_counter()
+            try:
+                func()
+            except Exception as e:
+                failed.append(name)
+                print(f"❌ Schema step '{name}' failed: {e}")
+            _timings[name] = time.perf_counter() - step_started
+
+        elapsed = time.perf_counter() - started
+        if failed:
+            print(f"❌ Schema bootstrap incomplete ({', '.join(failed)}); staying at version {version}")
+        else:
+            _set_schema_version(db_path, SCHEMA_VERSION)
+            print(f"✅ Database schema bootstrapped to version {SCHEMA_VERSION} "
+                  f"({len(_steps)} steps in {elapsed:.2f}s)")
+        return dict(_timings)
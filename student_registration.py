@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Bulk Student Registration Engine for Sunrise Education Centre
+Registers or updates students from an Excel/CSV sheet (username, class, password, status).
+
+Class names and paid status are normalized column-wise with pandas, the sheet
+is staged into a temporary table and applied to ``users`` with one
+``INSERT ... ON CONFLICT(username) DO UPDATE`` in a single transaction.
+A dry run computes the same diff (new / updated / unchanged) and rolls back.
+Passwords go through password_service on a process pool: existing users'
+passwords are verified, and only new or changed ones are hashed and written.
+
+Usage:
+    python student_registration.py students.xlsx --dry-run
+    python student_registration.py students.xlsx
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from password_service import HASH_WORKERS, hash_passwords, verify_passwords
+
+# Database configuration
+DATABASE = 'users.db'
+
+DIFF_SAMPLE_LIMIT = 200  # usernames listed per diff bucket in reports
+PAID_VALUES = ['paid', 'yes', 'y', '1', 'true']
+NON_STUDENT_CLASSES = {'admin', 'teacher'}
+
+ProgressCallback = Optional[Callable[[str, int, int], None]]
+
+_ROMAN = {'xii': '12', 'xi': '11', 'ix': '9', 'x': '10'}
+
+
+def canonical_class_series(names: pd.Series) -> pd.Series:
+    """
+    Reduce class name spellings to one key, e.g. 'Class XI Applied',
+    'class 11th applied' and '11 Applied' all become '11 applied'.
+
+    Args:
+        names: Class names as written in the sheet or the classes table
+
+    Returns:
+        pd.Series: Canonical keys
+    """
+    key = names.fillna('').astype(str).str.lower().str.replace(r'[^a-z0-9 ]', ' ', regex=True)
+    key = key.str.replace(r'\bclass\b', ' ', regex=True)
+    for roman, number in _ROMAN.items():
+        key = key.str.replace(rf'\b{roman}\b', number, regex=True)
+    key = key.str.replace(r'\b(\d+)(st|nd|rd|th)\b', r'\1', regex=True)
+    key = key.str.replace(r'\bstandard\b', ' ', regex=True)
+    return key.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def load_class_lookup(conn: sqlite3.Connection) -> Dict[str, int]:
+    """
+    Map canonical class keys to class IDs (admin/teacher pseudo-classes excluded)
+
+    Args:
+        conn: Open database connection
+
+    Returns:
+        Dict[str, int]: canonical key -> class_id
+    """
+    rows = conn.execute('SELECT id, name FROM classes').fetchall()
+    rows = [(cid, name) for cid, name in rows if str(name).strip().lower() not in NON_STUDENT_CLASSES]
+    keys = canonical_class_series(pd.Series([name for _, name in rows], dtype=object))
+    return dict(zip(keys, [cid for cid, _ in rows]))
+
+
+def read_student_sheet(file_path: str) -> pd.DataFrame:
+    """
+    Read a registration sheet and return username/class/password/status columns
+
+    Header names are matched loosely ('Username', 'Class Name', 'Paid Status', ...).
+
+    Raises:
+        ValueError: If a required column is missing
+    """
+    if file_path.lower().endswith('.csv'):
+        df = pd.read_csv(file_path, dtype=str)
+    else:
+        df = pd.read_excel(file_path, dtype=str)
+    df.columns = [str(col).strip().lower() for col in df.columns]
+    wanted = {
+        'username': lambda c: 'username' in c or c == 'name',
+        'class': lambda c: 'class' in c,
+        'password': lambda c: 'password' in c,
+        'status': lambda c: 'status' in c or 'paid' in c,
+    }
+    columns = {}
+    for field, matches in wanted.items():
+        col = next((c for c in df.columns if matches(c)), None)
+        if col is None:
+            raise ValueError(f"Missing required column '{field}'. Found: {list(df.columns)}")
+        columns[field] = col
+    out = pd.DataFrame({field: df[col] for field, col in columns.items()})
+    return out.fillna('').astype(str).apply(lambda col: col.str.strip())
+
+
+def normalize_students(df: pd.DataFrame, class_lookup: Dict[str, int]) -> Dict:
+    """
+    Vectorized normalization and validation of a student sheet
+
+    Args:
+        df: Output of read_student_sheet
+        class_lookup: Output of load_class_lookup
+
+    Returns:
+        Dict: 'rows' (valid, de-duplicated DataFrame), 'errors' (list of str),
+              'duplicates_in_sheet' (int)
+    """
+    df = df.copy()
+    df['sheet_row'] = df.index + 2
+    df['paid'] = df['status'].str.lower().isin(PAID_VALUES).map({True: 'paid', False: 'not paid'})
+    df['class_id'] = canonical_class_series(df['class']).map(class_lookup)
+
+    errors = []
+    blank = df['username'] == ''
+    no_password = ~blank & (df['password'] == '')
+    no_class = ~blank & ~no_password & df['class_id'].isna()
+    for row in df.loc[no_password, 'sheet_row']:
+        errors.append(f"Row {row}: password is required")
+    for row, name, cls in zip(df.loc[no_class, 'sheet_row'], df.loc[no_class, 'username'], df.loc[no_class, 'class']):
+        errors.append(f"Row {row}: could not map class '{cls}' for user {name}")
+
+    valid = df[~blank & ~no_password & ~no_class]
+    # A username repeated in the sheet keeps its last row, as sequential updates would
+    deduped = valid.drop_duplicates('username', keep='last')
+    deduped = deduped.assign(class_id=deduped['class_id'].astype(int))
+    return {
+        'rows': deduped[['username', 'password', 'class_id', 'paid', 'sheet_row']],
+        'errors': errors,
+        'duplicates_in_sheet': len(valid) - len(deduped),
+    }
+
+
+def _stage(conn: sqlite3.Connection, rows: pd.DataFrame):
+    conn.execute('DROP TABLE IF EXISTS temp.staged_students')
+    conn.execute('''CREATE TEMP TABLE staged_students (
+        username TEXT PRIMARY KEY,
+        plain_password TEXT NOT NULL,
+        class_id INTEGER NOT NULL,
+        paid TEXT NOT NULL,
+        password TEXT,
+        dirty INTEGER DEFAULT 0
+    )''')
+    conn.executemany(
+        'INSERT INTO staged_students (username, plain_password, class_id, paid) VALUES (?, ?, ?, ?)',
+        zip(rows['username'], rows['password'], rows['class_id'].astype(int).tolist(), rows['paid'])
+    )
+
+
+def _diff(conn: sqlite3.Connection, hash_method: Optional[str], workers: int) -> Dict:
+    """
+    Compare staged rows with users; existing passwords are verified on a process pool
+
+    Returns:
+        Dict: 'new', 'updated' (with changed fields), 'unchanged', plus 'writes':
+              (username, plain password, stored value to keep or None to hash)
+    """
+    c = conn.cursor()
+    c.execute('''SELECT s.username, s.plain_password, u.id IS NULL, u.password,
+                        u.class_id IS NOT s.class_id, u.paid IS NOT s.paid
+                 FROM staged_students s LEFT JOIN users u ON u.username = s.username''')
+    staged = c.fetchall()
+    existing = [row for row in staged if not row[2]]
+    checks = dict(zip(
+        [row[0] for row in existing],
+        verify_passwords([(row[3], row[1]) for row in existing], method=hash_method, workers=workers)
+    ))
+
+    new, updated, unchanged, writes = [], [], [], []
+    for username, plain, is_new, stored, class_changed, paid_changed in staged:
+        if is_new:
+            new.append(username)
+            writes.append((username, plain, None))
+            continue
+        matches, needs_rehash = checks[username]
+        fields = [name for name, changed in (('class', class_changed), ('paid', paid_changed),
+                                             ('password', not matches)) if changed]
+        if fields:
+            updated.append({'username': username, 'fields': fields})
+        else:
+            unchanged.append(username)
+        if not matches or needs_rehash:
+            writes.append((username, plain, None))
+        elif fields:
+            writes.append((username, plain, stored))
+    return {'new': new, 'updated': updated, 'unchanged': unchanged, 'writes': writes}
+
+
+def register_students(file_path: str, dry_run: bool = False, progress: ProgressCallback = None,
+                      hash_method: Optional[str] = None, workers: int = HASH_WORKERS,
+                      db_path: str = DATABASE) -> Dict:
+    """
+    Register or update every student in a sheet in one transaction
+
+    Args:
+        file_path: Excel or CSV sheet
+        dry_run: Compute the diff without writing anything
+        progress: Optional progress(stage, done, total) callback
+        hash_method: Override the password service's hash method/cost
+        workers: Processes used for password hashing and verification
+        db_path: Database file
+
+    Returns:
+        Dict: Counts, errors, a diff sample and per-stage timings
+    """
+    timings = {}
+    started = time.perf_counter()
+    results = {
+        'dry_run': dry_run,
+        'total_rows': 0,
+        'inserted': 0,
+        'updated': 0,
+        'unchanged': 0,
+        'failed': 0,
+        'duplicates_in_sheet': 0,
+        'errors': [],
+        'diff': {'new': [], 'updated': []},
+        'timings': timings,
+    }
+
+    df = read_student_sheet(file_path)
+    results['total_rows'] = len(df)
+    timings['read'] = round(time.perf_counter() - started, 3)
+    if progress:
+        progress('read', len(df), len(df))
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        step = time.perf_counter()
+        normalized = normalize_students(df, load_class_lookup(conn))
+        rows = normalized['rows']
+        results['errors'] = normalized['errors']
+        results['failed'] = len(normalized['errors'])
+        results['duplicates_in_sheet'] = normalized['duplicates_in_sheet']
+        timings['normalize'] = round(time.perf_counter() - step, 3)
+        if progress:
+            progress('normalize', len(rows), len(rows))
+
+        step = time.perf_counter()
+        _stage(conn, rows)
+        diff = _diff(conn, hash_method, workers)
+        results['inserted'] = len(diff['new'])
+        results['updated'] = len(diff['updated'])
+        results['unchanged'] = len(diff['unchanged'])
+        results['diff'] = {'new': diff['new'][:DIFF_SAMPLE_LIMIT], 'updated': diff['updated'][:DIFF_SAMPLE_LIMIT]}
+        timings['diff'] = round(time.perf_counter() - step, 3)
+        if progress:
+            progress('diff', len(rows), len(rows))
+
+        if not dry_run:
+            step = time.perf_counter()
+            writes = diff['writes']
+            to_hash = [plain for _, plain, keep in writes if keep is None]
+            hashed = iter(hash_passwords(to_hash, method=hash_method, workers=workers))
+            conn.executemany('UPDATE staged_students SET password = ?, dirty = 1 WHERE username = ?',
+                             [(keep if keep is not None else next(hashed), username)
+                              for username, _, keep in writes])
+            timings['hash'] = round(time.perf_counter() - step, 3)
+            if progress:
+                progress('hash', len(writes), len(writes))
+
+        if dry_run:
+            conn.rollback()
+        else:
+            step = time.perf_counter()
+            conn.execute('''INSERT INTO users (username, password, class_id, paid)
+                            SELECT username, password, class_id, paid FROM staged_students WHERE dirty = 1
+                            ON CONFLICT(username) DO UPDATE SET
+                                password = excluded.password,
+                                class_id = excluded.class_id,
+                                paid = excluded.paid''')
+            conn.commit()
+            timings['upsert'] = round(time.perf_counter() - step, 3)
+            if progress:
+                progress('upsert', len(rows), len(rows))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    timings['total'] = round(time.perf_counter() - started, 3)
+    print(f"✅ Student registration {'(dry run) ' if dry_run else ''}finished: {results['inserted']} new, "
+          f"{results['updated']} updated, {results['unchanged']} unchanged, {results['failed']} failed "
+          f"({timings['total']}s)")
+    return results
+
+
+def backup_database(db_path: str = DATABASE) -> str:
+    """Copy the database next to itself with a timestamp and return the backup path"""
+    backup_file = f"users_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+    shutil.copy2(db_path, backup_file)
+    print(f"Database backed up as: {backup_file}")
+    return backup_file
+
+
+def print_report(results: Dict):
+    """Print a registration report for the CLI"""
+    print("\n" + "=" * 60)
+    print("BULK STUDENT REGISTRATION" + (" (DRY RUN)" if results['dry_run'] else ""))
+    print("=" * 60)
+    print(f"Rows in sheet:          {results['total_rows']}")
+    print(f"New students:           {results['inserted']}")
+    print(f"Updated students:       {results['updated']}")
+    print(f"Unchanged:              {results['unchanged']}")
+    print(f"Repeated in sheet:      {results['duplicates_in_sheet']}")
+    print(f"Failed rows:            {results['failed']}")
+    for entry in results['diff']['updated'][:20]:
+        print(f"  ~ {entry['username']}: {', '.join(entry['fields'])}")
+    for username in results['diff']['new'][:20]:
+        print(f"  + {username}")
+    for error in results['errors']:
+        print(f"  ✗ {error}")
+    print("Timings: " + ", ".join(f"{k} {v}s" for k, v in results['timings'].items()))
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Register or update students from an Excel/CSV sheet')
+    parser.add_argument('sheet', help='Path to the .xlsx/.xls/.csv file')
+    parser.add_argument('--dry-run', action='store_true', help='Show what would change without writing')
+    parser.add_argument('--no-backup', action='store_true', help='Skip the database backup')
+    parser.add_argument('--workers', type=int, default=HASH_WORKERS, help='Password hashing processes')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.sheet):
+        print(f"Error: sheet not found at {args.sheet}")
+        return
+    if not args.dry_run and not args.no_backup:
+        backup_database()
+    print_report(register_students(args.sheet, dry_run=args.dry_run, workers=args.workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,9 +6,15 @@ Handles all study resource operations including upload, download, categorization
 import sqlite3
 import os
 import re
+import atexit
+import threading
+import queue
+import time
+from collections import Counter
 from datetime import datetime, timezone
 from typing import List, Dict, Optional, Tuple, Union
 from flask import session
+from request_cache import request_memoized, clear_request_memo
 import sys
 try:
     from werkzeug.utils import secure_filename
@@ -33,6 +39,48 @@ try:
 except Exception:
     pass
 
+# ==================== Resource catalogue cache ====================
+# Per-class resource lists and category lists only change when an admin
+# uploads, edits or deletes, so they are cached in-process and dropped
+# wholesale whenever the catalogue is written. The generation counter
+# doubles as an ETag component for catalogue responses.
+_catalogue_lock = threading.Lock()
+_catalogue_generation = 0
+_resource_cache: Dict[Tuple[str, Optional[str]], List[Tuple]] = {}
+_category_cache: Dict[str, List[Tuple]] = {}
+
+def get_catalogue_generation() -> int:
+    """
+    Get the current resource catalogue generation
+    
+    Returns:
+        Counter that increases on every catalogue write
+    """
+    return _catalogue_generation
+
+def invalidate_resource_catalogue() -> int:
+    """
+    Drop all cached resource and category lists
+    
+    Call after any write to the resources or categories tables.
+    
+    Returns:
+        The new catalogue generation
+    """
+    clear_request_memo()
+    global _catalogue_generation
+    with _catalogue_lock:
+        _catalogue_generation += 1
+        _resource_cache.clear()
+        _category_cache.clear()
+        return _catalogue_generation
+
+def _cache_store(cache: Dict, key, value: List[Tuple], generation: int) -> None:
+    """Store a query result unless the catalogue changed while it was being read"""
+    with _catalogue_lock:
+        if generation == _catalogue_generation:
+            cache[key] = value
+
 def get_ist_timestamp():
     """Get current timestamp in IST format"""
     ist_time = datetime.now(timezone.utc).astimezone()
@@ -77,8 +125,11 @@ def ensure_resource_tables():
             ('download_count', 'INTEGER'),
             ('is_active', 'BOOLEAN'),
             ('file_size', 'INTEGER'),
-            ('file_type', 'TEXT')
+            ('file_type', 'TEXT'),
+            ('rating_sum', 'INTEGER'),
+            ('rating_count', 'INTEGER')
         ]
+        backfill_ratings = 'rating_count' not in existing_columns
         
         for col_name, col_def in columns_to_add:
             if col_name not in existing_columns:
@@ -89,6 +140,8 @@ def ensure_resource_tables():
         c.execute('UPDATE resources SET paid_status = "unpaid" WHERE paid_status IS NULL')
         c.execute('UPDATE resources SET download_count = 0 WHERE download_count IS NULL')
         c.execute('UPDATE resources SET is_active = 1 WHERE is_active IS NULL')
+        c.execute('UPDATE resources SET rating_sum = 0 WHERE rating_sum IS NULL')
+        c.execute('UPDATE resources SET rating_count = 0 WHERE rating_count IS NULL')
         
         # Categories table
         c.execute('''CREATE TABLE IF NOT EXISTS categories (
@@ -129,6 +182,15 @@ def ensure_resource_tables():
             UNIQUE(resource_id, user_id)
         )''')
         
+        # Seed the rating aggregates once, when the columns are first added
+        if backfill_ratings:
+            c.execute('''
+                UPDATE resources SET
+                    rating_sum = COALESCE((SELECT SUM(rating) FROM resource_ratings rr WHERE rr.resource_id = resources.id), 0),
+                    rating_count = (SELECT COUNT(*) FROM resource_ratings rr WHERE rr.resource_id = resources.id)
+            ''')
+            print("✅ Backfilled resource rating aggregates")
+        
         conn.commit()
         print("✅ Study resource tables ensured successfully")
         
@@ -175,6 +237,7 @@ def save_resource(filename: str, class_id: int, filepath: str, title: str,
         
         resource_id = c.lastrowid
         conn.commit()
+        invalidate_resource_catalogue()
         print(f"✅ Saved resource: {title} (ID: {resource_id})")
         return resource_id
         
@@ -215,6 +278,7 @@ def get_all_resources() -> List[Tuple]:
     finally:
         conn.close()
 
+@request_memoized
 def get_resources_for_class_id(class_id: int, paid_status: str = None) -> List[Tuple]:
     """
     Get resources for a specific class
@@ -224,8 +288,15 @@ def get_resources_for_class_id(class_id: int, paid_status: str = None) -> List[T
         paid_status: Filter by paid status ('paid', 'unpaid', None for all)
     
     Returns:
-        List of resource tuples
+        List of resource tuples, with rating_sum and rating_count appended
+        so cards can show the average without another query
     """
+    key = (str(class_id), paid_status or None)
+    generation = _catalogue_generation
+    cached = _resource_cache.get(key)
+    if cached is not None:
+        return list(cached)
+    
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
@@ -235,7 +306,8 @@ def get_resources_for_class_id(class_id: int, paid_status: str = None) -> List[T
                 SELECT r.id, r.filename, r.class_id, r.filepath, r.title, r.description, 
                        r.category, r.paid_status, r.schedule_date, r.uploaded_by, 
                        r.uploaded_at, r.download_count, r.is_active, r.file_size, r.file_type,
-                       c.name as class_name, u.username as uploaded_by_name
+                       c.name as class_name, u.username as uploaded_by_name,
+                       r.rating_sum, r.rating_count
                 FROM resources r
                 LEFT JOIN classes c ON r.class_id = c.id
                 LEFT JOIN users u ON r.uploaded_by = u.id
@@ -247,7 +319,8 @@ def get_resources_for_class_id(class_id: int, paid_status: str = None) -> List[T
                 SELECT r.id, r.filename, r.class_id, r.filepath, r.title, r.description, 
                        r.category, r.paid_status, r.schedule_date, r.uploaded_by, 
                        r.uploaded_at, r.download_count, r.is_active, r.file_size, r.file_type,
-                       c.name as class_name, u.username as uploaded_by_name
+                       c.name as class_name, u.username as uploaded_by_name,
+                       r.rating_sum, r.rating_count
                 FROM resources r
                 LEFT JOIN classes c ON r.class_id = c.id
                 LEFT JOIN users u ON r.uploaded_by = u.id
@@ -256,7 +329,8 @@ def get_resources_for_class_id(class_id: int, paid_status: str = None) -> List[T
             ''', (class_id,))
         
         resources = c.fetchall()
-        return resources
+        _cache_store(_resource_cache, key, resources, generation)
+        return list(resources)
         
     except Exception as e:
         print(f"❌ Error getting resources for class {class_id}: {e}")
@@ -264,6 +338,7 @@ def get_resources_for_class_id(class_id: int, paid_status: str = None) -> List[T
     finally:
         conn.close()
 
+@request_memoized
 def get_resource_by_id(resource_id: int) -> Optional[Tuple]:
     """
     Get a specific resource by ID
@@ -298,6 +373,7 @@ def get_resource_by_id(resource_id: int) -> Optional[Tuple]:
     finally:
         conn.close()
 
+@request_memoized
 def get_resource_by_filename(filename: str) -> Optional[Tuple]:
     """
     Get a specific resource by filename
@@ -381,6 +457,7 @@ def update_resource(resource_id: int, title: str = None, description: str = None
         
         c.execute(query, params)
         conn.commit()
+        invalidate_resource_catalogue()
         
         print(f"✅ Updated resource {resource_id}")
         return True
@@ -415,6 +492,7 @@ def delete_resource(filename: str) -> bool:
             # Delete from database
             c.execute('DELETE FROM resources WHERE filename = ?', (filename,))
             conn.commit()
+            invalidate_resource_catalogue()
             
             # Delete physical file
             if os.path.exists(filepath):
@@ -433,6 +511,7 @@ def delete_resource(filename: str) -> bool:
     finally:
         conn.close()
 
+@request_memoized
 def get_categories_for_class(class_id: int) -> List[Tuple]:
     """
     Get all categories that are available for a specific class
@@ -443,6 +522,12 @@ def get_categories_for_class(class_id: int) -> List[Tuple]:
     Returns:
         List of category tuples
     """
+    key = str(class_id)
+    generation = _catalogue_generation
+    cached = _category_cache.get(key)
+    if cached is not None:
+        return list(cached)
+    
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
@@ -457,7 +542,8 @@ def get_categories_for_class(class_id: int) -> List[Tuple]:
         ''', (str(class_id),))
         
         categories = c.fetchall()
-        return categories
+        _cache_store(_category_cache, key, categories, generation)
+        return list(categories)
         
     except Exception as e:
         print(f"❌ Error getting categories for class {class_id}: {e}")
@@ -465,6 +551,7 @@ def get_categories_for_class(class_id: int) -> List[Tuple]:
     finally:
         conn.close()
 
+@request_memoized
 def get_all_categories() -> List[Tuple]:
     """
     Get all categories
@@ -521,6 +608,7 @@ def add_category(name: str, description: str = None, category_type: str = 'gener
         
         category_id = c.lastrowid
         conn.commit()
+        invalidate_resource_catalogue()
         print(f"✅ Added category: {name} (ID: {category_id})")
         return category_id
         
@@ -579,6 +667,7 @@ def update_category(category_id: int, name: str = None, description: str = None,
         
         c.execute(query, params)
         conn.commit()
+        invalidate_resource_catalogue()
         
         print(f"✅ Updated category {category_id}")
         return True
@@ -605,6 +694,7 @@ def delete_category(category_id: int) -> bool:
     try:
         c.execute('UPDATE categories SET is_active = 0 WHERE id = ?', (category_id,))
         conn.commit()
+        invalidate_resource_catalogue()
         
         print(f"✅ Deleted category {category_id}")
         return True
@@ -620,6 +710,9 @@ def track_resource_download(resource_id: int, user_id: int, ip_address: str = No
     """
     Track a resource download
     
+    The download is queued and written, together with the download_count
+    increment, by the counter worker in the next batch.
+    
     Args:
         resource_id: ID of the resource
         user_id: ID of the user downloading
@@ -627,35 +720,31 @@ def track_resource_download(resource_id: int, user_id: int, ip_address: str = No
         user_agent: User agent string
     
     Returns:
-        True if successful, False otherwise
+        True if the download was queued, False otherwise
     """
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
+    if not resource_id or not user_id:
+        return False
+    _enqueue_counter_event(('download', resource_id, user_id, ip_address, user_agent, get_ist_timestamp()))
+    return True
+
+def track_resource_download_by_filename(filename: str, user_id: int, ip_address: str = None,
+                                        user_agent: str = None) -> bool:
+    """
+    Track a resource download when only the stored filename is known
     
-    try:
-        # Add download record
-        c.execute('''
-            INSERT INTO resource_downloads 
-            (resource_id, user_id, ip_address, user_agent, downloaded_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (resource_id, user_id, ip_address, user_agent, get_ist_timestamp()))
-        
-        # Update download count
-        c.execute('''
-            UPDATE resources 
-            SET download_count = download_count + 1 
-            WHERE id = ?
-        ''', (resource_id,))
-        
-        conn.commit()
-        print(f"✅ Tracked download for resource {resource_id} by user {user_id}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error tracking download: {e}")
+    Args:
+        filename: Name of the resource file
+        user_id: ID of the user downloading
+        ip_address: IP address of the user
+        user_agent: User agent string
+    
+    Returns:
+        True if the download was queued, False otherwise
+    """
+    if not filename or not user_id:
         return False
-    finally:
-        conn.close()
+    _enqueue_counter_event(('download_file', filename, user_id, ip_address, user_agent, get_ist_timestamp()))
+    return True
 
 def get_resource_downloads(resource_id: int) -> List[Tuple]:
     """
@@ -694,6 +783,9 @@ def add_resource_rating(resource_id: int, user_id: int, rating: int,
     """
     Add or update a rating for a resource
     
+    The rating is queued; the counter worker upserts it and adjusts
+    rating_sum/rating_count on the resource in the next batch.
+    
     Args:
         resource_id: ID of the resource
         user_id: ID of the user rating
@@ -701,27 +793,17 @@ def add_resource_rating(resource_id: int, user_id: int, rating: int,
         review: Optional review text
     
     Returns:
-        True if successful, False otherwise
+        True if the rating was queued, False otherwise
     """
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
-    
     try:
-        c.execute('''
-            INSERT OR REPLACE INTO resource_ratings 
-            (resource_id, user_id, rating, review, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (resource_id, user_id, rating, review, get_ist_timestamp()))
-        
-        conn.commit()
-        print(f"✅ Added rating for resource {resource_id} by user {user_id}")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error adding rating: {e}")
+        rating = int(rating)
+    except (TypeError, ValueError):
         return False
-    finally:
-        conn.close()
+    if not resource_id or not user_id or rating < 1 or rating > 5:
+        print(f"❌ Invalid rating for resource {resource_id}: {rating}")
+        return False
+    _enqueue_counter_event(('rating', resource_id, user_id, rating, review, get_ist_timestamp()))
+    return True
 
 def get_resource_ratings(resource_id: int) -> List[Tuple]:
     """
@@ -755,36 +837,191 @@ def get_resource_ratings(resource_id: int) -> List[Tuple]:
     finally:
         conn.close()
 
-def get_average_rating(resource_id: int) -> float:
+def get_resource_counters(resource_id: int) -> Dict:
     """
-    Get average rating for a resource
+    Get the precomputed download and rating aggregates for a resource
     
     Args:
         resource_id: ID of the resource
     
     Returns:
-        Average rating (0.0 if no ratings)
+        Dictionary with download_count, rating_sum, rating_count and average_rating
     """
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
     
     try:
         c.execute('''
-            SELECT AVG(rating) as avg_rating, COUNT(*) as total_ratings
-            FROM resource_ratings 
-            WHERE resource_id = ?
+            SELECT COALESCE(download_count, 0), COALESCE(rating_sum, 0), COALESCE(rating_count, 0)
+            FROM resources WHERE id = ?
         ''', (resource_id,))
+        row = c.fetchone() or (0, 0, 0)
+        return {
+            'download_count': row[0],
+            'rating_sum': row[1],
+            'rating_count': row[2],
+            'average_rating': round(row[1] / row[2], 1) if row[2] else 0.0
+        }
         
-        result = c.fetchone()
-        avg_rating = result[0] if result and result[0] else 0.0
-        return round(avg_rating, 1)
+    except Exception as e:
+        print(f"❌ Error getting counters for resource {resource_id}: {e}")
+        return {'download_count': 0, 'rating_sum': 0, 'rating_count': 0, 'average_rating': 0.0}
+    finally:
+        conn.close()
+
+def get_average_rating(resource_id: int) -> float:
+    """
+    Get average rating for a resource
+    
+    Args:
+        resource_id: ID of the resource
+    
+    Returns:
+        Average rating (0.0 if no ratings)
+    """
+    return get_resource_counters(resource_id)['average_rating']
+
+# ==================== Download / rating counter pipeline ====================
+# Downloads and ratings are appended to a queue on the request path and
+# applied by a single background worker in batches: one transaction per
+# batch, with download_count/rating_sum/rating_count adjusted by deltas.
+COUNTER_FLUSH_INTERVAL = 2.0  # seconds to gather events into one batch
+COUNTER_BATCH_SIZE = 500
+
+_counter_queue: "queue.Queue[Tuple]" = queue.Queue()
+_counter_worker = None
+_counter_worker_lock = threading.Lock()
+
+def _enqueue_counter_event(event: Tuple) -> None:
+    """Queue a counter event and make sure the worker is running"""
+    global _counter_worker
+    _counter_queue.put(event)
+    if _counter_worker is None or not _counter_worker.is_alive():
+        with _counter_worker_lock:
+            if _counter_worker is None or not _counter_worker.is_alive():
+                _counter_worker = threading.Thread(target=_counter_worker_loop, daemon=True,
+                                                   name='resource-counters')
+                _counter_worker.start()
+
+def _counter_worker_loop() -> None:
+    """Gather queued events for up to COUNTER_FLUSH_INTERVAL and apply them as one batch"""
+    while True:
+        try:
+            batch = [_counter_queue.get()]
+            deadline = time.time() + COUNTER_FLUSH_INTERVAL
+            while len(batch) < COUNTER_BATCH_SIZE:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(_counter_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            _apply_counter_batch(batch)
+        except Exception as e:
+            print(f"❌ Resource counter worker error: {e}")
+            time.sleep(1)
+
+def _apply_counter_batch(batch: List[Tuple]) -> int:
+    """
+    Write a batch of download/rating events and their counter deltas
+    
+    Args:
+        batch: Queued events
+    
+    Returns:
+        Number of events applied
+    """
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    
+    try:
+        downloads = [e[1:] for e in batch if e[0] == 'download']
+        by_filename = [e[1:] for e in batch if e[0] == 'download_file']
+        ratings = [e[1:] for e in batch if e[0] == 'rating']
+        
+        if by_filename:
+            names = list({e[0] for e in by_filename})
+            placeholders = ','.join('?' * len(names))
+            c.execute(f'SELECT filename, id FROM resources WHERE filename IN ({placeholders})', names)
+            ids = dict(c.fetchall())
+            downloads.extend((ids[e[0]],) + e[1:] for e in by_filename if e[0] in ids)
+        
+        if downloads:
+            c.executemany('''
+                INSERT INTO resource_downloads 
+                (resource_id, user_id, ip_address, user_agent, downloaded_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', downloads)
+            counts = Counter(e[0] for e in downloads)
+            c.executemany('''
+                UPDATE resources SET download_count = COALESCE(download_count, 0) + ? WHERE id = ?
+            ''', [(n, resource_id) for resource_id, n in counts.items()])
+        
+        # Ratings replace any earlier rating by the same user, so the delta
+        # needs the previous value; applied in order within the transaction.
+        deltas: Dict[int, List[int]] = {}
+        for resource_id, user_id, rating, review, created_at in ratings:
+            c.execute('SELECT rating FROM resource_ratings WHERE resource_id = ? AND user_id = ?',
+                      (resource_id, user_id))
+            previous = c.fetchone()
+            c.execute('''
+                INSERT OR REPLACE INTO resource_ratings 
+                (resource_id, user_id, rating, review, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (resource_id, user_id, rating, review, created_at))
+            delta = deltas.setdefault(resource_id, [0, 0])
+            delta[0] += rating - (previous[0] if previous else 0)
+            delta[1] += 0 if previous else 1
+        if deltas:
+            c.executemany('''
+                UPDATE resources SET rating_sum = COALESCE(rating_sum, 0) + ?,
+                                     rating_count = COALESCE(rating_count, 0) + ?
+                WHERE id = ?
+            ''', [(d[0], d[1], resource_id) for resource_id, d in deltas.items()])
         
+        conn.commit()
+        if ratings:
+            # Cards show the average from the cached catalogue rows
+            invalidate_resource_catalogue()
+        print(f"✅ Applied {len(downloads)} downloads and {len(ratings)} ratings")
+        return len(downloads) + len(ratings)
+        
+    except sqlite3.OperationalError as e:
+        conn.rollback()
+        message = str(e).lower()
+        if 'locked' not in message and 'busy' not in message:
+            # Anything else (e.g. a missing column) would fail again on every retry
+            print(f"❌ Dropped counter batch of {len(batch)} events: {e}")
+            return 0
+        # Database busy: put the events back for the next batch
+        for event in batch:
+            _counter_queue.put(event)
+        print(f"❌ Counter batch deferred: {e}")
+        time.sleep(1)
+        return 0
     except Exception as e:
-        print(f"❌ Error getting average rating for resource {resource_id}: {e}")
-        return 0.0
+        conn.rollback()
+        print(f"❌ Error applying counter batch of {len(batch)} events: {e}")
+        return 0
     finally:
         conn.close()
 
+def flush_resource_counters() -> int:
+    """
+    Apply all queued download/rating events immediately
+    
+    Returns:
+        Number of events applied
+    """
+    batch = []
+    while True:
+        try:
+            batch.append(_counter_queue.get_nowait())
+        except queue.Empty:
+            break
+    return _apply_counter_batch(batch) if batch else 0
+
 def search_resources(query: str, class_id: int = None, category: str = None,
                     paid_status: str = None) -> List[Tuple]:
     """
@@ -1011,5 +1248,5 @@ def can_preview_pdf(filename: str) -> Tuple[bool, str]:
         return False, 'You do not have access to this resource.'
     return True, ''
 
-# Initialize tables when module is imported
-ensure_resource_tables()
\ No newline at end of file
+# Don't lose queued downloads/ratings on a clean shutdown
+atexit.register(flush_resource_counters)
\ No newline at end of file
@@ -0,0 +1,374 @@
+"""
+Traffic Rollups for Sunrise Education Centre
+Pre-aggregated visit metrics so the admin dashboard never scans ip_logs.
+
+The request tracker calls ``record_hit`` for every logged visit. Hits are
+queued and a background worker folds each batch into two small tables:
+
+* ``traffic_minute`` — hits plus HyperLogLog sketches of IPs and logged-in
+  users per minute (kept for MINUTE_RETENTION_HOURS)
+* ``traffic_day`` / ``traffic_day_paths`` — the same per local calendar day,
+  plus hits per path (kept indefinitely; a day is one row per path)
+
+Sketches are merged by taking the per-register maximum, so the all-time and
+"last 10 minutes" unique counts are unions of stored rows, with about 3%
+standard error. Raw ``ip_logs`` rows are only needed for the recent request
+log; data_archive moves them out of the database after 30 days.
+"""
+
+import atexit
+import hashlib
+import math
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from epoch_columns import epoch_now, start_of_local_day
+
+# Database configuration
+DATABASE = 'users.db'
+
+HLL_PRECISION = 10                     # 2^10 one-byte registers per sketch
+HLL_REGISTERS = 1 << HLL_PRECISION
+ROLLUP_FLUSH_INTERVAL = 5.0            # seconds to gather hits into one batch
+ROLLUP_BATCH_SIZE = 2000
+MINUTE_RETENTION_HOURS = 48
+
+_hit_queue: "queue.Queue[Tuple]" = queue.Queue()
+_rollup_worker = None
+_rollup_worker_lock = threading.Lock()
+
+
+# ==================== HyperLogLog ====================
+
+def hll_new() -> bytearray:
+    """Empty sketch"""
+    return bytearray(HLL_REGISTERS)
+
+
+def hll_add(registers: bytearray, value: str) -> None:
+    """Add a value to a sketch in place"""
+    x = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+    index = x >> (64 - HLL_PRECISION)
+    rest = x & ((1 << (64 - HLL_PRECISION)) - 1)
+    rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def hll_merge(registers: bytearray, other: Optional[bytes]) -> bytearray:
+    """Union another (stored) sketch into this one in place"""
+    if other:
+        registers[:] = bytes(map(max, registers, other))
+    return registers
+
+
+def hll_count(registers: Optional[bytes]) -> int:
+    """Estimated number of distinct values in a sketch"""
+    if not registers:
+        return 0
+    m = HLL_REGISTERS
+    estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)  # linear counting for small sets
+    return int(round(estimate))
+
+
+# ==================== Tables ====================
+
+def ensure_traffic_rollup_tables(db_path: str = DATABASE) -> None:
+    """Ensure the rollup tables exist, building them from ip_logs the first time"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    c = conn.cursor()
+    try:
+        c.execute('''CREATE TABLE IF NOT EXISTS traffic_minute (
+            minute_ts INTEGER PRIMARY KEY,
+            hits INTEGER NOT NULL DEFAULT 0,
+            ip_sketch BLOB,
+            user_sketch BLOB
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS traffic_day (
+            day TEXT PRIMARY KEY,
+            day_ts INTEGER NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            ip_sketch BLOB,
+            user_sketch BLOB
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS traffic_day_paths (
+            day TEXT NOT NULL,
+            path TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, path)
+        ) WITHOUT ROWID''')
+        c.execute('CREATE INDEX IF NOT EXISTS idx_traffic_day_day_ts ON traffic_day(day_ts)')
+        conn.commit()
+        empty = c.execute('SELECT 1 FROM traffic_day LIMIT 1').fetchone() is None
+        print("✅ Traffic rollup tables ensured")
+    except Exception as e:
+        print(f"❌ Error ensuring traffic rollup tables: {e}")
+        conn.rollback()
+        return
+    finally:
+        conn.close()
+    if empty:
+        rebuild_traffic_rollups(db_path=db_path)
+
+
+def rebuild_traffic_rollups(since_ts: int = 0, db_path: str = DATABASE) -> int:
+    """
+    Fold raw ip_logs rows into the rollups (one-off backfill)
+
+    Args:
+        since_ts: Only rows visited at or after this epoch second
+        db_path: SQLite database
+
+    Returns:
+        int: Number of rows folded in
+    """
+    conn = sqlite3.connect(db_path, timeout=30)
+    total = 0
+    try:
+        c = conn.execute('''SELECT visited_ts, ip, user_id, path FROM ip_logs
+                            WHERE visited_ts >= ? ORDER BY visited_ts''', (since_ts,))
+        while True:
+            rows = c.fetchmany(ROLLUP_BATCH_SIZE)
+            if not rows:
+                break
+            total += _apply_hits(rows, db_path=db_path)
+    except Exception as e:
+        print(f"❌ Error rebuilding traffic rollups: {e}")
+    finally:
+        conn.close()
+    print(f"✅ Rebuilt traffic rollups from {total} logged visits")
+    return total
+
+
+# ==================== Writer ====================
+
+def record_hit(ip: str, user_id: Optional[int], path: str, ts: Optional[float] = None) -> None:
+    """
+    Queue one visit for the rollups (called by the request tracker)
+
+    Args:
+        ip: Client IP
+        user_id: Logged-in user, if any
+        path: Request path
+        ts: Epoch seconds; defaults to now
+    """
+    global _rollup_worker
+    _hit_queue.put((int(ts if ts is not None else time.time()), ip, user_id, path))
+    if _rollup_worker is None or not _rollup_worker.is_alive():
+        with _rollup_worker_lock:
+            if _rollup_worker is None or not _rollup_worker.is_alive():
+                _rollup_worker = threading.Thread(target=_rollup_worker_loop, daemon=True,
+                                                  name='traffic-rollups')
+                _rollup_worker.start()
+
+
+def _rollup_worker_loop() -> None:
+    """Gather queued hits for up to ROLLUP_FLUSH_INTERVAL and apply them as one batch"""
+    while True:
+        try:
+            batch = [_hit_queue.get()]
+            deadline = time.time() + ROLLUP_FLUSH_INTERVAL
+            while len(batch) < ROLLUP_BATCH_SIZE:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(_hit_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            _apply_hits(batch, requeue=True)
+        except Exception as e:
+            print(f"❌ Traffic rollup worker error: {e}")
+            time.sleep(1)
+
+
+def _day_key(ts: int) -> Tuple[str, int]:
+    day_ts = start_of_local_day(datetime.fromtimestamp(ts))
+    return datetime.fromtimestamp(day_ts).strftime('%Y-%m-%d'), day_ts
+
+
+def _apply_hits(batch: List[Tuple], requeue: bool = False, db_path: str = DATABASE) -> int:
+    """
+    Merge a batch of (ts, ip, user_id, path) hits into the rollup rows
+
+    Sketches are read and written back inside one IMMEDIATE transaction, so
+    several app processes can flush into the same rows safely.
+
+    Returns:
+        int: Number of hits applied
+    """
+    minutes: Dict[int, List] = {}
+    days: Dict[Tuple[str, int], List] = {}
+    paths: Counter = Counter()
+    for ts, ip, user_id, path in batch:
+        if ts is None:
+            continue
+        for bucket in (minutes.setdefault(ts - ts % 60, [0, hll_new(), hll_new()]),
+                       days.setdefault(_day_key(ts), [0, hll_new(), hll_new()])):
+            bucket[0] += 1
+            hll_add(bucket[1], ip or 'unknown')
+            if user_id:
+                hll_add(bucket[2], str(user_id))
+        paths[(_day_key(ts)[0], path or '/')] += 1
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    c = conn.cursor()
+    try:
+        c.execute('BEGIN IMMEDIATE')
+        for minute_ts, (hits, ips, users) in minutes.items():
+            row = c.execute('SELECT ip_sketch, user_sketch FROM traffic_minute WHERE minute_ts = ?',
+                            (minute_ts,)).fetchone()
+            if row:
+                hll_merge(ips, row[0])
+                hll_merge(users, row[1])
+            c.execute('''INSERT INTO traffic_minute (minute_ts, hits, ip_sketch, user_sketch)
+                         VALUES (?, ?, ?, ?)
+                         ON CONFLICT(minute_ts) DO UPDATE SET hits = hits + excluded.hits,
+                             ip_sketch = excluded.ip_sketch, user_sketch = excluded.user_sketch''',
+                      (minute_ts, hits, bytes(ips), bytes(users)))
+        for (day, day_ts), (hits, ips, users) in days.items():
+            row = c.execute('SELECT ip_sketch, user_sketch FROM traffic_day WHERE day = ?', (day,)).fetchone()
+            if row:
+                hll_merge(ips, row[0])
+                hll_merge(users, row[1])
+            c.execute('''INSERT INTO traffic_day (day, day_ts, hits, ip_sketch, user_sketch)
+                         VALUES (?, ?, ?, ?, ?)
+                         ON CONFLICT(day) DO UPDATE SET hits = hits + excluded.hits,
+                             ip_sketch = excluded.ip_sketch, user_sketch = excluded.user_sketch''',
+                      (day, day_ts, hits, bytes(ips), bytes(users)))
+        c.executemany('''INSERT INTO traffic_day_paths (day, path, hits) VALUES (?, ?, ?)
+                         ON CONFLICT(day, path) DO UPDATE SET hits = hits + excluded.hits''',
+                      [(day, path, hits) for (day, path), hits in paths.items()])
+        conn.commit()
+        return len(batch)
+    except sqlite3.OperationalError as e:
+        # Database busy: put the hits back for the next batch
+        conn.rollback()
+        if requeue:
+            for hit in batch:
+                _hit_queue.put(hit)
+        print(f"❌ Traffic rollup batch deferred: {e}")
+        time.sleep(1)
+        return 0
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error applying traffic rollup batch of {len(batch)} hits: {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+def flush_traffic_rollups() -> int:
+    """
+    Apply all queued hits immediately
+
+    Returns:
+        int: Number of hits applied
+    """
+    batch = []
+    while True:
+        try:
+            batch.append(_hit_queue.get_nowait())
+        except queue.Empty:
+            break
+    return _apply_hits(batch) if batch else 0
+
+
+# ==================== Readers ====================
+
+def _merged(rows: Iterable[Tuple]) -> bytearray:
+    sketch = hll_new()
+    for (stored,) in rows:
+        hll_merge(sketch, stored)
+    return sketch
+
+
+def get_traffic_summary(window_seconds: int = 600, top_paths: int = 10) -> Dict:
+    """
+    Dashboard numbers read from the rollups
+
+    Args:
+        window_seconds: How far back "active now" reaches
+        top_paths: Number of most-visited paths today to include
+
+    Returns:
+        Dict: total_unique_ips, unique_ips_today, active_ips_now, hits_today,
+              active_users_today and top_paths_today
+    """
+    today, _ = _day_key(epoch_now())
+    since = epoch_now() - window_seconds
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        total_unique_ips = hll_count(_merged(c.execute('SELECT ip_sketch FROM traffic_day')))
+        row = c.execute('SELECT hits, ip_sketch, user_sketch FROM traffic_day WHERE day = ?', (today,)).fetchone()
+        active_ips_now = hll_count(_merged(c.execute(
+            'SELECT ip_sketch FROM traffic_minute WHERE minute_ts >= ?', (since - since % 60,))))
+        c.execute('SELECT path, hits FROM traffic_day_paths WHERE day = ? ORDER BY hits DESC LIMIT ?',
+                  (today, top_paths))
+        paths = [{'path': path, 'hits': hits} for path, hits in c.fetchall()]
+        return {
+            'total_unique_ips': total_unique_ips,
+            'unique_ips_today': hll_count(row[1]) if row else 0,
+            'active_ips_now': active_ips_now,
+            'hits_today': row[0] if row else 0,
+            'active_users_today': hll_count(row[2]) if row else 0,
+            'top_paths_today': paths,
+        }
+    finally:
+        conn.close()
+
+
+def get_daily_traffic(days: int = 30) -> List[Dict]:
+    """
+    Per-day hits and unique counts, oldest first
+
+    Args:
+        days: Number of most recent days
+
+    Returns:
+        List[Dict]: day, hits, unique_ips, active_users
+    """
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    try:
+        c.execute('''SELECT day, hits, ip_sketch, user_sketch FROM traffic_day
+                     ORDER BY day_ts DESC LIMIT ?''', (days,))
+        return [{'day': day, 'hits': hits, 'unique_ips': hll_count(ips), 'active_users': hll_count(users)}
+                for day, hits, ips, users in reversed(c.fetchall())]
+    finally:
+        conn.close()
+
+
+# ==================== Retention ====================
+
+def prune_traffic_rollups(minute_hours: int = MINUTE_RETENTION_HOURS) -> int:
+    """
+    Drop per-minute rollups past their retention window (daily rows are kept)
+
+    Returns:
+        int: Number of minute rows deleted
+    """
+    conn = sqlite3.connect(DATABASE, timeout=30)
+    c = conn.cursor()
+    try:
+        c.execute('DELETE FROM traffic_minute WHERE minute_ts < ?', (epoch_now() - minute_hours * 3600,))
+        conn.commit()
+        return c.rowcount
+    except Exception as e:
+        print(f"❌ Error pruning traffic rollups: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+
+atexit.register(flush_traffic_rollups)